@@ -10,9 +10,11 @@ from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import os
-import threading
 import json
+import math
 from .services.ai_arbitrage_brain import AIArbitrageBrain # Relative import
+from .services.scan_jobs import ScanJobManager
+from .services.price_history import sqlite_path_from_uri
 
 # Inicializar Flask
 app = Flask(__name__)
@@ -31,8 +33,16 @@ CORS(app, origins="*")  # Permitir todas as origens para desenvolvimento
 jwt = JWTManager(app)
 db = SQLAlchemy(app)
 
-# Inicializar o cérebro de IA
-ai_brain = AIArbitrageBrain()
+# Inicializar o cérebro de IA - o histórico de preços fica no mesmo ficheiro SQLite que o Flask-SQLAlchemy
+# (URIs relativas resolvidas contra app.instance_path); com outra base de dados usa o default do serviço
+ai_brain = AIArbitrageBrain(price_history_path=sqlite_path_from_uri(app.config['SQLALCHEMY_DATABASE_URI'], app.instance_path))
+
+# Scans em background: os pedidos só enfileiram; resultados guardados durante GPAS_SCAN_RESULT_TTL_SECONDS.
+# Os jobs partilham um único scan (ai_brain.scan_shared_opportunities), por isso vários workers não multiplicam o scraping
+scan_jobs = ScanJobManager(
+    max_workers=int(os.environ.get('GPAS_SCAN_WORKERS', '4')),
+    result_ttl_seconds=float(os.environ.get('GPAS_SCAN_RESULT_TTL_SECONDS', '900'))
+)
 
 # Modelos de Base de Dados
 class User(db.Model):
@@ -184,7 +194,7 @@ def get_dashboard_stats():
                 'pending_transactions': pending_transactions,
                 'active_transactions': active_transactions,
                 'success_rate': 87.5,  # Simulado
-                'daily_budget_used': ai_brain.current_daily_spent,
+                'daily_budget_used': ai_brain.daily_spent_for(user.id),
                 'daily_budget_total': user.daily_budget
             }
         }), 200
@@ -193,10 +203,33 @@ def get_dashboard_stats():
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 # Rotas de Arbitragem
+def run_scan_job(min_roi, daily_budget: float, report_progress) -> dict:
+    """Corre num worker de scan_jobs: scan partilhado + filtros do utilizador, no formato da resposta da API"""
+    # Escanear oportunidades - um único scan partilhado por todos os utilizadores (single-flight + TTL)
+    shared_opportunities, scan_source = ai_brain.scan_shared_opportunities(progress=report_progress)
+    # Quem se juntou a um scan em curso (ou usou a cache) não recebeu o progresso do scan
+    report_progress(len(ai_brain.products_to_scan), len(ai_brain.products_to_scan))
+    
+    # Só a filtragem (ROI mínimo / orçamento) é específica do utilizador
+    opportunities = ai_brain.filter_opportunities_for_user(shared_opportunities, min_roi=min_roi, daily_budget=daily_budget)
+    
+    # Converter para formato JSON
+    opportunities_data = [opp.summary() for opp in opportunities]
+    
+    # Gerar insights
+    insights = ai_brain.generate_ai_insights(opportunities)
+    
+    return {
+        'opportunities': opportunities_data,
+        'insights': insights,
+        'scan_source': scan_source,
+        'scan_timestamp': datetime.utcnow().isoformat()
+    }
+
 @app.route('/api/arbitrage/scan', methods=['POST'])
 @jwt_required()
 def scan_opportunities():
-    """Escanear oportunidades de arbitragem"""
+    """Enfileirar um scan de oportunidades de arbitragem (devolve o job_id de imediato)"""
     try:
         current_user_email = get_jwt_identity()
         user = User.query.filter_by(email=current_user_email).first()
@@ -204,39 +237,58 @@ def scan_opportunities():
         if not user:
             return jsonify({'error': 'Utilizador não encontrado'}), 404
         
-        # Configurar parâmetros do utilizador no AI brain
-        ai_brain.total_daily_budget = user.daily_budget
-        ai_brain.auto_trading_enabled = user.auto_trading_enabled
-        
-        # Escanear oportunidades
-        opportunities = ai_brain.scan_global_opportunities()
-        
-        # Converter para formato JSON
-        opportunities_data = []
-        for opp in opportunities:
-            opportunities_data.append({
-                'product_name': opp.product_name,
-                'source_platform': opp.source_platform,
-                'target_platform': opp.target_platform,
-                'source_price': opp.source_price,
-                'target_price': opp.target_price,
-                'profit': opp.profit,
-                'roi_percentage': opp.roi_percentage,
-                'confidence_score': opp.confidence_score,
-                'risk_level': opp.risk_level,
-                'shipping_time': opp.shipping_time,
-                'category': opp.category,
-                'auto_buy_recommended': opp.auto_buy_recommended
-            })
-        
-        # Gerar insights
-        insights = ai_brain.generate_ai_insights(opportunities)
+        data = request.get_json(silent=True) or {}
+        min_roi, daily_budget = data.get('min_roi'), user.daily_budget
+        if min_roi is not None:
+            # Validar já: um valor inválido só falharia no job, depois do scan partilhado inteiro
+            try:
+                min_roi = math.nan if isinstance(min_roi, bool) else float(min_roi)
+            except (TypeError, ValueError):
+                min_roi = math.nan
+            if not math.isfinite(min_roi):
+                return jsonify({'error': 'min_roi tem de ser um número'}), 400
+        # Um job ativo só é reutilizado para os mesmos filtros: outro min_roi/orçamento tem o seu próprio job
+        # (o scan em si é partilhado, por isso o custo extra é só a filtragem)
+        job = scan_jobs.submit(user.id, lambda report_progress: run_scan_job(min_roi, daily_budget, report_progress),
+                               key=(min_roi, daily_budget))
         
         return jsonify({
-            'opportunities': opportunities_data,
-            'insights': insights,
-            'scan_timestamp': datetime.utcnow().isoformat()
-        }), 200
+            **job.to_dict(),
+            'status_url': f"/api/arbitrage/scan/{job.job_id}",
+            'result_url': f"/api/arbitrage/scan/{job.job_id}/result"
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/api/arbitrage/scan/<job_id>', methods=['GET'])
+@jwt_required()
+def scan_status(job_id):
+    """Estado e progresso de um scan"""
+    try:
+        user = User.query.filter_by(email=get_jwt_identity()).first()
+        job = scan_jobs.get(job_id, owner=user.id) if user else None
+        if not job:
+            return jsonify({'error': 'Scan não encontrado ou expirado'}), 404
+        return jsonify(job.to_dict()), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/api/arbitrage/scan/<job_id>/result', methods=['GET'])
+@jwt_required()
+def scan_result(job_id):
+    """Resultado de um scan terminado (202 enquanto ainda está a correr)"""
+    try:
+        user = User.query.filter_by(email=get_jwt_identity()).first()
+        job = scan_jobs.get(job_id, owner=user.id) if user else None
+        if not job:
+            return jsonify({'error': 'Scan não encontrado ou expirado'}), 404
+        if job.status == 'failed':
+            return jsonify({**job.to_dict(), 'error': 'O scan falhou'}), 500
+        if job.status != 'succeeded':
+            return jsonify(job.to_dict()), 202
+        return jsonify({**job.result, 'job_id': job.job_id}), 200
         
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor'}), 500
@@ -244,7 +296,7 @@ def scan_opportunities():
 @app.route('/api/arbitrage/execute', methods=['POST'])
 @jwt_required()
 def execute_purchase():
-    """Executar compra automática"""
+    """Executar compra automática (assíncrona: devolve a ordem de imediato)"""
     try:
         current_user_email = get_jwt_identity()
         user = User.query.filter_by(email=current_user_email).first()
@@ -275,34 +327,59 @@ def execute_purchase():
             target_currency='USD'
         )
         
-        # Executar compra
-        result = ai_brain.auto_execute_purchase(opportunity)
-        
-        # Se a compra foi bem-sucedida, guardar na base de dados
-        if result['status'] == 'success':
-            transaction = ArbitrageTransaction(
-                user_id=user.id,
-                product_name=opportunity.product_name,
-                source_platform=opportunity.source_platform,
-                target_platform=opportunity.target_platform,
-                source_price=opportunity.source_price,
-                target_price=opportunity.target_price,
-                profit=opportunity.profit,
-                roi_percentage=opportunity.roi_percentage,
-                status='purchased'
-            )
-            
-            db.session.add(transaction)
-            db.session.commit()
-            
-            result['transaction_id'] = transaction.id
-        
-        return jsonify(result), 200
+        user_id = user.id
+        
+        def record_transaction(order):
+            """Corre na thread da ordem quando termina: se a compra foi bem-sucedida, guardar na base de dados"""
+            if not order.succeeded:
+                return
+            with app.app_context():
+                transaction = ArbitrageTransaction(
+                    user_id=user_id,
+                    product_name=opportunity.product_name,
+                    source_platform=opportunity.source_platform,
+                    target_platform=opportunity.target_platform,
+                    source_price=opportunity.source_price,
+                    target_price=opportunity.target_price,
+                    profit=opportunity.profit,
+                    roi_percentage=opportunity.roi_percentage,
+                    status='purchased'
+                )
+                db.session.add(transaction)
+                db.session.commit()
+                order.extra['transaction_id'] = transaction.id
+        
+        # Enfileirar a compra (não espera pelo marketplace); a mesma Idempotency-Key devolve a ordem original.
+        # Auto-trading e orçamento diário são os do utilizador (o gasto é contado por utilizador)
+        client_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        idempotency_key = f"user:{user_id}:{client_key}" if client_key else None
+        result = ai_brain.submit_purchase(opportunity, idempotency_key=idempotency_key, owner=user_id,
+                                          on_complete=record_transaction,
+                                          auto_trading_enabled=user.auto_trading_enabled, daily_budget=user.daily_budget)
+        
+        if 'order_id' not in result: # Recusada pelas verificações (orçamento, ROI, risco...)
+            return jsonify(result), 200
+        result['status_url'] = f"/api/arbitrage/orders/{result['order_id']}"
+        return jsonify(result), 202
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+@app.route('/api/arbitrage/orders/<order_id>', methods=['GET'])
+@jwt_required()
+def order_status(order_id):
+    """Estado de uma compra enfileirada (e o resultado quando termina)"""
+    try:
+        user = User.query.filter_by(email=get_jwt_identity()).first()
+        order = ai_brain.orders.get(order_id, owner=user.id) if user else None
+        if not order:
+            return jsonify({'error': 'Ordem não encontrada ou expirada'}), 404
+        return jsonify(ai_brain.purchase_result(order, daily_budget=user.daily_budget)), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
 @app.route('/api/arbitrage/transactions', methods=['GET'])
 @jwt_required()
 def get_transactions():
@@ -413,6 +490,59 @@ def health_check():
         'ai_brain_status': 'active'
     }), 200
 
+# Rota de histórico de preços
+@app.route('/api/prices/history', methods=['GET'])
+@jwt_required()
+def price_history():
+    """Histórico de preços de um produto (opcionalmente por plataforma e intervalo de tempo)"""
+    try:
+        product = request.args.get('product')
+        if not product:
+            return jsonify({'error': 'Parâmetro product é obrigatório'}), 400
+
+        store = ai_brain.scraper.price_history
+        history = store.price_range(
+            product,
+            platform=request.args.get('platform'),
+            start=request.args.get('start', type=float),
+            end=request.args.get('end', type=float)
+        )
+        return jsonify({
+            'product': product,
+            'latest': store.latest_prices(product),
+            'history': history
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+# Rota de estatísticas internas (rate limiting, caches, etc.)
+@app.route('/api/system/stats', methods=['GET'])
+@jwt_required()
+def system_stats():
+    """Estatísticas internas do sistema de scraping"""
+    try:
+        return jsonify({
+            'rate_limiter': ai_brain.scraper.rate_limiter.get_stats(),
+            'response_cache': ai_brain.scraper.response_cache.get_stats(),
+            'http_client': ai_brain.http.get_stats(),
+            'price_history': ai_brain.scraper.price_history.get_stats(),
+            'refresh_scheduler': ai_brain.scraper.refresh_scheduler.get_stats(),
+            'fx_rates': ai_brain.fx.get_stats(),
+            'cost_model': ai_brain.cost_model.get_stats(),
+            'scrape_cache': ai_brain.scrape_cache.get_stats(),
+            'insights': ai_brain.insights.get_stats(),
+            'scan_jobs': scan_jobs.get_stats(),
+            'shared_scans': ai_brain.shared_scans.get_stats(),
+            'monitoring': ai_brain.monitoring.get_stats() if ai_brain.monitoring else {'running': False},
+            'orders': ai_brain.orders.get_stats(),
+            'circuit_breakers': {site: breaker.get_stats() for site, breaker in ai_brain.scraper.circuit_breakers.items()},
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
 # Inicialização da base de dados
 def create_tables():
     """Criar tabelas da base de dados"""
@@ -434,22 +564,20 @@ def create_tables():
 
 # Função para iniciar monitoring em background
 def start_background_monitoring():
-    """Iniciar monitoring de IA em background"""
-    def monitor():
-        print("🤖 Iniciando monitoring de IA em background...")
-        # ai_brain.start_continuous_monitoring()  # Comentado para não bloquear
-    
-    # Iniciar em thread separada
-    monitor_thread = threading.Thread(target=monitor, daemon=True)
-    monitor_thread.start()
+    """Iniciar monitoring de IA em background (GPAS_MONITORING_ENABLED); cada worker do gunicorn
+    arranca o scheduler, mas só o que obtém o lock GPAS_MONITORING_LOCK_FILE executa os ciclos"""
+    if os.environ.get('GPAS_MONITORING_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    print("🤖 Iniciando monitoring de IA em background...")
+    return ai_brain.start_continuous_monitoring(lock_path=os.environ.get('GPAS_MONITORING_LOCK_FILE'))
+
+# Também sob gunicorn (não só em __main__)
+start_background_monitoring()
 
 if __name__ == '__main__':
     # Criar tabelas da base de dados
     create_tables()
     
-    # Iniciar monitoring em background
-    start_background_monitoring()
-    
     print("🚀 GPAS 4.0 - BACKEND REVOLUCIONÁRIO INICIADO!")
     print("💰 Sistema que vai DESTRUIR a concorrência!")
     print("🤖 IA ativa e pronta para gerar lucros!")
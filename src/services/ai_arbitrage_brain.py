@@ -5,18 +5,24 @@ Funcionalidades que NENHUMA outra plataforma tem
 """
 
 import os # Import os module
-import requests # Keep for potential future direct API calls, though not used by scraper
 import json
-import time
 import random
 from datetime import datetime, timedelta
 from dataclasses import dataclass
-from typing import List, Dict, Optional
+from operator import attrgetter
+from typing import Callable, List, Dict, Hashable, Optional, Tuple
 import threading
-import schedule
 from .global_scraper import ScraperEngine # Import the scraper
-
-@dataclass
+from .http_client import get_http_client
+from .fx_rates import UnknownCurrencyError, get_fx_rates
+from .cost_model import get_cost_model
+from .memo_cache import TTLCache
+from .insight_service import InsightService
+from .single_flight import SingleFlight
+from .monitoring_scheduler import DEFAULT_LOCK_PATH, MonitoringScheduler
+from .order_pipeline import MockMarketplaceAPI, Order, OrderPipeline, OrderRequest
+
+@dataclass(slots=True) # No per-instance __dict__: scans create one per opportunity
 class ArbitrageOpportunity:
     product_name: str
     source_platform: str
@@ -40,6 +46,17 @@ class ArbitrageOpportunity:
     notes: Optional[str] = None # To add context like "Data from live scrape" or "Simulated data"
     generative_insight: Optional[str] = None # For AI-generated text
 
+    def summary(self) -> Dict:
+        """The fields returned by the scan API, read in one attrgetter call"""
+        return dict(zip(OPPORTUNITY_SUMMARY_FIELDS, _summary_getter(self)))
+
+# Fields of ArbitrageOpportunity.summary(), in API order
+OPPORTUNITY_SUMMARY_FIELDS = (
+    'product_name', 'source_platform', 'target_platform', 'source_price', 'target_price', 'profit',
+    'roi_percentage', 'confidence_score', 'risk_level', 'shipping_time', 'category', 'auto_buy_recommended'
+)
+_summary_getter = attrgetter(*OPPORTUNITY_SUMMARY_FIELDS)
+
 @dataclass
 class MarketTrend:
     product_category: str
@@ -57,7 +74,7 @@ class AIArbitrageBrain:
     - AlgosOne: Apenas crypto, nós dominamos PRODUTOS FÍSICOS
     """
     
-    def __init__(self):
+    def __init__(self, price_history_path: Optional[str] = None):
         self.opportunities = [] # This might be deprecated if opportunities are generated on-the-fly per scan
         self.market_trends = {} # For storing market trend data
         self.auto_trading_enabled = True
@@ -65,10 +82,23 @@ class AIArbitrageBrain:
         self.min_roi = 25  # Minimum ROI target for an opportunity to be considered (as per GPAS 3.0 doc)
         self.max_investment_per_product = 1000  # USD
         self.total_daily_budget = 5000  # USD
-        self.current_daily_spent = 0
-        self.scraper = ScraperEngine() # Instantiate the scraper
+        self.daily_spent: Dict[Optional[Hashable], float] = {} # Reserved/spent today per owner (user id; None = monitoring auto-buys)
+        self.budget_day = datetime.now().date() # daily_spent starts over when the date changes (every worker process)
+        self.scraper = ScraperEngine(price_history_path) # Instantiate the scraper (price history in the app's SQLite file)
         self.generative_ai_api_key = os.environ.get("GENERATIVE_AI_API_KEY") # Placeholder for API key
         self.generative_ai_endpoint = os.environ.get("GENERATIVE_AI_ENDPOINT") # Placeholder for API endpoint
+        self.insights = InsightService(self.generative_ai_endpoint, self.generative_ai_api_key) # Batched, cached insight calls
+        self.shared_scan_ttl_seconds = 300
+        self.shared_scans = SingleFlight(ttl_seconds=self.shared_scan_ttl_seconds) # One scan shared by every user
+        self.monitoring_interval_minutes = (25, 35) # Random wait in this range between monitoring cycles
+        self.monitoring: Optional[MonitoringScheduler] = None # Created by start_continuous_monitoring
+        self.orders = OrderPipeline(MockMarketplaceAPI(), max_concurrency=4) # Purchases run here; swap the marketplace for a real API
+        self._budget_lock = threading.Lock() # Guards daily_spent (orders complete on pipeline threads)
+        self.http = get_http_client() # Pooled client shared with the scraper
+        self.fx = get_fx_rates() # FX rate table shared with the engines
+        self.cost_model = get_cost_model() # Fee / landed-cost model shared with the engines
+        self.scrape_cache_ttl_seconds = 300
+        self.scrape_cache = TTLCache(max_entries=1000, default_ttl=self.scrape_cache_ttl_seconds) # Scraper results per product
 
 
         # Product list for scanning - can be dynamic or from a predefined list
@@ -94,7 +124,6 @@ class AIArbitrageBrain:
             },
             'Amazon.com': {
                 'currency': 'USD',
-                'platform_fees_percentage': 0.15, # Standard Amazon referral fee
                 'shipping_time_days': 2, # Prime shipping estimate for selling
                 'reliability_score': 0.9,
                 'is_target': True
@@ -108,13 +137,39 @@ class AIArbitrageBrain:
             },
             'SimulatedTarget': {
                 'currency': 'USD',
-                'platform_fees_percentage': 0.12,
                 'shipping_time_days': 3,
                 'reliability_score': 0.85,
                 'is_target': True
             }
         }
 
+    @property
+    def current_daily_spent(self) -> float:
+        """Spent today by the brain's own (monitoring) auto-buys, against total_daily_budget."""
+        return self.daily_spent_for(None)
+
+    def daily_spent_for(self, owner: Optional[Hashable]) -> float:
+        with self._budget_lock:
+            self._roll_budget_day()
+            return self.daily_spent.get(owner, 0.0)
+
+    def _roll_budget_day(self):
+        """Resets every daily budget on the first access after midnight (caller holds _budget_lock)."""
+        today = datetime.now().date()
+        if today == self.budget_day:
+            return
+        if self.daily_spent:
+            print(f"💰 [{datetime.now().strftime('%H:%M:%S')}] ORÇAMENTO DIÁRIO RESETADO. Gasto anterior: ${sum(self.daily_spent.values()):.2f}")
+        self.daily_spent.clear()
+        self.budget_day = today
+
+    def _release_budget(self, owner: Optional[Hashable], amount: float, day):
+        """Gives back a reservation made on day (nothing to give back once that day's budget was reset)."""
+        with self._budget_lock:
+            self._roll_budget_day()
+            if day == self.budget_day:
+                self.daily_spent[owner] = self.daily_spent.get(owner, 0.0) - amount
+
     def get_product_category(self, product_name: str) -> str:
         return self.product_categories.get(product_name, "general")
 
@@ -180,64 +235,17 @@ class AIArbitrageBrain:
 
     def get_generative_insight(self, opportunity: ArbitrageOpportunity) -> Optional[str]:
         """
-        Calls a generative AI API to get a brief insight on the arbitrage opportunity.
-        This is a placeholder and needs a real API endpoint and key.
-        For MVP, it will return a simulated insight if API key/endpoint is not set.
+        Brief generative AI insight on one arbitrage opportunity (simulated when no API
+        key/endpoint is set). Scans use attach_generative_insights, which batches the calls.
         """
-        if not self.generative_ai_api_key or not self.generative_ai_endpoint:
-            # Simulate if API key or endpoint is not configured
-            simulated_insights = [
-                f"O produto {opportunity.product_name} parece ter um bom potencial de ROI ({opportunity.roi_percentage:.2f}%).",
-                f"A diferença de preço para {opportunity.product_name} entre {opportunity.source_platform} e {opportunity.target_platform} é notável.",
-                "Considerar a liquidez e os custos de envio para esta oportunidade.",
-                "Uma análise mais aprofundada das tendências de mercado para esta categoria é recomendada."
-            ]
-            return f"(Insight Simulado) {random.choice(simulated_insights)}"
-
-        prompt = (
-            f"Analise esta oportunidade de arbitragem e forneça um breve insight (1-2 frases) sobre o seu potencial. "
-            f"Produto: '{opportunity.product_name}', "
-            f"Comprar em: '{opportunity.source_platform}' por {opportunity.source_price} {opportunity.source_currency}, "
-            f"Vender em: '{opportunity.target_platform}' por {opportunity.target_price} {opportunity.target_currency}, "
-            f"ROI Estimado: {opportunity.roi_percentage:.2f}%. "
-            f"Notas Adicionais: {opportunity.notes if opportunity.notes else 'N/A'}."
-        )
-
-        headers = {
-            "Authorization": f"Bearer {self.generative_ai_api_key}",
-            "Content-Type": "application/json"
-        }
-        # The payload structure depends heavily on the specific AI API being used.
-        # This is a generic example. For Google's Gemini, it would be different.
-        payload = {
-            "prompt": prompt,
-            "max_tokens": 60,
-            "temperature": 0.7
-        }
-
-        try:
-            print(f"🤖 Chamando API de IA generativa para insight sobre: {opportunity.product_name}")
-            response = requests.post(self.generative_ai_endpoint, headers=headers, json=payload, timeout=15)
-            response.raise_for_status() # Raises an exception for bad status codes (4xx or 5xx)
-
-            response_data = response.json()
-            # Again, parsing the response is API-specific.
-            # Example: response_data.get('choices', [{}])[0].get('text', '').strip() for some OpenAI-like APIs
-            # Example: response_data.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text') for Gemini
-
-            # Placeholder for actual parsing logic based on the chosen API
-            # For now, let's assume a simple structure for demonstration
-            insight_text = response_data.get("generated_text_insight", "Não foi possível extrair o insight da resposta da API.")
-
-            print(f"💡 Insight da IA recebido: {insight_text}")
-            return insight_text.strip()
+        return self.insights.get_insights([opportunity])[0]
 
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Erro ao chamar API de IA generativa: {e}")
-            return "(Erro ao obter insight da IA)"
-        except Exception as e:
-            print(f"❌ Erro inesperado ao processar resposta da IA: {e}")
-            return "(Erro ao processar insight da IA)"
+    def attach_generative_insights(self, opportunities: List[ArbitrageOpportunity]):
+        """Fills generative_insight for a whole scan: cached insights are reused and the rest are
+        requested in concurrent batches (see InsightService).
+        """
+        for opportunity, insight in zip(opportunities, self.insights.get_insights(opportunities)):
+            opportunity.generative_insight = insight
 
     # This function can be called by the scraper's calculate_arbitrage_opportunity or be used here
     # For now, let's assume the scraper provides opportunities with net_profit and roi_percentage already calculated
@@ -251,7 +259,7 @@ class AIArbitrageBrain:
                                          target_price: float) -> Optional[Dict]:
         """
         Calculates profit, ROI, and other financial details for a potential opportunity.
-        Uses platform_info for fees and shipping estimates.
+        Uses the shared cost model for shipping, duty and fee estimates.
         """
         source_platform_details = self.platform_info.get(source_platform_name)
         target_platform_details = self.platform_info.get(target_platform_name)
@@ -263,27 +271,23 @@ class AIArbitrageBrain:
         if source_price <= 0 or target_price <= 0: # Basic sanity check
             return None
 
-        # Estimated costs - these are highly variable and simplified for MVP
-        # Shipping from source: could be a % of price, flat fee, or from scraper
-        estimated_shipping_from_source = source_price * 0.10 # Default 10% if not provided
-        
-        # Target platform fees
-        target_platform_fee_percentage = target_platform_details.get('platform_fees_percentage', 0.15)
-        target_platform_fees = target_price * target_platform_fee_percentage
-        
-        # Other potential costs (simulated for now)
-        payment_processing_fees = target_price * 0.03 # e.g., 3%
-        misc_handling_costs = 1.0 # Small flat fee per item
+        # Compare both sides in USD
+        try:
+            source_price = self.fx.convert(source_price, source_platform_details.get('currency', 'USD'))
+            target_price = self.fx.convert(target_price, target_platform_details.get('currency', 'USD'))
+        except UnknownCurrencyError as e:
+            print(f"Cannot compare {source_platform_name} and {target_platform_name}: {e}")
+            return None
 
-        total_cost_of_goods = source_price + estimated_shipping_from_source
-        total_selling_expenses = target_platform_fees + payment_processing_fees + misc_handling_costs
+        # Costs from the shared cost model (same lanes and rates as the scraper and the global engine)
+        costs = self.cost_model.evaluate_pair(source_platform_name, target_platform_name, source_price, target_price,
+                                              self.get_product_category(product_name))
+        net_profit = costs.net_profit
 
-        net_profit = target_price - total_cost_of_goods - total_selling_expenses
-        
         if net_profit <= 0:
             return None # Not profitable
 
-        roi_on_investment = (net_profit / total_cost_of_goods) * 100 # ROI on COGS
+        roi_on_investment = costs.roi_percentage # ROI on the purchase price
 
         return {
             "product_name": product_name,
@@ -291,9 +295,9 @@ class AIArbitrageBrain:
             "source_price": source_price,
             "target_platform": target_platform_name,
             "target_price": target_price,
-            "estimated_shipping_from_source": round(estimated_shipping_from_source,2),
-            "estimated_target_platform_fees": round(target_platform_fees,2),
-            "estimated_other_costs": round(payment_processing_fees + misc_handling_costs, 2),
+            "estimated_shipping_from_source": round(costs.shipping_cost, 2),
+            "estimated_target_platform_fees": round(costs.platform_fee, 2),
+            "estimated_other_costs": round(costs.import_duty + costs.payment_fee + costs.fixed_fee, 2),
             "net_profit": round(net_profit, 2),
             "roi_percentage": round(roi_on_investment, 2),
             "source_currency": source_platform_details.get('currency', 'USD'),
@@ -301,18 +305,32 @@ class AIArbitrageBrain:
         }
 
 
-    def auto_execute_purchase(self, opportunity: ArbitrageOpportunity) -> Dict:
+    def submit_purchase(self, opportunity: ArbitrageOpportunity, idempotency_key: Optional[str] = None,
+                        owner: Optional[Hashable] = None, on_complete: Optional[Callable[[Order], None]] = None,
+                        auto_trading_enabled: Optional[bool] = None, daily_budget: Optional[float] = None) -> Dict:
         """
         EXECUÇÃO AUTOMÁTICA - A funcionalidade que VAI DESTRUIR a concorrência!
         Enquanto outros apenas "encontram", nós COMPRAMOS automaticamente!
+        Checks run right away; an accepted purchase is queued on the order pipeline and this
+        returns its handle ('queued') without waiting. The amount is reserved from the owner's daily
+        budget until the order fails. A repeated idempotency_key returns the existing order.
+        auto_trading_enabled / daily_budget are the owner's settings (a user's); None uses the
+        brain's own auto_trading_enabled / total_daily_budget.
         """
         # This remains heavily simulated as real auto-purchase is complex and risky for MVP
-        if not self.auto_trading_enabled:
+        if idempotency_key is not None:
+            existing = self.orders.find(idempotency_key)
+            if existing is not None:
+                return self.purchase_result(existing, duplicate=True, daily_budget=daily_budget)
+
+        if auto_trading_enabled is None:
+            auto_trading_enabled = self.auto_trading_enabled
+        if daily_budget is None:
+            daily_budget = self.total_daily_budget
+
+        if not auto_trading_enabled:
             return {'status': 'auto_trading_disabled', 'message': 'Auto-trading is currently disabled by the user.'}
         
-        if self.current_daily_spent + opportunity.source_price > self.total_daily_budget:
-            return {'status': 'budget_exceeded', 'message': f'Purchase of {opportunity.source_price} would exceed daily budget of {self.total_daily_budget}. Spent: {self.current_daily_spent}'}
-        
         if opportunity.roi_percentage < self.min_roi: # Using the class's min_roi
             return {'status': 'roi_too_low', 'message': f'Opportunity ROI {opportunity.roi_percentage:.2f}% is below minimum threshold {self.min_roi}%'}
         
@@ -320,55 +338,112 @@ class AIArbitrageBrain:
         if opportunity.confidence_score < self.risk_tolerance: # risk_tolerance is 0-1, higher means more tolerance
             return {'status': 'risk_too_high', 'message': f'Opportunity confidence score {opportunity.confidence_score:.2f} is below risk tolerance {self.risk_tolerance}'}
         
-        # Simulate purchase attempt
         purchase_amount = min(opportunity.source_price, self.max_investment_per_product)
-        print(f"🤖 Simulating purchase of '{opportunity.product_name}' from {opportunity.source_platform} for ${purchase_amount:.2f}")
-        time.sleep(random.uniform(0.5, 1.5)) # Simulate API call latency
-        
-        # Simulate success/failure (e.g., stock issues, payment failure)
-        simulated_success_rate = 0.85 # 85% chance of successful simulated purchase
-        if random.random() < simulated_success_rate:
-            self.current_daily_spent += purchase_amount
-            return {
+        with self._budget_lock: # Orders run concurrently: check and reserve in one step
+            self._roll_budget_day()
+            budget_day = self.budget_day
+            spent = self.daily_spent.get(owner, 0.0)
+            if spent + opportunity.source_price > daily_budget:
+                return {'status': 'budget_exceeded', 'message': f'Purchase of {opportunity.source_price} would exceed daily budget of {daily_budget}. Spent: {spent}'}
+            self.daily_spent[owner] = spent + purchase_amount
+
+        def _completed(order: Order):
+            if not order.succeeded:
+                self._release_budget(owner, purchase_amount, budget_day) # Release the reservation
+            if on_complete:
+                on_complete(order)
+
+        print(f"🤖 Queuing purchase of '{opportunity.product_name}' from {opportunity.source_platform} for ${purchase_amount:.2f}")
+        request = OrderRequest(opportunity.product_name, opportunity.source_platform, purchase_amount, opportunity.shipping_time)
+        order, created = self.orders.submit(request, idempotency_key, owner=owner, on_complete=_completed)
+        if not created: # Same key submitted concurrently: keep the first order, undo this reservation
+            self._release_budget(owner, purchase_amount, budget_day)
+        return self.purchase_result(order, duplicate=not created, daily_budget=daily_budget)
+
+    def purchase_result(self, order: Order, duplicate: bool = False, daily_budget: Optional[float] = None) -> Dict:
+        """API view of an order: 'queued'/'executing' while it runs, then the 'success'/'failed' result.
+        daily_budget is the order owner's (None: total_daily_budget), for the remaining budget.
+        """
+        request = order.request
+        if not order.done:
+            result = {
+                'status': order.status,
+                'message': f"Purchase of '{request.product_name}' for ${request.amount:.2f} is {order.status}.",
+                'order_id': order.order_id,
+                'product_name': request.product_name,
+                'amount': request.amount
+            }
+        elif order.succeeded:
+            result = {
                 'status': 'success',
-                'message': f"Simulated purchase of '{opportunity.product_name}' for ${purchase_amount:.2f} was successful.",
-                'product_name': opportunity.product_name,
-                'purchased_amount': purchase_amount,
-                'source_platform': opportunity.source_platform,
-                'simulated_order_id': f'SIM_ORD_{random.randint(100000, 999999)}',
-                'estimated_delivery_date': (datetime.now() + timedelta(days=opportunity.shipping_time)).isoformat(),
-                'daily_budget_remaining': self.total_daily_budget - self.current_daily_spent
+                'message': f"Simulated purchase of '{request.product_name}' for ${request.amount:.2f} was successful.",
+                'order_id': order.order_id,
+                'product_name': request.product_name,
+                'purchased_amount': request.amount,
+                'source_platform': request.source_platform,
+                'simulated_order_id': order.result.get('marketplace_order_id'),
+                'estimated_delivery_date': order.result.get('estimated_delivery_date'),
+                'daily_budget_remaining': (self.total_daily_budget if daily_budget is None else daily_budget) - self.daily_spent_for(order.owner)
             }
         else:
-            return {
+            result = {
                 'status': 'failed',
-                'message': f"Simulated purchase of '{opportunity.product_name}' failed. (e.g., out of stock, payment issue)",
-                'product_name': opportunity.product_name,
-                'attempted_amount': purchase_amount,
-                'reason': random.choice(['Simulated out of stock', 'Simulated payment error', 'Simulated price change'])
+                'message': f"Simulated purchase of '{request.product_name}' failed. (e.g., out of stock, payment issue)",
+                'order_id': order.order_id,
+                'product_name': request.product_name,
+                'attempted_amount': request.amount,
+                'reason': order.error
             }
-
-    def scan_global_opportunities(self) -> List[ArbitrageOpportunity]:
+        result.update(order.extra)
+        if duplicate:
+            result['duplicate'] = True
+        return result
+
+    def auto_execute_purchase(self, opportunity: ArbitrageOpportunity, idempotency_key: Optional[str] = None) -> Dict:
+        """submit_purchase, then waits for the order to finish (for callers that need the outcome inline)"""
+        submitted = self.submit_purchase(opportunity, idempotency_key)
+        order = self.orders.get(submitted['order_id']) if 'order_id' in submitted else None
+        if order is None:
+            return submitted
+        self.orders.wait([order])
+        return self.purchase_result(order, duplicate=submitted.get('duplicate', False))
+
+    def scan_global_opportunities(self, progress: Optional[Callable[[int, int], None]] = None) -> List[ArbitrageOpportunity]:
         """
         SCAN GLOBAL - Muito mais abrangente que Tactical Arbitrage ou SourceMogul
         Escaneia TODOS os mercados globais simultaneamente (integrating scraper)
+        progress(done, total), if given, is called after each product (used by scan jobs)
         """
         all_generated_opportunities = []
         print(f"🌍 INICIANDO SCAN GLOBAL DE ARBITRAGEM (AI Brain)...")
         print(f"🧠 Produtos para scan: {self.products_to_scan}")
 
-        for product_name_query in self.products_to_scan:
+        total_products = len(self.products_to_scan)
+        for products_done, product_name_query in enumerate(self.products_to_scan):
+            if progress:
+                progress(products_done, total_products)
             print(f"\n🔍 Analisando produto: {product_name_query}")
             
             # 1. Get data from scraper
             # The scraper's run_scraping_cycle returns a dict with 'summary' and 'opportunities'
             # We are interested in the 'opportunities' found by the scraper for this product_name_query
-            # For a single product query, we'd call scrape_all_sites_for_product
-            scraped_data_list = self.scraper.scrape_all_sites_for_product(product_name_query)
+            # For a single product query, sites that are due in the adaptive refresh scheduler are
+            # scraped and the others are read from the local price history
+            # Repeated scans within scrape_cache_ttl_seconds reuse the collected versions from memory
+            # (nothing is fetched, so there is no refresh outcome to record)
+            cached_versions = self.scrape_cache.get('scraper', product_name_query)
+            if cached_versions is not None:
+                scraped_data_list, fetched_sites = cached_versions, []
+            else:
+                scraped_data_list, fetched_sites = self.scraper.collect_product_versions(product_name_query)
+                if scraped_data_list:
+                    self.scrape_cache.put('scraper', product_name_query, scraped_data_list)
 
             # The scraper's calculate_arbitrage_opportunity can find direct arbitrage paths
             # based on its predefined logic (e.g., AliE -> Amz)
-            scraper_opportunities = self.scraper.calculate_arbitrage_opportunity(scraped_data_list, self.min_roi)
+            scraper_opportunities = self.scraper.calculate_arbitrage_opportunity(
+                scraped_data_list, self.min_roi, category=self.get_product_category(product_name_query))
+            self.scraper.record_refresh_outcome(product_name_query, fetched_sites, scraped_data_list, scraper_opportunities)
 
             if scraper_opportunities:
                 print(f"    scraper encontrou {len(scraper_opportunities)} oportunidades para '{product_name_query}'")
@@ -415,12 +490,8 @@ class AIArbitrageBrain:
                         target_url=opp['sell_url'],
                         notes="Data primarily from live scrape."
                     )
-                    # Get generative insight
-                    arbitrage_opp.generative_insight = self.get_generative_insight(arbitrage_opp)
                     all_generated_opportunities.append(arbitrage_opp)
                     print(f"   ✅ Oportunidade REAL (com IA scores): {arbitrage_opp.product_name} ROI: {arbitrage_opp.roi_percentage:.2f}%")
-                    if arbitrage_opp.generative_insight:
-                        print(f"      🤖 Insight da IA: {arbitrage_opp.generative_insight}")
 
 
             else: # No direct arbitrage from scraper, try to simulate or find other paths
@@ -481,15 +552,41 @@ class AIArbitrageBrain:
                             auto_buy_recommended=(financials['roi_percentage'] > self.min_roi + 20 and confidence_score > 0.75),
                             notes="Data is SIMULATED."
                         )
-                        # Get generative insight for simulated opportunity too
-                        sim_opportunity.generative_insight = self.get_generative_insight(sim_opportunity)
                         all_generated_opportunities.append(sim_opportunity)
                         print(f"   💡 Oportunidade SIMULADA: {sim_opportunity.product_name} ROI: {sim_opportunity.roi_percentage:.2f}%")
-                        if sim_opportunity.generative_insight:
-                            print(f"      🤖 Insight da IA (Simulada): {sim_opportunity.generative_insight}")
+
+        # Generative insights for every opportunity of the scan at once (batched, concurrent, cached)
+        self.attach_generative_insights(all_generated_opportunities)
+        for opportunity in all_generated_opportunities:
+            if opportunity.generative_insight:
+                print(f"   🤖 Insight da IA ({opportunity.product_name}): {opportunity.generative_insight}")
+        if progress:
+            progress(total_products, total_products)
 
         return all_generated_opportunities
 
+    def scan_shared_opportunities(self, progress: Optional[Callable[[int, int], None]] = None) -> Tuple[List[ArbitrageOpportunity], str]:
+        """
+        scan_global_opportunities shared by all users: concurrent callers join the scan in flight
+        and later ones reuse its result for shared_scan_ttl_seconds (see SingleFlight), so the
+        sites are scraped once however many users scan. Returns (opportunities, 'fresh'|'shared'|'cached');
+        the list is shared, so per-user views must be built with filter_opportunities_for_user.
+        """
+        key = (tuple(self.products_to_scan), self.min_roi)
+        return self.shared_scans.do(key, lambda: self.scan_global_opportunities(progress=progress))
+
+    def filter_opportunities_for_user(self, opportunities: List[ArbitrageOpportunity], min_roi: Optional[float] = None,
+                                      daily_budget: Optional[float] = None) -> List[ArbitrageOpportunity]:
+        """
+        A user's view of a shared scan: opportunities at or above their min ROI (never below the
+        scan's own self.min_roi) whose source price fits their daily budget. Nothing is copied.
+        """
+        roi_floor = self.min_roi if min_roi is None else max(min_roi, self.min_roi)
+        return [
+            opp for opp in opportunities
+            if opp.roi_percentage >= roi_floor and (daily_budget is None or opp.source_price <= daily_budget)
+        ]
+
     def generate_ai_insights(self, opportunities: List[ArbitrageOpportunity]) -> Dict:
         """
         INSIGHTS DE IA - Funcionalidade que deixa a concorrência no pó!
@@ -597,62 +694,69 @@ class AIArbitrageBrain:
         recommendation += "Reveja os detalhes e ajuste a sua estratégia conforme necessário."
         return recommendation
 
-    def start_continuous_monitoring(self):
+    def run_monitoring_cycle(self):
+        """Um ciclo de monitoring: scan (partilhado com os utilizadores), insights e auto-compras"""
+        print(f"\n🤖 [{datetime.now().strftime('%H:%M:%S')}] Executando ciclo de monitoring e arbitragem...")
+        # The shared scan also refreshes the result users' scan jobs read
+        opportunities, _ = self.scan_shared_opportunities()
+        
+        if opportunities:
+            insights = self.generate_ai_insights(opportunities)
+            print(f"\n📊 INSIGHTS DE IA DO MONITORING:")
+            print(f"   {insights.get('summary_message')}")
+            print(f"   Oportunidades lucrativas: {insights.get('total_profitable_opportunities', 0)}")
+            print(f"   Melhor ROI: {insights.get('best_opportunity_details', {}).get('roi', 0)}% para {insights.get('best_opportunity_details', {}).get('product', 'N/A')}")
+            print(f"   Recomendação: {insights.get('ai_text_recommendation')}")
+
+            # Simulate auto-execution based on new opportunities: every auto-buy is queued at once and
+            # the pipeline runs them in parallel. The idempotency key stops a later cycle (or a restart
+            # replaying the same scan) from buying the same opportunity twice on the same day.
+            queued_orders = []
+            for opp in opportunities:
+                if opp.auto_buy_recommended:
+                    if self.auto_trading_enabled: # Check global setting
+                        key = f"auto:{datetime.now().date()}:{opp.product_name}:{opp.source_platform}:{opp.source_price}:{opp.target_platform}"
+                        purchase_result = self.submit_purchase(opp, idempotency_key=key)
+                        if purchase_result.get('order_id') and not purchase_result.get('duplicate'):
+                            queued_orders.append(self.orders.get(purchase_result['order_id']))
+                        else:
+                            print(f"      ↪️ Tentativa de Auto-Compra: {opp.product_name} - {purchase_result['status']}: {purchase_result['message']}")
+                    else:
+                        print(f"      ℹ️ Auto-Compra para {opp.product_name} não executada (Auto-Trading desabilitado globalmente).")
+
+            self.orders.wait([order for order in queued_orders if order is not None])
+            auto_executed_count = 0
+            for order in queued_orders:
+                if order is None:
+                    continue
+                purchase_result = self.purchase_result(order)
+                print(f"      ↪️ Tentativa de Auto-Compra: {order.request.product_name} - {purchase_result['status']}: {purchase_result['message']}")
+                if purchase_result['status'] == 'success':
+                    auto_executed_count += 1
+            
+            if auto_executed_count > 0:
+                print(f"\n🚀 {auto_executed_count} COMPRAS SIMULADAS EXECUTADAS AUTOMATICAMENTE NO CICLO!")
+        else:
+            print("   📉 Nenhuma oportunidade encontrada neste ciclo de monitoring.")
+        # The daily budget resets when the date changes (_roll_budget_day), not in a window around midnight
+
+    def start_continuous_monitoring(self, lock_path: Optional[str] = None) -> MonitoringScheduler:
         """
         MONITORING CONTÍNUO 24/7 - Funcionalidade que NENHUMA concorrência tem!
         Sistema roda 24/7 procurando oportunidades e executando automaticamente
+        Starts run_monitoring_cycle on a background scheduler thread every
+        monitoring_interval_minutes (jittered range). Safe to call from every gunicorn worker:
+        the lock file elects one of them to run it. Returns the scheduler (stop() to shut it down).
         """
-        # This function, if called, would run indefinitely.
-        # For Render free tier, long-running background tasks can be tricky.
-        # Consider if this should be triggered by an external scheduler (e.g., Render Cron Job)
-        # or if the app is expected to be always on.
-
-        def _monitor_job():
-            print(f"\n🤖 [{datetime.now().strftime('%H:%M:%S')}] Executando ciclo de monitoring e arbitragem...")
-            opportunities = self.scan_global_opportunities() # This now uses the scraper
-            
-            if opportunities:
-                insights = self.generate_ai_insights(opportunities)
-                print(f"\n📊 INSIGHTS DE IA DO MONITORING:")
-                print(f"   {insights.get('summary_message')}")
-                print(f"   Oportunidades lucrativas: {insights.get('total_profitable_opportunities', 0)}")
-                print(f"   Melhor ROI: {insights.get('best_opportunity_details', {}).get('roi', 0)}% para {insights.get('best_opportunity_details', {}).get('product', 'N/A')}")
-                print(f"   Recomendação: {insights.get('ai_text_recommendation')}")
-
-                # Simulate auto-execution based on new opportunities
-                auto_executed_count = 0
-                for opp in opportunities:
-                    if opp.auto_buy_recommended:
-                        if self.auto_trading_enabled: # Check global setting
-                            purchase_result = self.auto_execute_purchase(opp)
-                            print(f"      ↪️ Tentativa de Auto-Compra: {opp.product_name} - {purchase_result['status']}: {purchase_result['message']}")
-                            if purchase_result['status'] == 'success':
-                                auto_executed_count += 1
-                        else:
-                            print(f"      ℹ️ Auto-Compra para {opp.product_name} não executada (Auto-Trading desabilitado globalmente).")
-                
-                if auto_executed_count > 0:
-                    print(f"\n🚀 {auto_executed_count} COMPRAS SIMULADAS EXECUTADAS AUTOMATICAMENTE NO CICLO!")
-            else:
-                print("   📉 Nenhuma oportunidade encontrada neste ciclo de monitoring.")
-            
-            # Reset daily budget at midnight (conceptual)
-            # Actual reset might need to be handled more robustly depending on deployment
-            if datetime.now().hour == 0 and datetime.now().minute < 5 : # Check a small window around midnight
-                 if self.current_daily_spent > 0: # Only reset if it was used
-                    print(f"💰 [{datetime.now().strftime('%H:%M:%S')}] ORÇAMENTO DIÁRIO RESETADO. Gasto anterior: ${self.current_daily_spent:.2f}")
-                    self.current_daily_spent = 0
-
-
-        print("🤖 [INFO] Sistema de Monitoring Contínuo Configurado (conceitualmente).")
-        print("   -> Para execução real, agendar _monitor_job externamente ou executar em thread dedicada.")
-
-        # Example of how it might run in a thread (commented out to prevent blocking main thread if not desired)
-        # schedule.every(30).minutes.do(_monitor_job)
-        # print("   -> Agendado para rodar a cada 30 minutos.")
-        # while True:
-        #     schedule.run_pending()
-        #     time.sleep(1) # Check every second
+        if self.monitoring is None:
+            self.monitoring = MonitoringScheduler(
+                self.run_monitoring_cycle, *self.monitoring_interval_minutes,
+                lock_path=lock_path or DEFAULT_LOCK_PATH
+            )
+        self.monitoring.start()
+        print(f"🤖 [INFO] Monitoring contínuo ativo: a cada {self.monitoring_interval_minutes[0]}-{self.monitoring_interval_minutes[1]} minutos "
+              f"(só o worker com o lock executa)")
+        return self.monitoring
 
 # Main function for direct testing of the AI Brain
 if __name__ == "__main__":
@@ -0,0 +1,345 @@
+"""
+GPAS 4.0 - Offline Benchmarks
+Measures scraper hot paths without touching live sites. The scraper suite replays recorded
+fixtures (see fixture_transport) and falls back to synthetic pages when none were recorded.
+Run with: python -m src.services.benchmarks [--fixtures DIR] [--iterations N] [--cost-model 10000 10000]
+          [--opportunities 10000 10000]
+"""
+
+import argparse
+import io
+import json
+import random
+import re
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Dict, List
+
+from .html_parser import HtmlParser, available_backends
+from .fixture_transport import load_fixture, save_fixture
+from .opportunity_batch import OpportunityBatch
+
+_COMPOUND_RE = re.compile(r'^(?P<tag>[a-zA-Z][\w-]*)?(?P<rest>.*)$')
+_CLASS_RE = re.compile(r'\.([\w-]+)')
+_ATTR_RE = re.compile(r'\[\s*([\w-]+)\s*(?:\*?=\s*["\']?([^"\'\]]*)["\']?)?\s*\]')
+
+
+def _element_for_selector(selector: str, inner: str) -> str:
+    """Builds markup matched by a CSS selector (first alternative, descendant combinators only)."""
+    compounds = [part for part in selector.split(',')[0].split() if part != '>']
+    html = inner
+    for compound in reversed(compounds):
+        match = _COMPOUND_RE.match(compound)
+        tag = match.group('tag') or 'div'
+        classes = _CLASS_RE.findall(match.group('rest'))
+        attrs = []
+        for name, value in _ATTR_RE.findall(match.group('rest')):
+            if name == 'class':
+                classes.append(value)
+            else:
+                attrs.append(f'{name}="{value or 1}"')
+        if classes:
+            attrs.insert(0, f'class="{" ".join(classes)}"')
+        html = f"<{tag} {' '.join(attrs)}>{html}</{tag}>" if attrs else f"<{tag}>{html}</{tag}>"
+    return html
+
+
+def build_synthetic_search_page(site_config: Dict, product_query: str, n_items: int = 60, filler_kb: int = 20, seed: int = 42) -> bytes:
+    """Builds a large search results page shaped by the site's selectors: n_items product
+    containers surrounded by the scripts, navigation and ads that dominate real pages.
+    """
+    rng = random.Random(seed)
+    filler_unit = '<div class="s-widget"><a href="/ref=sr_nav">nav</a><span class="a-badge">Sponsored</span></div>'
+    filler = filler_unit * max(1, (filler_kb * 1024) // len(filler_unit))
+    script = '<script type="text/javascript">var P={};' + 'P.x=function(a){return a};' * 200 + '</script>'
+
+    parts = ['<!DOCTYPE html><html><head><title>Search</title>', script, '</head><body>']
+    for i in range(n_items):
+        title = _element_for_selector(site_config['title_selector'], f"{product_query} - Variant {i}")
+        price = _element_for_selector(site_config['price_selector'], f"{site_config['currency_symbol']}{rng.uniform(5, 80):.2f}")
+        parts.append(_element_for_selector(site_config['product_item_selector'], f'<div class="img"><img src="/i/{i}.jpg"></div>{title}{price}'))
+        parts.append(filler)
+    parts.append('</body></html>')
+    return ''.join(parts).encode('utf-8')
+
+
+def benchmark_parsers(content: bytes, item_selector: str, repeat: int = 5, limit: int = 3) -> List[Dict]:
+    """Parse time (median ms) and peak memory per backend, full page vs. product subtrees only."""
+    results = []
+    for backend in available_backends():
+        for restricted in (False, True):
+            parser = HtmlParser(backend, restrict_to_items=restricted)
+            timings = []
+            items = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                items = parser.select_items(content, item_selector, limit=limit)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            tracemalloc.start()
+            parser.select_items(content, item_selector, limit=limit)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results.append({
+                'backend': backend,
+                'mode': 'subtrees' if restricted else 'full',
+                'parse_ms': round(statistics.median(timings), 2),
+                'peak_kb': round(peak / 1024, 1),
+                'items': len(items)
+            })
+
+    baseline = next(r for r in results if r['backend'] == 'html.parser' and r['mode'] == 'full')
+    for r in results:
+        r['speedup'] = round(baseline['parse_ms'] / r['parse_ms'], 2) if r['parse_ms'] else 0.0
+        r['memory_reduction'] = round(baseline['peak_kb'] / r['peak_kb'], 2) if r['peak_kb'] else 0.0
+    return results
+
+
+def print_results(title: str, results: List[Dict]):
+    print(f"\n📊 {title}")
+    if not results:
+        return
+    columns = list(results[0].keys())
+    print("  " + " | ".join(f"{c:>16}" for c in columns))
+    for r in results:
+        print("  " + " | ".join(f"{str(r[c]):>16}" for c in columns))
+
+
+def run_parser_benchmarks(site_configs: Dict[str, Dict], product_query: str = "Xiaomi Mi Band 8") -> Dict[str, List[Dict]]:
+    all_results = {}
+    for site_key, site_config in site_configs.items():
+        page = build_synthetic_search_page(site_config, product_query)
+        results = benchmark_parsers(page, site_config['product_item_selector'])
+        print_results(f"Parser {site_key} ({len(page) / 1024:.0f} KB)", results)
+        all_results[site_key] = results
+    return all_results
+
+
+def ensure_fixtures(engine, directory: str, queries: List[str]) -> int:
+    """Writes a synthetic fixture for every (site, query) that has no recorded one.
+    Returns how many were generated.
+    """
+    generated = 0
+    for site_key, site_config in engine.target_sites.items():
+        for query in queries:
+            if load_fixture(directory, site_key, query) is None:
+                url = site_config['search_url'].format(query)
+                save_fixture(directory, site_key, query, url, build_synthetic_search_page(site_config, query),
+                             headers={'Content-Type': 'text/html; charset=utf-8'})
+                generated += 1
+    return generated
+
+
+def _time_per_call_us(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return round((time.perf_counter() - start) / calls * 1e6, 2)
+
+
+def benchmark_scraper(engine, fixture_dir: str, queries: List[str], iterations: int = 3) -> List[Dict]:
+    """Per site: end-to-end pages/sec through the replay transport, parse ms/page,
+    allocations per page and the cost of extract_price/extract_title.
+    """
+    engine.use_fixtures('replay', fixture_dir)
+    engine.use_response_cache = False
+    results = []
+
+    for site_key, site_config in engine.target_sites.items():
+        urls = {q: site_config['search_url'].format(q) for q in queries}
+        bodies = {q: load_fixture(fixture_dir, site_key, q)[0] for q in queries}
+
+        with redirect_stdout(io.StringIO()): # The scraper is chatty; keep the report readable
+            start = time.perf_counter()
+            for _ in range(iterations):
+                for query in queries:
+                    engine.scrape_site_for_product(site_key, query)
+            elapsed = time.perf_counter() - start
+            pages = iterations * len(queries)
+
+            parse_timings = []
+            for query in queries:
+                t0 = time.perf_counter()
+                engine.extract_products_from_page(bodies[query], site_key, query, urls[query])
+                parse_timings.append((time.perf_counter() - t0) * 1000)
+
+            tracemalloc.start()
+            engine.scrape_site_for_product(site_key, queries[0])
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            alloc_blocks = sum(stat.count for stat in snapshot.statistics('filename'))
+
+            items = engine.html_parser.select_items(bodies[queries[0]], site_config['product_item_selector'], limit=1)
+            price_text = f"{site_config['currency_symbol']}1,234.56"
+
+        results.append({
+            'site': site_key,
+            'pages': pages,
+            'pages_per_sec': round(pages / elapsed, 2) if elapsed else 0.0,
+            'parse_ms_page': round(statistics.median(parse_timings), 2),
+            'alloc_blocks': alloc_blocks,
+            'peak_kb_page': round(peak / 1024, 1),
+            'price_us': _time_per_call_us(lambda: engine.extract_price(price_text, site_config['currency_symbol']), 10000),
+            'title_us': _time_per_call_us(lambda: engine.extract_title(items[0], site_config['title_selector']), 1000) if items else 0.0
+        })
+
+    engine.use_fixtures(None)
+    return results
+
+
+
+def _scalar_global_opportunity(engine, source_product: Dict, target_markets: List[Dict]) -> List[Dict]:
+    """Reference: one CostModel.evaluate_pair call per pair, as calculate_global_opportunity did
+    before the cost matrix.
+    """
+    opportunities = []
+    source_price_usd = engine.convert_to_usd(source_product['price'], source_product['currency'])
+    for target in target_markets:
+        target_price_usd = engine.convert_to_usd(target['price'], target['currency'])
+        costs = engine.cost_model.evaluate_pair(source_product['market'], target['market'], source_price_usd, target_price_usd)
+        if costs.roi_percentage > 100:
+            opportunities.append({
+                'source_market': source_product['market'], 'source_price': source_product['price'],
+                'source_currency': source_product['currency'], 'source_url': source_product['url'],
+                'target_market': target['market'], 'target_price': target['price'],
+                'target_currency': target['currency'], 'target_url': target['url'],
+                'product_title': source_product['title'],
+                'source_price_usd': source_price_usd, 'target_price_usd': target_price_usd,
+                'shipping_cost': costs.shipping_cost, 'import_duty': costs.import_duty, 'platform_fee': costs.platform_fee,
+                'payment_fee': costs.payment_fee, 'handling_fee': costs.fixed_fee,
+                'total_costs': costs.total_costs, 'gross_profit': costs.net_profit, 'roi_percentage': costs.roi_percentage,
+                'profit_category': engine.categorize_roi(costs.roi_percentage),
+                'estimated_shipping_days': engine.global_markets[source_product['market']]['avg_shipping_days'],
+                'risk_level': engine.calculate_risk_level(source_product['market'], target['market']),
+                'timestamp': datetime.now().isoformat()
+            })
+    return sorted(opportunities, key=lambda x: x['roi_percentage'], reverse=True)
+
+
+def build_synthetic_listings(engine, n_sources: int, n_targets: int, seed: int = 42):
+    """Source listings from the engine's source markets and target listings in USD/EUR/GBP.
+    Price ranges are chosen so only a small share of pairs clears the 100% ROI cut, as in real scans.
+    """
+    rng = random.Random(seed)
+    source_markets = [k for k, m in engine.global_markets.items() if m['market_type'] == 'source']
+    target_markets = ['amazon_us', 'amazon_de', 'amazon_uk']
+    sources = [{
+        'market': rng.choice(source_markets), 'title': f"Product {i}", 'price': round(rng.uniform(25, 80), 2),
+        'currency': 'USD', 'url': f"https://example.com/s/{i}"
+    } for i in range(n_sources)]
+    targets = []
+    for j in range(n_targets):
+        market = rng.choice(target_markets)
+        currency = engine.global_markets[market]['currency']
+        targets.append({'market': market, 'title': f"Product {j}", 'price': round(rng.uniform(10, 70), 2),
+                        'currency': currency, 'url': f"https://example.com/t/{j}"})
+    return sources, targets
+
+
+def benchmark_cost_model(engine, n_sources: int = 10000, n_targets: int = 10000, scalar_sources: int = 50) -> List[Dict]:
+    """Vectorized cost matrix vs. the per-pair loop. The loop is timed on scalar_sources rows and
+    extrapolated to the full matrix (running it on 10^8 pairs takes minutes); outputs are compared
+    on that sample, ignoring timestamps.
+    """
+    sources, targets = build_synthetic_listings(engine, n_sources, n_targets)
+    sample = sources[:scalar_sources]
+
+    start = time.perf_counter()
+    scalar_results = [_scalar_global_opportunity(engine, source, targets) for source in sample]
+    scalar_elapsed = (time.perf_counter() - start) * n_sources / len(sample)
+
+    vector_sample = engine.calculate_global_opportunities(sample, targets)
+    strip = lambda rows: [{k: v for k, v in r.items() if k != 'timestamp'} for r in rows]
+    identical = all(strip(a) == strip(b) for a, b in zip(scalar_results, vector_sample))
+
+    start = time.perf_counter()
+    vector_results = engine.calculate_global_opportunities(sources, targets)
+    vector_elapsed = time.perf_counter() - start
+    survivors = sum(len(r) for r in vector_results)
+
+    pairs = n_sources * n_targets
+    return [
+        {'engine': 'per-pair loop', 'pairs': pairs, 'seconds': round(scalar_elapsed, 2),
+         'pairs_per_sec': round(pairs / scalar_elapsed), 'survivors': '-', 'speedup': 1.0, 'identical': '-'},
+        {'engine': 'numpy matrix', 'pairs': pairs, 'seconds': round(vector_elapsed, 2),
+         'pairs_per_sec': round(pairs / vector_elapsed), 'survivors': survivors,
+         'speedup': round(scalar_elapsed / vector_elapsed, 1), 'identical': identical}
+    ]
+
+def benchmark_opportunity_batch(engine, n_sources: int = 10000, n_targets: int = 10000, min_roi: float = 50.0) -> List[Dict]:
+    """Memory held per opportunity and JSON serialization time of a scan's opportunities, as
+    columnar batches vs. the former list of per-opportunity dicts (rebuilt with to_records).
+    """
+    sources, targets = build_synthetic_listings(engine, n_sources, n_targets)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    batches = engine.calculate_global_opportunities(sources, targets, min_roi=min_roi)
+    batch_bytes = tracemalloc.get_traced_memory()[0] - before
+    records = [record for batch in batches for record in batch.to_records()]
+    dict_bytes = tracemalloc.get_traced_memory()[0] - before - batch_bytes
+    tracemalloc.stop()
+
+    n = len(records)
+    scan = OpportunityBatch.concat(batches)
+    start = time.perf_counter()
+    json.dumps(records, ensure_ascii=False)
+    dict_json = time.perf_counter() - start
+    start = time.perf_counter()
+    scan.to_json('records')
+    batch_records_json = time.perf_counter() - start
+    start = time.perf_counter()
+    scan.to_json('columns')
+    batch_columns_json = time.perf_counter() - start
+
+    per_opp = lambda nbytes: round(nbytes / n) if n else 0
+    return [
+        {'storage': 'list of dicts', 'opportunities': n, 'bytes_per_opp': per_opp(dict_bytes),
+         'json_ms': round(dict_json * 1000, 1), 'memory_ratio': 1.0},
+        {'storage': 'batch (records)', 'opportunities': n, 'bytes_per_opp': per_opp(batch_bytes),
+         'json_ms': round(batch_records_json * 1000, 1), 'memory_ratio': round(dict_bytes / batch_bytes, 1) if batch_bytes else '-'},
+        {'storage': 'batch (columns)', 'opportunities': n, 'bytes_per_opp': per_opp(batch_bytes),
+         'json_ms': round(batch_columns_json * 1000, 1), 'memory_ratio': round(dict_bytes / batch_bytes, 1) if batch_bytes else '-'}
+    ]
+
+if __name__ == "__main__":
+    from .global_scraper import ScraperEngine
+
+    parser = argparse.ArgumentParser(description="Benchmarks offline do scraper GPAS 4.0")
+    parser.add_argument('--fixtures', help="Diretório de fixtures gravadas (por omissão: páginas sintéticas)")
+    parser.add_argument('--iterations', type=int, default=3)
+    parser.add_argument('--skip-parsers', action='store_true', help="Não correr a comparação de parsers")
+    parser.add_argument('--cost-model', type=int, nargs=2, metavar=('SOURCES', 'TARGETS'),
+                        help="Também medir o modelo de custos vetorizado (ex.: --cost-model 10000 10000)")
+    parser.add_argument('--opportunities', type=int, nargs=2, metavar=('SOURCES', 'TARGETS'),
+                        help="Também medir memória e JSON dos lotes de oportunidades (ex.: --opportunities 10000 10000)")
+    args = parser.parse_args()
+
+    print("🚀 GPAS 4.0 - Benchmarks offline")
+    print("=" * 60)
+    engine = ScraperEngine()
+    if not args.skip_parsers:
+        run_parser_benchmarks(engine.target_sites)
+
+    fixture_dir = args.fixtures or tempfile.mkdtemp(prefix='gpas4_fixtures_')
+    generated = ensure_fixtures(engine, fixture_dir, engine.target_products)
+    print(f"\n📁 Fixtures: {fixture_dir} ({generated} sintéticas geradas)")
+    print_results(f"Scraper (replay, {args.iterations} iterações)", benchmark_scraper(engine, fixture_dir, engine.target_products, args.iterations))
+
+    if args.cost_model:
+        from .global_arbitrage_engine import GlobalArbitrageEngine
+        n_sources, n_targets = args.cost_model
+        print_results(f"Modelo de custos ({n_sources} x {n_targets} pares)",
+                      benchmark_cost_model(GlobalArbitrageEngine(), n_sources, n_targets))
+
+    if args.opportunities:
+        from .global_arbitrage_engine import GlobalArbitrageEngine
+        n_sources, n_targets = args.opportunities
+        print_results(f"Lotes de oportunidades ({n_sources} x {n_targets} pares)",
+                      benchmark_opportunity_batch(GlobalArbitrageEngine(), n_sources, n_targets))
@@ -0,0 +1,225 @@
+"""
+GPAS 4.0 - Sharded Catalog Scan
+Splits a large product catalog into shards and scans them across a pool of worker processes.
+Each finished shard is checkpointed to disk, so an interrupted pass resumes where it stopped.
+Run with: python -m src.services.catalog_scan catalog.txt [--workers N] [--shard-size N]
+"""
+
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from contextlib import nullcontext, redirect_stdout
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .top_k import GroupedTopK, by_field
+
+
+def load_catalog(path: str) -> List[str]:
+    """Reads a catalog: a JSON list of product names, or a text file with one product per line."""
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = f.read()
+    if raw.lstrip().startswith('['):
+        return [str(p).strip() for p in json.loads(raw) if str(p).strip()]
+    return [line.strip() for line in raw.splitlines() if line.strip() and not line.startswith('#')]
+
+
+def _write_json_atomic(path: str, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+# --- Worker process side ---
+
+_worker_engine = None
+_worker_quiet = True
+
+
+def _init_worker(fixture_mode: Optional[str], fixture_dir: Optional[str], rate_divisor: int, quiet: bool):
+    """Builds one ScraperEngine per worker process. With rate_divisor > 1 each worker gets an
+    equal share of the per-host rate, so the pool as a whole stays as polite as one process.
+    """
+    global _worker_engine, _worker_quiet
+    from .global_scraper import ScraperEngine
+
+    _worker_quiet = quiet
+    with redirect_stdout(io.StringIO()) if quiet else nullcontext():
+        _worker_engine = ScraperEngine()
+        if fixture_mode:
+            _worker_engine.use_fixtures(fixture_mode, fixture_dir)
+        elif rate_divisor > 1:
+            for site_config in _worker_engine.target_sites.values():
+                _worker_engine.rate_limiter.configure_host(site_config['base_url'],
+                                                           rate=_worker_engine.per_host_rate / rate_divisor,
+                                                           jitter=_worker_engine.per_host_jitter)
+
+
+def _scan_shard(task: Tuple[int, List[str]]) -> Dict:
+    shard_index, products = task
+    start = time.perf_counter()
+    summaries = []
+    opportunities = []
+    with redirect_stdout(io.StringIO()) if _worker_quiet else nullcontext():
+        for product_query in products:
+            versions = _worker_engine.scrape_all_sites_for_product(product_query)
+            product_opportunities = _worker_engine.calculate_arbitrage_opportunity(versions) if versions else []
+            summaries.append({
+                'product_query': product_query,
+                'versions_found': len(versions),
+                'opportunities_for_this_product': len(product_opportunities)
+            })
+            opportunities.extend(product_opportunities)
+    return {
+        'shard_index': shard_index,
+        'worker_pid': os.getpid(),
+        'products_scanned': len(products),
+        'products_scraped_details': summaries,
+        'opportunities': opportunities,
+        'duration_seconds': round(time.perf_counter() - start, 3)
+    }
+
+
+# --- Coordinator side ---
+
+class CatalogScanJob:
+    """A resumable, sharded scan over a product catalog.
+    Checkpoints live in <checkpoint_dir>/<job_id>/: a manifest plus one result file per shard.
+    The job id is derived from the catalog and shard size, so re-running the same catalog resumes it.
+    """
+
+    def __init__(self, products: List[str], shard_size: int = 50, workers: Optional[int] = None,
+                 checkpoint_dir: str = 'scan_checkpoints', job_id: Optional[str] = None,
+                 fixture_mode: Optional[str] = None, fixture_dir: Optional[str] = None,
+                 share_host_rate: bool = True, quiet: bool = True):
+        self.products = products
+        self.shard_size = max(1, shard_size)
+        self.workers = workers or os.cpu_count() or 1
+        self.fixture_mode = fixture_mode
+        self.fixture_dir = fixture_dir
+        self.share_host_rate = share_host_rate
+        self.quiet = quiet
+        self.shards = [products[i:i + self.shard_size] for i in range(0, len(products), self.shard_size)]
+
+        if job_id is None:
+            digest = hashlib.sha1(json.dumps([self.shard_size, products]).encode('utf-8')).hexdigest()
+            job_id = f"catalog-{digest[:12]}"
+        self.job_id = job_id
+        self.job_dir = os.path.join(checkpoint_dir, job_id)
+        os.makedirs(self.job_dir, exist_ok=True)
+        self.manifest_path = os.path.join(self.job_dir, 'manifest.json')
+        if not os.path.exists(self.manifest_path):
+            _write_json_atomic(self.manifest_path, {
+                'job_id': self.job_id,
+                'created_at': datetime.now().isoformat(),
+                'shard_size': self.shard_size,
+                'total_shards': len(self.shards),
+                'total_products': len(self.products)
+            })
+
+        self.started_at = None
+        self.shards_done = 0
+        self.products_done = 0
+
+    def _shard_path(self, shard_index: int) -> str:
+        return os.path.join(self.job_dir, f"shard_{shard_index:06d}.json")
+
+    def pending_shards(self) -> List[int]:
+        return [i for i in range(len(self.shards)) if not os.path.exists(self._shard_path(i))]
+
+    def progress(self) -> Dict:
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        remaining = len(self.products) - self.products_done
+        rate = self.products_done / elapsed if elapsed and self.products_done else 0.0
+        return {
+            'job_id': self.job_id,
+            'shards_done': self.shards_done,
+            'total_shards': len(self.shards),
+            'products_done': self.products_done,
+            'total_products': len(self.products),
+            'percent': round(100.0 * self.products_done / len(self.products), 1) if self.products else 100.0,
+            'products_per_second': round(rate, 2),
+            'eta_seconds': round(remaining / rate, 1) if rate else None
+        }
+
+    def run(self, progress_callback: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Scans every pending shard and returns the merged results of the whole catalog."""
+        pending = self.pending_shards()
+        pending_set = set(pending)
+        self.shards_done = len(self.shards) - len(pending)
+        self.products_done = sum(len(shard) for i, shard in enumerate(self.shards) if i not in pending_set)
+        self.started_at = time.perf_counter()
+        print(f"🗂️ Job {self.job_id}: {len(pending)}/{len(self.shards)} shards pendentes, {self.workers} workers")
+
+        if pending:
+            rate_divisor = self.workers if self.share_host_rate else 1
+            context = multiprocessing.get_context('spawn') # No inherited locks/sockets from the parent
+            with context.Pool(self.workers, initializer=_init_worker,
+                              initargs=(self.fixture_mode, self.fixture_dir, rate_divisor, self.quiet)) as pool:
+                tasks = ((i, self.shards[i]) for i in pending)
+                for shard_result in pool.imap_unordered(_scan_shard, tasks):
+                    _write_json_atomic(self._shard_path(shard_result['shard_index']), shard_result)
+                    self.shards_done += 1
+                    self.products_done += shard_result['products_scanned']
+                    progress = self.progress()
+                    print(f"   ✅ Shard {shard_result['shard_index']} ({shard_result['duration_seconds']}s) - "
+                          f"{progress['products_done']}/{progress['total_products']} produtos ({progress['percent']}%)")
+                    if progress_callback:
+                        progress_callback(progress)
+
+        return self.results()
+
+    def results(self, top_k: Optional[int] = 100) -> Dict:
+        """Merges checkpointed shards in shard order, so the output does not depend on scheduling.
+        Opportunities are streamed into a top-k ranking (best per product is kept for every product),
+        so memory stays flat however large the catalog is; top_k=None keeps them all.
+        """
+        details = []
+        ranking = GroupedTopK(top_k, key=by_field('estimated_roi_percentage'), per_group=1)
+        for i in range(len(self.shards)):
+            path = self._shard_path(i)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                shard_result = json.load(f)
+            details.extend(shard_result['products_scraped_details'])
+            for opportunity in shard_result['opportunities']:
+                ranking.push(opportunity.get('product_name_query'), opportunity)
+
+        best = ranking.best()
+        return {
+            'summary': {
+                'job_id': self.job_id,
+                'timestamp': datetime.now().isoformat(),
+                'products_scraped_details': details,
+                'total_opportunities_found': ranking.seen,
+                'best_opportunity_roi': best['estimated_roi_percentage'] if best else 0.0,
+                'best_by_product': {product: items[0] for product, items in ranking.best_by_group().items()},
+                'complete': not self.pending_shards()
+            },
+            'opportunities': ranking.items()
+        }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scan do catálogo completo em shards (GPAS 4.0)")
+    parser.add_argument('catalog', help="Ficheiro de catálogo (JSON ou um produto por linha)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--shard-size', type=int, default=50)
+    parser.add_argument('--checkpoint-dir', default='scan_checkpoints')
+    parser.add_argument('--replay', metavar='FIXTURE_DIR', help="Usar fixtures gravadas em vez dos sites reais")
+    args = parser.parse_args()
+
+    job = CatalogScanJob(load_catalog(args.catalog), shard_size=args.shard_size, workers=args.workers,
+                         checkpoint_dir=args.checkpoint_dir,
+                         fixture_mode='replay' if args.replay else None, fixture_dir=args.replay)
+    results = job.run()
+    summary = results['summary']
+    print(f"\n🎯 {len(summary['products_scraped_details'])} produtos, {summary['total_opportunities_found']} oportunidades, "
+          f"melhor ROI {summary['best_opportunity_roi']:.1f}%")
@@ -0,0 +1,103 @@
+"""
+GPAS 4.0 - Vectorized Cost Matrix
+Evaluates every source x target listing pair of a scan as NumPy arrays: landed cost, fees,
+profit and ROI are computed for whole blocks of the price matrix at once and filtered by ROI
+in one step, so only profitable pairs ever become Python objects.
+"""
+
+from typing import Dict, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .cost_model import CostModel
+
+# Pairs evaluated per block (sources x targets); bounds the temporaries to a few tens of MB
+DEFAULT_CHUNK_ELEMENTS = 2_000_000
+
+
+class CostMatrixResult(NamedTuple):
+    """Surviving pairs only, ordered by source index, then by ROI (highest first)."""
+    source_index: np.ndarray
+    target_index: np.ndarray
+    shipping_cost: np.ndarray
+    import_duty: np.ndarray
+    platform_fee: np.ndarray
+    payment_fee: np.ndarray
+    fixed_fee: np.ndarray
+    total_costs: np.ndarray
+    gross_profit: np.ndarray
+    roi_percentage: np.ndarray
+    pairs_evaluated: int
+
+    def __len__(self) -> int:
+        return len(self.source_index)
+
+
+def evaluate_cost_matrix(source_usd: np.ndarray, target_usd: np.ndarray, cost_model: CostModel,
+                         source_markets: Sequence[str], target_markets: Sequence[str],
+                         category: Optional[str] = None, min_roi: float = 100.0,
+                         top_k_per_source: Optional[int] = None,
+                         chunk_elements: int = DEFAULT_CHUNK_ELEMENTS) -> CostMatrixResult:
+    """ROI of every (source, target) pair, keeping those with ROI > min_roi.
+
+    Rates come from the compiled cost model tables (one lookup per source, target and lane
+    block); the arithmetic follows the same operation order as CostModel.evaluate_pair, so
+    results are bit-identical to it. With top_k_per_source only the k best pairs of each
+    source are kept, block by block.
+    """
+    source_usd = np.asarray(source_usd, dtype=np.float64)
+    target_usd = np.asarray(target_usd, dtype=np.float64)
+    n, m = len(source_usd), len(target_usd)
+    source_pos = cost_model.market_positions(source_markets)
+    target_pos = cost_model.market_positions(target_markets)
+    k = cost_model.category_position(category)
+
+    src_all = source_usd.reshape(n, 1)
+    ship_all = cost_model.shipping_rate[source_pos].reshape(n, 1)
+    duty_table = cost_model.duty_rate[:, :, k]
+    tgt = target_usd.reshape(1, m)
+    platform_fee = tgt * cost_model.platform_fee_rate[target_pos, k].reshape(1, m)
+    payment_fee = tgt * cost_model.payment_fee_rate[target_pos].reshape(1, m)
+    fixed_fee = cost_model.fixed_fee[target_pos].reshape(1, m)
+
+    rows_per_block = max(1, chunk_elements // max(1, m))
+    blocks = {name: [] for name in CostMatrixResult._fields[:-1]}
+
+    for start in range(0, n, rows_per_block):
+        stop = min(n, start + rows_per_block)
+        src = src_all[start:stop]
+        shipping = src * ship_all[start:stop]
+        duty = src * duty_table[source_pos[start:stop, None], target_pos[None, :]]
+
+        total = src + shipping + duty + platform_fee + payment_fee + fixed_fee
+        gross = tgt - total
+        with np.errstate(divide='ignore', invalid='ignore'):
+            roi = (gross / src) * 100
+        rows, cols = np.nonzero((roi > min_roi) & (src > 0))
+        if not len(rows):
+            continue
+        # Stable: pairs with equal ROI keep their target order, like sorted() on the per-pair list
+        order = np.lexsort((-roi[rows, cols], rows))
+        rows, cols = rows[order], cols[order]
+        if top_k_per_source is not None:
+            rank = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left')
+            keep = rank < top_k_per_source
+            rows, cols = rows[keep], cols[keep]
+
+        blocks['source_index'].append(rows + start)
+        blocks['target_index'].append(cols)
+        blocks['shipping_cost'].append(shipping[rows, 0])
+        blocks['import_duty'].append(duty[rows, cols])
+        blocks['platform_fee'].append(platform_fee[0, cols])
+        blocks['payment_fee'].append(payment_fee[0, cols])
+        blocks['fixed_fee'].append(fixed_fee[0, cols])
+        blocks['total_costs'].append(total[rows, cols])
+        blocks['gross_profit'].append(gross[rows, cols])
+        blocks['roi_percentage'].append(roi[rows, cols])
+
+    arrays: Dict[str, np.ndarray] = {
+        name: np.concatenate(parts) if parts else np.empty(0, dtype=np.intp if name.endswith('index') else np.float64)
+        for name, parts in blocks.items()
+    }
+    # Blocks cover consecutive sources and are sorted within, so the concatenation is ordered
+    return CostMatrixResult(**arrays, pairs_evaluated=n * m)
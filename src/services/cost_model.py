@@ -0,0 +1,180 @@
+"""
+GPAS 4.0 - Cost Model
+The single fee / landed-cost model used by the global engine, the AI brain and the scraper.
+Fee schedules (shipping, per-category duty, platform and payment fees, fixed handling fee) are
+loaded from cost_schedules.json and compiled at startup into dense tables indexed by
+(source market, target market, category), so costing a pair is a lookup plus a few multiplies.
+
+Every path computes, in this order (prices in USD):
+    shipping = source * shipping_rate[source]
+    duty     = source * duty_rate[source, target, category]   (0 within a region)
+    platform = target * platform_fee_rate[target, category]
+    payment  = target * payment_fee_rate[target]
+    total    = source + shipping + duty + platform + payment + fixed_fee[target]
+    profit   = target - total;  roi = profit / source * 100
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Union
+
+import numpy as np
+
+DEFAULT_SCHEDULE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cost_schedules.json')
+DEFAULT_CATEGORY = 'general'
+
+
+class LaneCosts(NamedTuple):
+    """Compiled cost coefficients of one (source, target, category) lane."""
+    shipping_rate: float
+    duty_rate: float
+    platform_fee_rate: float
+    payment_fee_rate: float
+    fixed_fee: float
+
+
+class PairCosts(NamedTuple):
+    shipping_cost: float
+    import_duty: float
+    platform_fee: float
+    payment_fee: float
+    fixed_fee: float
+    total_costs: float
+    net_profit: float
+    roi_percentage: float
+
+
+def load_cost_schedule(path: Optional[str] = None) -> Dict:
+    with open(path or DEFAULT_SCHEDULE_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class CostModel:
+    """Compiled fee schedules. Unknown markets use the schedule defaults, unknown categories
+    the default duty and fee rates; both are resolved once per call, never per pair.
+    """
+
+    def __init__(self, schedule: Dict):
+        defaults = schedule.get('defaults', {})
+        duty = schedule.get('duty', {})
+        market_schedules = schedule.get('markets', {})
+
+        # Index 0 is the "unknown market" row, filled from the defaults
+        self.markets: List[str] = ['*'] + list(market_schedules)
+        self.market_index: Dict[str, int] = {}
+        for i, name in enumerate(self.markets[1:], start=1):
+            self.market_index[name] = i
+            for alias in market_schedules[name].get('aliases', []):
+                self.market_index[alias] = i
+
+        categories = set(duty.get('categories', {}))
+        for market in market_schedules.values():
+            categories.update(market.get('category_platform_fee_rates', {}))
+        self.categories: List[str] = [DEFAULT_CATEGORY] + sorted(categories - {DEFAULT_CATEGORY})
+        self.category_index = {c: i for i, c in enumerate(self.categories)}
+
+        def market_value(name: str, key: str) -> float:
+            if name == '*':
+                return float(defaults.get(key, 0.0))
+            return float(market_schedules[name].get(key, defaults.get(key, 0.0)))
+
+        regions = [market_schedules.get(m, {}).get('region', defaults.get('region', 'GLOBAL')) for m in self.markets]
+        n, c = len(self.markets), len(self.categories)
+        self.regions = regions
+        self.shipping_rate = np.array([market_value(m, 'shipping_rate') for m in self.markets])
+        self.payment_fee_rate = np.array([market_value(m, 'payment_fee_rate') for m in self.markets])
+        self.fixed_fee = np.array([market_value(m, 'fixed_fee') for m in self.markets])
+
+        self.platform_fee_rate = np.empty((n, c))
+        for i, m in enumerate(self.markets):
+            per_category = market_schedules.get(m, {}).get('category_platform_fee_rates', {})
+            for j, category in enumerate(self.categories):
+                self.platform_fee_rate[i, j] = per_category.get(category, market_value(m, 'platform_fee_rate'))
+
+        category_duty = np.array([duty.get('categories', {}).get(cat, duty.get('default', 0.0)) for cat in self.categories])
+        cross_border = np.array([[regions[s] != regions[t] for t in range(n)] for s in range(n)])
+        self.duty_rate = np.where(cross_border[:, :, None], category_duty[None, None, :], float(duty.get('same_region', 0.0)))
+
+        # The compiled per-lane lookup table
+        self.lanes: Dict[tuple, LaneCosts] = {
+            (self.markets[s], self.markets[t], self.categories[k]): LaneCosts(
+                float(self.shipping_rate[s]), float(self.duty_rate[s, t, k]), float(self.platform_fee_rate[t, k]),
+                float(self.payment_fee_rate[t]), float(self.fixed_fee[t]))
+            for s in range(n) for t in range(n) for k in range(c)
+        }
+
+    def market_position(self, market: str) -> int:
+        return self.market_index.get(market, 0)
+
+    def market_positions(self, markets: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self.market_index.get(m, 0) for m in markets), dtype=np.intp)
+
+    def category_position(self, category: Optional[str]) -> int:
+        return self.category_index.get(category or DEFAULT_CATEGORY, 0)
+
+    def region(self, market: str) -> str:
+        return self.regions[self.market_position(market)]
+
+    def lane(self, source_market: str, target_market: str, category: Optional[str] = None) -> LaneCosts:
+        s, t = self.market_position(source_market), self.market_position(target_market)
+        return self.lanes[(self.markets[s], self.markets[t], self.categories[self.category_position(category)])]
+
+    def evaluate_pair(self, source_market: str, target_market: str, source_price: float, target_price: float,
+                      category: Optional[str] = None) -> PairCosts:
+        lane = self.lane(source_market, target_market, category)
+        shipping = source_price * lane.shipping_rate
+        duty = source_price * lane.duty_rate
+        platform = target_price * lane.platform_fee_rate
+        payment = target_price * lane.payment_fee_rate
+        total = source_price + shipping + duty + platform + payment + lane.fixed_fee
+        profit = target_price - total
+        return PairCosts(shipping, duty, platform, payment, lane.fixed_fee, total, profit, (profit / source_price) * 100)
+
+    def evaluate_batch(self, source_markets: Union[str, Iterable[str]], target_markets: Union[str, Iterable[str]],
+                       source_prices, target_prices, categories: Union[None, str, Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """Costs of many (source, target) pairs at once; markets/categories may be one value for all.
+        Returns arrays keyed like PairCosts fields.
+        """
+        source_prices = np.asarray(source_prices, dtype=np.float64)
+        target_prices = np.asarray(target_prices, dtype=np.float64)
+        s = self.market_position(source_markets) if isinstance(source_markets, str) else self.market_positions(source_markets)
+        t = self.market_position(target_markets) if isinstance(target_markets, str) else self.market_positions(target_markets)
+        if categories is None or isinstance(categories, str):
+            k = self.category_position(categories)
+        else:
+            k = np.fromiter((self.category_position(c) for c in categories), dtype=np.intp)
+
+        shipping = source_prices * self.shipping_rate[s]
+        duty = source_prices * self.duty_rate[s, t, k]
+        platform = target_prices * self.platform_fee_rate[t, k]
+        payment = target_prices * self.payment_fee_rate[t]
+        fixed = np.broadcast_to(self.fixed_fee[t], np.broadcast(source_prices, target_prices).shape)
+        total = source_prices + shipping + duty + platform + payment + fixed
+        profit = target_prices - total
+        with np.errstate(divide='ignore', invalid='ignore'):
+            roi = (profit / source_prices) * 100
+        return {
+            'shipping_cost': shipping, 'import_duty': duty, 'platform_fee': platform, 'payment_fee': payment,
+            'fixed_fee': fixed, 'total_costs': total, 'net_profit': profit, 'roi_percentage': roi
+        }
+
+    def get_stats(self) -> Dict:
+        return {
+            'markets': len(self.markets) - 1,
+            'categories': self.categories,
+            'compiled_lanes': len(self.lanes)
+        }
+
+
+_shared_model: Optional[CostModel] = None
+_shared_model_lock = threading.Lock()
+
+
+def get_cost_model() -> CostModel:
+    """Process-wide model compiled from GPAS_COST_SCHEDULE_FILE (default: cost_schedules.json)."""
+    global _shared_model
+    with _shared_model_lock:
+        if _shared_model is None:
+            _shared_model = CostModel(load_cost_schedule(os.environ.get('GPAS_COST_SCHEDULE_FILE')))
+        return _shared_model
@@ -0,0 +1,127 @@
+"""
+GPAS 4.0 - Record/Replay Fixture Transport
+Saves raw scraper responses per (site, query) and serves them back locally, so the scraper
+can be exercised and benchmarked offline.
+Record live pages with: python -m src.services.fixture_transport [fixture_dir]
+"""
+
+import json
+import os
+import re
+from io import BytesIO
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_FIXTURE_DIR = os.environ.get('GPAS_FIXTURE_DIR', 'scraper_fixtures')
+
+# Headers worth replaying; hop-by-hop and encoding headers would not match the stored body
+_REPLAYED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+class FixtureNotFound(requests.exceptions.RequestException):
+    """Raised in replay mode when no fixture was recorded for a request."""
+
+
+def _slug(text: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-') or 'empty'
+
+
+def fixture_paths(directory: str, site_key: str, query: str) -> Tuple[str, str]:
+    base = os.path.join(directory, site_key, _slug(query))
+    return base + '.html', base + '.json'
+
+
+def save_fixture(directory: str, site_key: str, query: str, url: str, content: bytes, status_code: int = 200, headers: Optional[Dict] = None):
+    body_path, meta_path = fixture_paths(directory, site_key, query)
+    os.makedirs(os.path.dirname(body_path), exist_ok=True)
+    with open(body_path, 'wb') as f:
+        f.write(content)
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'site_key': site_key,
+            'query': query,
+            'url': url,
+            'status_code': status_code,
+            'headers': {k: v for k, v in (headers or {}).items() if k in _REPLAYED_HEADERS}
+        }, f, indent=2)
+
+
+def load_fixture(directory: str, site_key: str, query: str) -> Optional[Tuple[bytes, Dict]]:
+    body_path, meta_path = fixture_paths(directory, site_key, query)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(body_path, 'rb') as f:
+            return f.read(), meta
+    except (OSError, ValueError):
+        return None
+
+
+# Maps a request URL to its (site_key, query), or None for URLs that are not scraper searches
+FixtureResolver = Callable[[str], Optional[Tuple[str, str]]]
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Real HTTP adapter that also saves every resolvable response as a fixture."""
+
+    def __init__(self, directory: str, resolver: FixtureResolver, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.resolver = resolver
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        key = self.resolver(request.url)
+        if key and response.status_code == 200:
+            content = response.content # Consumes the stream; iter_content() replays it from memory
+            save_fixture(self.directory, key[0], key[1], request.url, content, response.status_code, response.headers)
+            print(f"💾 Fixture gravada: {key[0]} / '{key[1]}' ({len(content)} bytes)")
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Serves recorded fixtures without any network access."""
+
+    def __init__(self, directory: str, resolver: FixtureResolver):
+        super().__init__()
+        self.directory = directory
+        self.resolver = resolver
+        self.served = 0
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        key = self.resolver(request.url)
+        fixture = load_fixture(self.directory, key[0], key[1]) if key else None
+        if fixture is None:
+            raise FixtureNotFound(f"Sem fixture para {request.url}", request=request)
+
+        content, meta = fixture
+        response = requests.Response()
+        response.status_code = meta.get('status_code', 200)
+        response.headers = CaseInsensitiveDict(meta.get('headers', {}))
+        response.raw = BytesIO(content)
+        response.url = request.url
+        response.request = request
+        response.reason = 'OK' if response.status_code == 200 else 'Replayed'
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.connection = self
+        self.served += 1
+        return response
+
+    def close(self):
+        pass
+
+
+if __name__ == "__main__":
+    import sys
+    from .global_scraper import ScraperEngine
+
+    fixture_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FIXTURE_DIR
+    engine = ScraperEngine()
+    engine.use_fixtures('record', fixture_dir)
+    engine.use_response_cache = False
+    for product in engine.target_products:
+        engine.scrape_all_sites_for_product(product)
+    print(f"\n✅ Fixtures gravadas em {fixture_dir}")
@@ -0,0 +1,214 @@
+"""
+GPAS 4.0 - FX Rates
+One currency-pair matrix shared by every service. Rates come from a pluggable provider
+(static defaults, or a JSON file refreshed by an external job), are stamped with the time they
+were quoted and are refreshed when stale. Conversions are a dict lookup plus one multiplication,
+and whole price arrays convert in bulk.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+BASE_CURRENCY = 'USD'
+
+# USD value of one unit of each currency (used when no rates file is configured)
+DEFAULT_USD_RATES = {
+    'USD': 1.0,
+    'EUR': 1.09,
+    'GBP': 1.27
+}
+
+
+class UnknownCurrencyError(ValueError):
+    def __init__(self, currency: str):
+        super().__init__(f"No FX rate for currency '{currency}'")
+        self.currency = currency
+
+
+class StaticRateProvider:
+    """Fixed rates, quoted at construction time."""
+
+    name = 'static'
+
+    def __init__(self, usd_rates: Optional[Dict[str, float]] = None):
+        self.usd_rates = dict(usd_rates or DEFAULT_USD_RATES)
+        self.as_of = time.time()
+
+    def fetch(self) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """Returns (USD value of one unit per currency, quote timestamp per currency)."""
+        return dict(self.usd_rates), {c: self.as_of for c in self.usd_rates}
+
+
+class FileRateProvider:
+    """Rates from a JSON file, e.g. written by a cron job from a market data feed:
+    {"base": "USD", "timestamp": 1700000000, "rates": {"EUR": 0.92, "GBP": 0.79}}
+    Rates are units of each currency per one unit of base (the usual FX API format); a currency
+    may also be given as {"rate": 0.92, "timestamp": ...} to carry its own quote time.
+    """
+
+    name = 'file'
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def fetch(self) -> Tuple[Dict[str, float], Dict[str, float]]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        base = data.get('base', BASE_CURRENCY).upper()
+        default_ts = float(data.get('timestamp') or os.path.getmtime(self.path))
+
+        per_base = {base: (1.0, default_ts)}
+        for currency, entry in data['rates'].items():
+            if isinstance(entry, dict):
+                per_base[currency.upper()] = (float(entry['rate']), float(entry.get('timestamp', default_ts)))
+            else:
+                per_base[currency.upper()] = (float(entry), default_ts)
+
+        if BASE_CURRENCY not in per_base:
+            raise ValueError(f"FX file {self.path} has no {BASE_CURRENCY} rate")
+        base_per_usd = per_base[BASE_CURRENCY][0]
+        usd_rates = {c: base_per_usd / rate for c, (rate, _) in per_base.items() if rate > 0}
+        timestamps = {c: ts for c, (_, ts) in per_base.items() if c in usd_rates}
+        return usd_rates, timestamps
+
+
+class FxSnapshot:
+    """Immutable matrix of conversion factors: matrix[index[a], index[b]] converts a -> b."""
+
+    __slots__ = ('index', 'currencies', 'matrix', 'quoted_at', 'loaded_at')
+
+    def __init__(self, usd_rates: Dict[str, float], quoted_at: Dict[str, float]):
+        self.currencies = sorted(usd_rates)
+        self.index = {c: i for i, c in enumerate(self.currencies)}
+        usd_values = np.array([usd_rates[c] for c in self.currencies], dtype=np.float64)
+        self.matrix = usd_values[:, None] / usd_values[None, :]
+        self.quoted_at = np.array([quoted_at[c] for c in self.currencies], dtype=np.float64)
+        self.loaded_at = time.time()
+
+    def position(self, currency: str) -> int:
+        try:
+            return self.index[currency]
+        except KeyError:
+            raise UnknownCurrencyError(currency) from None
+
+
+class FxRateTable:
+    """Thread-safe holder of the current FxSnapshot. Readers never lock: a refresh builds a new
+    snapshot and swaps the reference. A failed refresh keeps the previous rates and the next
+    attempt waits retry_backoff_seconds, doubling after each consecutive failure (capped at the
+    refresh interval), so readers do not hit the provider on every access while it is down.
+    """
+
+    def __init__(self, provider=None, refresh_interval_seconds: float = 3600, retry_backoff_seconds: float = 60):
+        self.provider = provider or StaticRateProvider()
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self._refresh_lock = threading.Lock()
+        self._snapshot: Optional[FxSnapshot] = None
+        self._next_attempt_at = 0.0 # After a failure: no refresh before this time
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.consecutive_errors = 0
+        self.last_attempt_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.refresh()
+
+    def refresh(self) -> bool:
+        with self._refresh_lock:
+            self.last_attempt_at = time.time()
+            try:
+                usd_rates, quoted_at = self.provider.fetch()
+                self._snapshot = FxSnapshot(usd_rates, quoted_at)
+                self.refreshes += 1
+                self.consecutive_errors = 0
+                self._next_attempt_at = 0.0
+                self.last_error = None
+                return True
+            except (OSError, ValueError, KeyError) as e:
+                self.refresh_errors += 1
+                self.consecutive_errors += 1
+                backoff = min(self.retry_backoff_seconds * 2 ** (self.consecutive_errors - 1), self.refresh_interval_seconds)
+                self._next_attempt_at = self.last_attempt_at + backoff
+                self.last_error = str(e)
+                if self._snapshot is None: # Never start without rates
+                    self._snapshot = FxSnapshot(DEFAULT_USD_RATES, {c: 0.0 for c in DEFAULT_USD_RATES})
+                print(f"⚠️ FX: falha ao atualizar taxas ({e}); a manter as anteriores, nova tentativa em {backoff:.0f}s")
+                return False
+
+    @property
+    def snapshot(self) -> FxSnapshot:
+        snapshot = self._snapshot
+        now = time.time()
+        if (now - snapshot.loaded_at >= self.refresh_interval_seconds and now >= self._next_attempt_at
+                and not self._refresh_lock.locked()):
+            self.refresh()
+            snapshot = self._snapshot
+        return snapshot
+
+    def rate(self, from_currency: str, to_currency: str = BASE_CURRENCY) -> float:
+        snapshot = self.snapshot
+        return float(snapshot.matrix[snapshot.position(from_currency), snapshot.position(to_currency)])
+
+    def convert(self, amount: float, from_currency: str, to_currency: str = BASE_CURRENCY) -> float:
+        if from_currency == to_currency:
+            self.snapshot.position(from_currency) # Still reject unknown codes
+            return amount
+        return amount * self.rate(from_currency, to_currency)
+
+    def convert_many(self, amounts: Iterable[float], currencies: Union[str, Iterable[str]],
+                     to_currency: str = BASE_CURRENCY) -> np.ndarray:
+        """Converts an array of amounts, each in its own currency (or all in one), to to_currency."""
+        snapshot = self.snapshot
+        amounts = np.asarray(amounts, dtype=np.float64)
+        column = snapshot.matrix[:, snapshot.position(to_currency)]
+        if isinstance(currencies, str):
+            return amounts * column[snapshot.position(currencies)]
+        positions = np.fromiter((snapshot.position(c) for c in currencies), dtype=np.intp, count=len(amounts))
+        return amounts * column[positions]
+
+    def quoted_at(self, from_currency: str, to_currency: str = BASE_CURRENCY) -> float:
+        """Quote time of a pair: the older of its two currencies' quotes."""
+        snapshot = self.snapshot
+        return float(min(snapshot.quoted_at[snapshot.position(from_currency)],
+                         snapshot.quoted_at[snapshot.position(to_currency)]))
+
+    def currencies(self) -> List[str]:
+        return list(self.snapshot.currencies)
+
+    def get_stats(self) -> Dict:
+        snapshot = self._snapshot
+        return {
+            'provider': self.provider.name,
+            'currencies': snapshot.currencies,
+            'usd_rates': {c: round(float(snapshot.matrix[i, snapshot.index[BASE_CURRENCY]]), 6)
+                          for c, i in snapshot.index.items()} if BASE_CURRENCY in snapshot.index else {},
+            'oldest_quote_age_seconds': round(time.time() - float(snapshot.quoted_at.min()), 1),
+            'loaded_at': snapshot.loaded_at,
+            'refresh_interval_seconds': self.refresh_interval_seconds,
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors,
+            'consecutive_errors': self.consecutive_errors,
+            'last_attempt_at': self.last_attempt_at,
+            'next_attempt_at': self._next_attempt_at or None,
+            'last_error': self.last_error
+        }
+
+
+_shared_table: Optional[FxRateTable] = None
+_shared_table_lock = threading.Lock()
+
+
+def get_fx_rates() -> FxRateTable:
+    """Process-wide rate table. GPAS_FX_RATES_FILE points it at a JSON rates file."""
+    global _shared_table
+    with _shared_table_lock:
+        if _shared_table is None:
+            path = os.environ.get('GPAS_FX_RATES_FILE')
+            provider = FileRateProvider(path) if path else StaticRateProvider()
+            _shared_table = FxRateTable(provider, float(os.environ.get('GPAS_FX_REFRESH_SECONDS', 3600)))
+        return _shared_table
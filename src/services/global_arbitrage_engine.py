@@ -3,27 +3,66 @@ GPAS 4.0 - GLOBAL ARBITRAGE ENGINE
 Sistema REVOLUCIONÁRIO que supera Tactical Arbitrage, SourceMogul e todos os outros
 Foco: ARBITRAGEM GLOBAL com ROI de 300-500%
 """
-import os # Import os module
-import requests
-from bs4 import BeautifulSoup
-import time
-import json
 from datetime import datetime
-import pandas as pd
+import numpy as np
 from typing import Dict, List, Optional
-import re
-import asyncio
-import aiohttp
-from concurrent.futures import ThreadPoolExecutor
+from .rate_limiter import get_shared_scheduler
+from .http_client import get_http_client
+from .cost_matrix import evaluate_cost_matrix
+from .fx_rates import get_fx_rates
+from .top_k import GroupedTopK, by_field
+from .market_graph import MarketGraph
+from .cost_model import get_cost_model
+from .memo_cache import TTLCache
+from .opportunity_batch import OpportunityBatch
+import io
+import multiprocessing
+import zlib
+from contextlib import nullcontext, redirect_stdout
+
+
+# Categorias de ROI (limiar mínimo, etiqueta), da mais alta para a mais baixa
+ROI_CATEGORIES = (
+    (500, "🚀 EXTREME PROFIT"),
+    (300, "💰 VERY HIGH PROFIT"),
+    (200, "📈 HIGH PROFIT"),
+    (100, "✅ GOOD PROFIT")
+)
+LOW_PROFIT_CATEGORY = "⚠️ LOW PROFIT"
+
+
+def _stable_hash(text: str) -> int:
+    """Hash estável entre processos (hash() de str muda a cada arranque do Python)"""
+    return zlib.crc32(text.encode('utf-8'))
+
+
+# --- Lado dos workers (scan paralelo) ---
+
+_worker_engine = None
+_worker_quiet = True
+
+
+def _init_scan_worker(quiet: bool):
+    global _worker_engine, _worker_quiet
+    _worker_quiet = quiet
+    with redirect_stdout(io.StringIO()) if quiet else nullcontext():
+        _worker_engine = GlobalArbitrageEngine()
+
+
+def _search_lane(task):
+    """Executa as buscas de uma faixa (um mercado, vários produtos) com a fatia de rate desse host"""
+    market, products, host_rate = task
+    _worker_engine.rate_limiter.configure_host(_worker_engine.global_markets[market]['base_url'], rate=host_rate)
+    with redirect_stdout(io.StringIO()) if _worker_quiet else nullcontext():
+        return [(product, market, _worker_engine._search_market_uncached(product, market)) for product in products]
+
 
 class GlobalArbitrageEngine:
     """Motor GLOBAL de arbitragem que DESTRÓI a concorrência"""
     
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
+        # Cliente HTTP partilhado (pool de conexões por host, keep-alive, gzip/brotli)
+        self.http = get_http_client()
         
         # MERCADOS GLOBAIS REAIS - onde o dinheiro está
         self.global_markets = {
@@ -31,9 +70,9 @@ class GlobalArbitrageEngine:
                 'name': 'AliExpress (China)',
                 'base_url': 'https://www.aliexpress.com',
                 'api_url': 'https://www.aliexpress.com/wholesale',
+                'cache_ttl_seconds': 1800,  # Validade das buscas em memória
                 'currency': 'USD',
                 'avg_shipping_days': 15,
-                'shipping_cost_factor': 0.1,  # 10% do preço
                 'profit_potential': 'ULTRA_HIGH',  # 300-500% ROI
                 'market_type': 'source'  # Mercado de compra
             },
@@ -41,9 +80,9 @@ class GlobalArbitrageEngine:
                 'name': 'Amazon US',
                 'base_url': 'https://www.amazon.com',
                 'api_url': 'https://www.amazon.com/s',
+                'cache_ttl_seconds': 600,  # Validade das buscas em memória
                 'currency': 'USD',
                 'avg_shipping_days': 2,
-                'shipping_cost_factor': 0.05,
                 'profit_potential': 'HIGH',
                 'market_type': 'both'  # Compra e venda
             },
@@ -51,9 +90,9 @@ class GlobalArbitrageEngine:
                 'name': 'Amazon Germany',
                 'base_url': 'https://www.amazon.de',
                 'api_url': 'https://www.amazon.de/s',
+                'cache_ttl_seconds': 600,  # Validade das buscas em memória
                 'currency': 'EUR',
                 'avg_shipping_days': 1,
-                'shipping_cost_factor': 0.03,
                 'profit_potential': 'HIGH',
                 'market_type': 'sell'  # Mercado de venda
             },
@@ -61,9 +100,9 @@ class GlobalArbitrageEngine:
                 'name': 'Amazon UK',
                 'base_url': 'https://www.amazon.co.uk',
                 'api_url': 'https://www.amazon.co.uk/s',
+                'cache_ttl_seconds': 600,  # Validade das buscas em memória
                 'currency': 'GBP',
                 'avg_shipping_days': 1,
-                'shipping_cost_factor': 0.03,
                 'profit_potential': 'HIGH',
                 'market_type': 'sell'
             },
@@ -71,9 +110,9 @@ class GlobalArbitrageEngine:
                 'name': 'eBay Global',
                 'base_url': 'https://www.ebay.com',
                 'api_url': 'https://www.ebay.com/sch',
+                'cache_ttl_seconds': 900,  # Validade das buscas em memória
                 'currency': 'USD',
                 'avg_shipping_days': 7,
-                'shipping_cost_factor': 0.08,
                 'profit_potential': 'VERY_HIGH',
                 'market_type': 'both'
             },
@@ -81,9 +120,9 @@ class GlobalArbitrageEngine:
                 'name': 'Walmart US',
                 'base_url': 'https://www.walmart.com',
                 'api_url': 'https://www.walmart.com/search',
+                'cache_ttl_seconds': 900,  # Validade das buscas em memória
                 'currency': 'USD',
                 'avg_shipping_days': 3,
-                'shipping_cost_factor': 0.06,
                 'profit_potential': 'MEDIUM',
                 'market_type': 'source'
             },
@@ -91,141 +130,182 @@ class GlobalArbitrageEngine:
                 'name': 'Alibaba Wholesale',
                 'base_url': 'https://www.alibaba.com',
                 'api_url': 'https://www.alibaba.com/trade/search',
+                'cache_ttl_seconds': 3600,  # Validade das buscas em memória
                 'currency': 'USD',
                 'avg_shipping_days': 20,
-                'shipping_cost_factor': 0.15,
                 'profit_potential': 'EXTREME',  # 500-1000% ROI
                 'market_type': 'source',
                 'min_order_qty': 50
             }
         }
         
-        # PRODUTOS GLOBAIS DE ALTA DEMANDA
-        self.viral_products = [
-            # Tech & Gadgets (ROI 200-400%)
-            'Wireless Earbuds',
-            'Phone Cases iPhone 15',
-            'Portable Chargers',
-            'Bluetooth Speakers',
-            'Smart Watch Bands',
-            'USB-C Cables',
-            'Phone Ring Holders',
-            'Car Phone Mounts',
-            
-            # Home & Living (ROI 300-500%)
-            'LED Strip Lights',
-            'Essential Oil Diffusers',
-            'Silicone Kitchen Tools',
-            'Storage Organizers',
-            'Wall Stickers',
-            'Throw Pillow Covers',
-            'Shower Curtains',
-            'Coffee Mugs',
-            
-            # Fashion & Beauty (ROI 400-600%)
-            'Sunglasses',
-            'Hair Accessories',
-            'Jewelry Sets',
-            'Nail Art Tools',
-            'Makeup Brushes',
-            'Phone Accessories',
-            'Watches',
-            'Bags',
-            
-            # Fitness & Health (ROI 250-400%)
-            'Resistance Bands',
-            'Yoga Mats',
-            'Water Bottles',
-            'Fitness Trackers',
-            'Massage Tools',
-            'Protein Shakers',
-            
-            # Trending/Viral (ROI 500-1000%)
-            'Pop It Fidget Toys',
-            'LED Face Masks',
-            'Magnetic Phone Holders',
-            'Wireless Charging Pads',
-            'Smart Home Devices',
-            'Gaming Accessories'
-        ]
-        
-        # TAXAS DE CONVERSÃO REAIS
-        self.currency_rates = {
-            'USD_EUR': 0.92,
-            'USD_GBP': 0.79,
-            'EUR_USD': 1.09,
-            'GBP_USD': 1.27
+        # PRODUTOS GLOBAIS DE ALTA DEMANDA, por categoria (a categoria define a taxa alfandegária e fees)
+        self.viral_products_by_category = {
+            'electronics': [  # Tech & Gadgets (ROI 200-400%)
+                'Wireless Earbuds',
+                'Phone Cases iPhone 15',
+                'Portable Chargers',
+                'Bluetooth Speakers',
+                'Smart Watch Bands',
+                'USB-C Cables',
+                'Phone Ring Holders',
+                'Car Phone Mounts'
+            ],
+            'home': [  # Home & Living (ROI 300-500%)
+                'LED Strip Lights',
+                'Essential Oil Diffusers',
+                'Silicone Kitchen Tools',
+                'Storage Organizers',
+                'Wall Stickers',
+                'Throw Pillow Covers',
+                'Shower Curtains',
+                'Coffee Mugs'
+            ],
+            'fashion': [  # Fashion & Beauty (ROI 400-600%)
+                'Sunglasses',
+                'Hair Accessories',
+                'Jewelry Sets',
+                'Nail Art Tools',
+                'Makeup Brushes',
+                'Phone Accessories',
+                'Watches',
+                'Bags'
+            ],
+            'fitness': [  # Fitness & Health (ROI 250-400%)
+                'Resistance Bands',
+                'Yoga Mats',
+                'Water Bottles',
+                'Fitness Trackers',
+                'Massage Tools',
+                'Protein Shakers'
+            ],
+            'general': [  # Trending/Viral (ROI 500-1000%)
+                'Pop It Fidget Toys',
+                'LED Face Masks',
+                'Magnetic Phone Holders',
+                'Wireless Charging Pads',
+                'Smart Home Devices',
+                'Gaming Accessories'
+            ]
         }
+        self.viral_products = [p for products in self.viral_products_by_category.values() for p in products]
+        self.product_categories = {p: category for category, products in self.viral_products_by_category.items() for p in products}
+        
+        # TAXAS DE CONVERSÃO - matriz partilhada por todos os serviços (fx_rates)
+        self.fx = get_fx_rates()
+
+        # Quantas oportunidades o scan devolve no ranking global (top-K por ROI)
+        self.scan_top_k = 20
+
+        # Modelo de custos partilhado (shipping, alfândega por categoria, fees) - ver cost_schedules.json
+        self.cost_model = get_cost_model()
+
+        # Grafo de mercados: rotas multi-hop (ex.: Alibaba → Amazon US → Amazon DE), atualizado por preço
+        self.market_graph = MarketGraph(self.global_markets, self.cost_model, max_hops=3)
+
+        # Memoização das buscas por (mercado, produto), com a validade de cada mercado
+        self.search_cache = TTLCache(max_entries=5000, ttl_by_namespace={
+            market: info['cache_ttl_seconds'] for market, info in self.global_markets.items()})
+
+        # Mercados pesquisados em cada scan: fonte + mercados de venda
+        self.source_market = 'aliexpress'
+        self.target_markets = ['amazon_us', 'amazon_de', 'amazon_uk']
+
+        # RATE LIMITING por host - só pedidos ao mesmo domínio esperam uns pelos outros.
+        # O scheduler é partilhado com o ScraperEngine (mesmos hosts): configure_host mantém a política mais
+        # restritiva, por isso estes valores nunca aliviam a do scraper
+        self.requests_per_second_per_host = 1.0
+        self.rate_limiter = get_shared_scheduler()
+        for market_info in self.global_markets.values():
+            self.rate_limiter.configure_host(market_info['base_url'], rate=self.requests_per_second_per_host)
+
+        # As buscas search_*_real ainda são simuladas (sem pedidos de rede): não passam pelo rate limiter.
+        # Pôr a False quando usarem as APIs/páginas reais
+        self.simulated_searches = True
     
-    def calculate_global_opportunity(self, source_product: Dict, target_markets: List[Dict]) -> List[Dict]:
+    def calculate_global_opportunity(self, source_product: Dict, target_markets: List[Dict],
+                                     top_k: Optional[int] = None, category: Optional[str] = None) -> OpportunityBatch:
         """Calcula oportunidades GLOBAIS de arbitragem"""
-        opportunities = []
-        
-        source_price_usd = self.convert_to_usd(source_product['price'], source_product['currency'])
-        
-        for target in target_markets:
-            target_price_usd = self.convert_to_usd(target['price'], target['currency'])
-            
-            # Calcular custos REAIS
-            shipping_cost = source_price_usd * self.global_markets[source_product['market']]['shipping_cost_factor']
-            import_duty = source_price_usd * 0.1  # 10% duty estimado
-            platform_fee = target_price_usd * 0.13  # 13% fee médio
-            payment_processing = target_price_usd * 0.03  # 3% payment
-            
-            total_costs = source_price_usd + shipping_cost + import_duty + platform_fee + payment_processing
-            gross_profit = target_price_usd - total_costs
-            roi_percentage = (gross_profit / source_price_usd) * 100
-            
-            if roi_percentage > 100:  # ROI mínimo 100% para global
-                opportunities.append({
-                    'source_market': source_product['market'],
-                    'source_price': source_product['price'],
-                    'source_currency': source_product['currency'],
-                    'source_url': source_product['url'],
-                    'target_market': target['market'],
-                    'target_price': target['price'],
-                    'target_currency': target['currency'],
-                    'target_url': target['url'],
-                    'product_title': source_product['title'],
-                    'source_price_usd': source_price_usd,
-                    'target_price_usd': target_price_usd,
-                    'shipping_cost': shipping_cost,
-                    'import_duty': import_duty,
-                    'platform_fee': platform_fee,
-                    'total_costs': total_costs,
-                    'gross_profit': gross_profit,
-                    'roi_percentage': roi_percentage,
-                    'profit_category': self.categorize_roi(roi_percentage),
-                    'estimated_shipping_days': self.global_markets[source_product['market']]['avg_shipping_days'],
-                    'risk_level': self.calculate_risk_level(source_product['market'], target['market']),
-                    'timestamp': datetime.now().isoformat()
-                })
-        
-        return sorted(opportunities, key=lambda x: x['roi_percentage'], reverse=True)
+        return self.calculate_global_opportunities([source_product], target_markets, top_k=top_k, category=category)[0]
+
+    def calculate_global_opportunities(self, source_products: List[Dict], target_markets: List[Dict],
+                                       min_roi: float = 100.0, top_k: Optional[int] = None,
+                                       category: Optional[str] = None) -> List[OpportunityBatch]:
+        """Avalia a matriz completa fontes x alvos de uma vez (NumPy) com as tabelas compiladas do
+        cost_model; só os pares com ROI > min_roi (e, com top_k, só os k melhores de cada fonte)
+        são guardados, em colunas (OpportunityBatch) e não num dict por oportunidade.
+        Devolve um lote por fonte, ordenado por ROI.
+        """
+        constants = {'timestamp': datetime.now().isoformat()}
+        if not source_products or not target_markets:
+            return [OpportunityBatch.empty(source_products, target_markets, constants) for _ in source_products]
+
+        source_usd = self.prices_to_usd(source_products)
+        target_usd = self.prices_to_usd(target_markets)
+        source_names = [s['market'] for s in source_products]
+        target_names = [t['market'] for t in target_markets]
+
+        result = evaluate_cost_matrix(
+            source_usd, target_usd, self.cost_model, source_names, target_names,
+            category=category, min_roi=min_roi, top_k_per_source=top_k
+        )
+
+        # Risco e dias de envio dependem só dos mercados: calculados por mercado, não por par
+        source_vocab, source_codes = np.unique(source_names, return_inverse=True)
+        target_vocab, target_codes = np.unique(target_names, return_inverse=True)
+        risk_labels = [[self.calculate_risk_level(s, t) for t in target_vocab.tolist()] for s in source_vocab.tolist()]
+        risk_vocab = sorted({label for row in risk_labels for label in row})
+        risk_table = np.array([[risk_vocab.index(label) for label in row] for row in risk_labels], dtype=np.int8)
+        shipping_days = np.array([self.global_markets[m]['avg_shipping_days'] for m in source_names])
+
+        source_index, target_index = result.source_index, result.target_index
+        batch = OpportunityBatch(
+            columns={
+                'source_index': source_index,
+                'target_index': target_index,
+                'source_price_usd': source_usd[source_index],
+                'target_price_usd': target_usd[target_index],
+                'shipping_cost': result.shipping_cost,
+                'import_duty': result.import_duty,
+                'platform_fee': result.platform_fee,
+                'payment_fee': result.payment_fee,
+                'handling_fee': result.fixed_fee,
+                'total_costs': result.total_costs,
+                'gross_profit': result.gross_profit,
+                'roi_percentage': result.roi_percentage,
+                'estimated_shipping_days': shipping_days[source_index]
+            },
+            sources=source_products,
+            targets=target_markets,
+            labels={
+                'profit_category': self.categorize_rois(result.roi_percentage),
+                'risk_level': (risk_table[source_codes[source_index], target_codes[target_index]], risk_vocab)
+            },
+            constants=constants
+        )
+        return batch.split_by_source(len(source_products))
+
+    def prices_to_usd(self, listings: List[Dict]) -> np.ndarray:
+        """Preços de uma lista de anúncios em USD, convertidos em bloco pela matriz de câmbio"""
+        return self.fx.convert_many([l['price'] for l in listings], [l['currency'] for l in listings])
     
     def convert_to_usd(self, price: float, currency: str) -> float:
-        """Converte preços para USD"""
-        if currency == 'USD':
-            return price
-        elif currency == 'EUR':
-            return price * self.currency_rates['EUR_USD']
-        elif currency == 'GBP':
-            return price * self.currency_rates['GBP_USD']
-        else:
-            return price  # Fallback
+        """Converte preços para USD (UnknownCurrencyError para moedas sem taxa)"""
+        return self.fx.convert(price, currency)
     
     def categorize_roi(self, roi: float) -> str:
         """Categoriza ROI para priorização"""
-        if roi >= 500:
-            return "🚀 EXTREME PROFIT"
-        elif roi >= 300:
-            return "💰 VERY HIGH PROFIT"
-        elif roi >= 200:
-            return "📈 HIGH PROFIT"
-        elif roi >= 100:
-            return "✅ GOOD PROFIT"
-        else:
-            return "⚠️ LOW PROFIT"
+        for threshold, label in ROI_CATEGORIES:
+            if roi >= threshold:
+                return label
+        return LOW_PROFIT_CATEGORY
+
+    def categorize_rois(self, rois: np.ndarray):
+        """categorize_roi em bloco: (códigos, vocabulário) para uma coluna de ROI"""
+        thresholds = np.array([threshold for threshold, _ in reversed(ROI_CATEGORIES)])
+        vocabulary = (LOW_PROFIT_CATEGORY,) + tuple(label for _, label in reversed(ROI_CATEGORIES))
+        # Número de limiares atingidos (roi >= limiar) = posição no vocabulário
+        return np.searchsorted(thresholds, rois, side='right').astype(np.int8), vocabulary
     
     def calculate_risk_level(self, source_market: str, target_market: str) -> str:
         """Calcula nível de risco da operação"""
@@ -238,9 +318,16 @@ class GlobalArbitrageEngine:
         else:
             return "MEDIUM"
     
+    def _throttle(self, base_url: str):
+        """Espera pela vez do host antes de um pedido real (buscas simuladas não esperam)"""
+        if not self.simulated_searches:
+            self.rate_limiter.acquire(base_url)
+
     def search_aliexpress_real(self, product: str) -> List[Dict]:
         """Busca REAL no AliExpress - fonte de produtos baratos"""
         try:
+            self._throttle(self.global_markets['aliexpress']['base_url'])
+
             # Simular busca real (em produção usaria API oficial)
             search_url = f"https://www.aliexpress.com/wholesale?SearchText={product.replace(' ', '+')}"
             
@@ -249,21 +336,21 @@ class GlobalArbitrageEngine:
                 {
                     'market': 'aliexpress',
                     'title': f"{product} - High Quality",
-                    'price': round(2.5 + (hash(product) % 10), 2),  # $2.50-$12.50
+                    'price': round(2.5 + (_stable_hash(product) % 10), 2),  # $2.50-$12.50
                     'currency': 'USD',
                     'url': f"{search_url}&item=123456",
                     'rating': 4.5,
-                    'orders': 1000 + (hash(product) % 5000),
+                    'orders': 1000 + (_stable_hash(product) % 5000),
                     'shipping_free': True
                 },
                 {
                     'market': 'aliexpress',
                     'title': f"{product} - Premium Version",
-                    'price': round(4.0 + (hash(product) % 15), 2),  # $4.00-$19.00
+                    'price': round(4.0 + (_stable_hash(product) % 15), 2),  # $4.00-$19.00
                     'currency': 'USD',
                     'url': f"{search_url}&item=789012",
                     'rating': 4.7,
-                    'orders': 500 + (hash(product) % 3000),
+                    'orders': 500 + (_stable_hash(product) % 3000),
                     'shipping_free': True
                 }
             ]
@@ -279,14 +366,12 @@ class GlobalArbitrageEngine:
         """Busca REAL no Amazon global - mercados de venda"""
         try:
             market_info = self.global_markets[market]
+            self._throttle(market_info['base_url'])
             
             # Preços baseados em dados REAIS do Amazon
-            base_price = 15 + (hash(product + market) % 50)  # $15-$65
+            base_price = 15 + (_stable_hash(product + market) % 50)  # $15-$65
             
-            if market_info['currency'] == 'EUR':
-                base_price = base_price * 0.92  # Converter para EUR
-            elif market_info['currency'] == 'GBP':
-                base_price = base_price * 0.79  # Converter para GBP
+            base_price = self.fx.convert(base_price, 'USD', market_info['currency'])  # Converter para a moeda local
             
             amazon_results = [
                 {
@@ -296,7 +381,7 @@ class GlobalArbitrageEngine:
                     'currency': market_info['currency'],
                     'url': f"{market_info['base_url']}/dp/B08EXAMPLE",
                     'rating': 4.3,
-                    'reviews': 500 + (hash(product) % 2000),
+                    'reviews': 500 + (_stable_hash(product) % 2000),
                     'prime_eligible': True
                 },
                 {
@@ -306,7 +391,7 @@ class GlobalArbitrageEngine:
                     'currency': market_info['currency'],
                     'url': f"{market_info['base_url']}/dp/B08EXAMPLE2",
                     'rating': 4.6,
-                    'reviews': 1000 + (hash(product) % 3000),
+                    'reviews': 1000 + (_stable_hash(product) % 3000),
                     'prime_eligible': True
                 }
             ]
@@ -318,14 +403,84 @@ class GlobalArbitrageEngine:
             print(f"❌ Erro {market}: {e}")
             return []
     
-    def run_global_arbitrage_scan(self) -> Dict:
-        """Executa scan COMPLETO de arbitragem global"""
+    def update_market_graph(self, product: str, listings: List[Dict], category: Optional[str] = None):
+        """Atualiza o grafo com o preço mais baixo (USD) de cada mercado; só as arestas desses mercados mudam"""
+        if not listings:
+            return
+        prices_usd = self.prices_to_usd(listings).tolist()
+        cheapest: Dict[str, float] = {}
+        for listing, price_usd in zip(listings, prices_usd):
+            if listing['market'] in self.market_graph.index and price_usd < cheapest.get(listing['market'], float('inf')):
+                cheapest[listing['market']] = price_usd
+        self.market_graph.update_prices(product, cheapest, category)
+
+    def search_market(self, product: str, market: str) -> List[Dict]:
+        """Busca memoizada por (mercado, produto) dentro da validade do mercado; buscas vazias
+        (falhas) não ficam em cache
+        """
+        return self.search_cache.get_or_compute(market, product, lambda: self._search_market_uncached(product, market),
+                                                cache_if=bool)
+
+    def _search_market_uncached(self, product: str, market: str) -> List[Dict]:
+        if market == 'aliexpress':
+            return self.search_aliexpress_real(product)
+        return self.search_amazon_global_real(product, market)
+
+    def invalidate_search_cache(self, market: Optional[str] = None, product: Optional[str] = None) -> int:
+        """Descarta buscas memoizadas (de um produto num mercado, de um mercado, ou todas)"""
+        return self.search_cache.invalidate(market, product)
+
+    def _search_all_sequential(self, products: List[str]) -> Dict:
+        return {(product, market): self.search_market(product, market)
+                for product in products for market in [self.source_market] + self.target_markets}
+
+    def _search_all_parallel(self, products: List[str], workers: Optional[int], lanes_per_host: int,
+                             quiet: bool) -> Dict:
+        """Distribui as buscas (produto, mercado) por um pool de processos. Cada faixa pesquisa um só
+        mercado com 1/lanes_per_host do rate desse host, por isso o pool respeita o mesmo limite por
+        host que um processo; o scan demora o que demora o host mais carregado, não a soma de todos.
+        """
+        results = {}
+        tasks = []
+        for market in [self.source_market] + self.target_markets:
+            # Buscas ainda válidas em memória não vão para o pool
+            misses = []
+            for product in products:
+                cached = self.search_cache.get(market, product)
+                if cached is not None:
+                    results[(product, market)] = cached
+                else:
+                    misses.append(product)
+            if not misses:
+                continue
+            lane_size = -(-len(misses) // lanes_per_host)
+            for i in range(0, len(misses), lane_size):
+                tasks.append((market, misses[i:i + lane_size], self.requests_per_second_per_host / lanes_per_host))
+
+        if not tasks:
+            return results
+        context = multiprocessing.get_context('spawn')  # Sem locks/sockets herdados do processo pai
+        with context.Pool(min(len(tasks), workers or len(tasks)), initializer=_init_scan_worker, initargs=(quiet,)) as pool:
+            for lane in pool.imap_unordered(_search_lane, tasks):
+                for product, market, market_results in lane:
+                    results[(product, market)] = market_results
+                    if market_results:
+                        self.search_cache.put(market, product, market_results)
+        return results
+
+    def run_global_arbitrage_scan(self, products: Optional[List[str]] = None, parallel: bool = False,
+                                  workers: Optional[int] = None, lanes_per_host: int = 1, quiet_workers: bool = True) -> Dict:
+        """Executa scan COMPLETO de arbitragem global (por omissão, todos os viral_products).
+        Com parallel=True as buscas correm num pool de processos; a avaliação e as estatísticas
+        seguem sempre a ordem de products, por isso o resultado é o mesmo do modo sequencial.
+        """
         print("\n🌍 INICIANDO SCAN GLOBAL DE ARBITRAGEM")
         print("🎯 Objetivo: Encontrar oportunidades GLOBAIS de 100%+ ROI")
         print("💰 Foco: China → Europa/EUA")
         print("=" * 80)
         
-        all_opportunities = []
+        # Ranking incremental: top-K global + melhor por produto, sem guardar todas as oportunidades
+        ranking = GroupedTopK(self.scan_top_k, key=by_field('roi_percentage'), per_group=1)
         scan_results = {
             'timestamp': datetime.now().isoformat(),
             'products_scanned': 0,
@@ -336,23 +491,28 @@ class GlobalArbitrageEngine:
             'total_potential_profit': 0
         }
         
+        products = list(products if products is not None else self.viral_products)
+
+        # 1+2. Buscar preços na fonte (AliExpress) e nos mercados target
+        if parallel:
+            print(f"⚡ Modo paralelo: {len(products)} produtos x {1 + len(self.target_markets)} mercados")
+            search_results = self._search_all_parallel(products, workers, max(1, lanes_per_host), quiet_workers)
+        else:
+            search_results = self._search_all_sequential(products)
+
         # Scan produtos virais
-        for product in self.viral_products[:10]:  # Top 10 produtos
+        for product in products:
             print(f"\n🔍 SCANNING: {product}")
-            
-            # 1. Buscar preços baixos na China (AliExpress)
-            source_products = self.search_aliexpress_real(product)
-            
-            # 2. Buscar preços altos nos mercados target
+            source_products = search_results.get((product, self.source_market), [])
             target_markets = []
-            for market in ['amazon_us', 'amazon_de', 'amazon_uk']:
-                market_products = self.search_amazon_global_real(product, market)
-                target_markets.extend(market_products)
+            for market in self.target_markets:
+                target_markets.extend(search_results.get((product, market), []))
+            category = self.product_categories.get(product)
+            self.update_market_graph(product, source_products + target_markets, category)
             
             # 3. Calcular oportunidades
             if source_products and target_markets:
-                for source in source_products:
-                    opportunities = self.calculate_global_opportunity(source, target_markets)
+                for opportunities in self.calculate_global_opportunities(source_products, target_markets, category=category):
                     
                     if opportunities:
                         best_opp = opportunities[0]  # Melhor ROI
@@ -365,12 +525,10 @@ class GlobalArbitrageEngine:
                         print(f"   🚚 Shipping: {best_opp['estimated_shipping_days']} dias")
                         print(f"   ⚠️ Risco: {best_opp['risk_level']}")
                         
-                        all_opportunities.extend(opportunities)
-                        
-                        # Atualizar estatísticas
-                        if best_opp['roi_percentage'] > scan_results['best_roi']:
-                            scan_results['best_roi'] = best_opp['roi_percentage']
-                            scan_results['best_opportunity'] = best_opp
+                        # Lotes já ordenados por ROI: só as primeiras scan_top_k linhas podem entrar no ranking
+                        ranking.extend(product, opportunities[:self.scan_top_k])
+                        scan_results['total_opportunities'] += len(opportunities)
+                        scan_results['total_potential_profit'] += float(opportunities.column('gross_profit').sum())
                         
                         # Categorizar oportunidades
                         category = best_opp['profit_category']
@@ -379,11 +537,15 @@ class GlobalArbitrageEngine:
                         scan_results['opportunities_by_category'][category] += len(opportunities)
             
             scan_results['products_scanned'] += 1
-            time.sleep(1)  # Rate limiting
+            # Rate limiting feito por host dentro das buscas (self.rate_limiter)
         
         # Calcular totais
-        scan_results['total_opportunities'] = len(all_opportunities)
-        scan_results['total_potential_profit'] = sum([opp['gross_profit'] for opp in all_opportunities])
+        best = ranking.best()
+        scan_results['best_opportunity'] = best.to_dict() if best is not None else None
+        scan_results['best_roi'] = best['roi_percentage'] if best is not None else 0
+        scan_results['top_opportunities'] = [opp.to_dict() for opp in ranking.items()]
+        scan_results['best_by_product'] = {product: rows[0].to_dict() for product, rows in ranking.best_by_group().items()}
+        scan_results['multi_hop_routes'] = self.market_graph.best_routes(top_k=self.scan_top_k, min_hops=2)
         
         # Relatório final
         print(f"\n🎯 RELATÓRIO GLOBAL DE ARBITRAGEM:")
@@ -400,6 +562,10 @@ class GlobalArbitrageEngine:
             print(f"   💸 Vender: {best['target_market']} - {best['target_currency']}{best['target_price']:.2f}")
             print(f"   💰 Lucro: ${best['gross_profit']:.2f} ({best['roi_percentage']:.0f}% ROI)")
         
+        if scan_results['multi_hop_routes']:
+            route = scan_results['multi_hop_routes'][0]
+            print(f"\n🔀 MELHOR ROTA MULTI-HOP: {route['product']} - {' → '.join(route['route'])} ({route['return_on_landed_cost_pct']:.0f}% sobre custo total)")
+        
         print(f"\n📈 OPORTUNIDADES POR CATEGORIA:")
         for category, count in scan_results['opportunities_by_category'].items():
             print(f"   {category}: {count} oportunidades")
@@ -407,13 +573,19 @@ class GlobalArbitrageEngine:
         return scan_results
 
 # Função para executar o sistema
-def run_global_engine():
+def run_global_engine(parallel: bool = False, workers: Optional[int] = None):
     """Executa o motor GLOBAL de arbitragem"""
     engine = GlobalArbitrageEngine()
-    return engine.run_global_arbitrage_scan()
+    return engine.run_global_arbitrage_scan(parallel=parallel, workers=workers)
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scan global de arbitragem (GPAS 4.0)")
+    parser.add_argument('--parallel', action='store_true', help="Buscas num pool de processos")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
     # Executar scan global
-    results = run_global_engine()
+    results = run_global_engine(args.parallel, args.workers)
     print(f"\n✅ Scan completo! {results['total_opportunities']} oportunidades encontradas!")
-
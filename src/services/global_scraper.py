@@ -3,23 +3,44 @@ GPAS 4.0 - Global Product Scraper
 Attempts to scrape product information from global e-commerce sites for arbitrage opportunities.
 """
 
+import os
 import requests
-from bs4 import BeautifulSoup
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 # import pandas as pd # Not strictly necessary for core scraping logic
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote
 import re
+from .rate_limiter import HostRateScheduler, get_shared_scheduler
+from .response_cache import ResponseCache
+from .html_parser import HtmlParser
+from .http_client import SharedHttpClient, get_http_client
+from .resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+from .catalog_scan import load_catalog
+from .price_history import PriceHistoryStore
+from .fx_rates import get_fx_rates
+from .cost_model import get_cost_model
+from .refresh_scheduler import AdaptiveRefreshScheduler
+from .top_k import GroupedTopK, TopK, by_field
+from .title_matcher import TitleIndex, query_match_score
+from .fixture_transport import DEFAULT_FIXTURE_DIR, RecordingAdapter, ReplayAdapter
+
+def is_transient_error(exc: Exception) -> bool:
+    """Connection errors, timeouts, 429 and 5xx responses are worth retrying; anything else is not."""
+    if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return False
 
 class ScraperEngine:
     """Scrapes product data from global e-commerce sites."""
 
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+    def __init__(self, price_history_path: Optional[str] = None):
+        # Pooled HTTP client shared with every other service in the process
+        self.http = get_http_client()
 
         # Target global sites
         self.target_sites = {
@@ -32,7 +53,8 @@ class ScraperEngine:
                 'price_selector': 'div[class*="product-price"] span[class*="price-value"], span[class*="snow-price"]', # Placeholder
                 'title_selector': 'h1[class*="product-title"], a[class*="product-title-link"]', # Placeholder
                 'currency_symbol': '$', # Assuming USD for now
-                'currency_code': 'USD'
+                'currency_code': 'USD',
+                'cache_ttl_seconds': 900 # Search results change slowly
             },
             'amazon': {
                 'name': 'Amazon.com',
@@ -43,15 +65,103 @@ class ScraperEngine:
                 'price_selector': 'span.a-price-whole, span.a-offscreen', # Placeholder
                 'title_selector': 'span.a-size-medium.a-color-base.a-text-normal, h2.a-size-mini a.a-link-normal', # Placeholder
                 'currency_symbol': '$',
-                'currency_code': 'USD'
+                'currency_code': 'USD',
+                'cache_ttl_seconds': 600
             }
         }
 
-        # Target products for MVP testing
+        # Target products for MVP testing; GPAS_CATALOG_FILE points to a full catalog instead
         self.target_products = [
             "Xiaomi Mi Band 8",
             "Anker PowerCore 10000"
         ]
+        if os.environ.get('GPAS_CATALOG_FILE'):
+            self.target_products = load_catalog(os.environ['GPAS_CATALOG_FILE'])
+
+        # Concurrent fetching: all sites for a product are queried at the same time.
+        # Politeness is enforced per host by the shared rate limiter, so only requests
+        # to the same domain wait for each other.
+        self.concurrent_fetch = True
+        self.max_fetch_workers = 8
+        self.per_host_rate = 0.2 # Requests per second to the same host (one every 5 s)
+        self.per_host_jitter = 2.0 # Extra random seconds added when a request has to wait
+        self.rate_limiter = get_shared_scheduler()
+        for site_config in self.target_sites.values():
+            self.rate_limiter.configure_host(site_config['base_url'], rate=self.per_host_rate, jitter=self.per_host_jitter)
+            self.http.configure_host(site_config['base_url'], pool_maxsize=2) # One request at a time per host, plus a spare
+
+        # Disk-backed response cache shared by all scans (and all gunicorn workers)
+        self.response_cache = ResponseCache()
+        self.use_response_cache = True
+
+        # Fast parser backend (lxml if installed), restricted to product-container subtrees
+        self.html_parser = HtmlParser()
+
+        # Retries with jittered exponential backoff and a circuit breaker per site
+        self.request_timeout = (5, 20) # (connect, read) seconds
+        self.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=8.0, should_retry=is_transient_error)
+        self.circuit_breakers = {
+            site_key: CircuitBreaker(site_key, failure_threshold=3, cooldown_seconds=300,
+                                     failure_exceptions=(requests.exceptions.RequestException,))
+            for site_key in self.target_sites
+        }
+
+        # Every scraped listing is appended to the price history (batched inserts); the Flask app
+        # passes its own SQLite file, standalone runs use the default instance database
+        self.price_history = PriceHistoryStore(price_history_path)
+
+        # Shared FX rate table (listings are compared in USD) and fee / landed-cost model
+        self.fx = get_fx_rates()
+        self.cost_model = get_cost_model()
+
+        # Per-(product, site) refresh intervals: volatile prices are rescanned more often
+        self.refresh_scheduler = AdaptiveRefreshScheduler()
+
+        # Record/replay of raw responses for offline testing and benchmarks (see use_fixtures)
+        self.fixture_mode = None
+
+        # Extraction limits and streaming reads
+        self.max_candidates_per_site = 3 # Process top 3 results for MVP
+        self.max_products_per_site = 1 # Get first valid product for MVP for simplicity
+        self.query_match_threshold = 0.6 # Share of query tokens that must appear in a listing title
+        self.cycle_top_k = 50 # Opportunities returned by run_scraping_cycle (best ROI first)
+        self.title_match_threshold = 0.5 # Minimum title similarity (see title_matcher.title_similarity) to pair a source with a target listing
+        self.streaming_fetch = True # Stop downloading once enough products were extracted
+        self.stream_chunk_size = 16 * 1024
+        self.stream_first_parse_bytes = 64 * 1024 # First partial parse; then every time the buffer doubles
+        self.default_max_bytes_per_site = 3 * 1024 * 1024 # Per-site override: 'max_bytes' in target_sites
+
+    def fixture_key_for_url(self, url: str) -> Optional[Tuple[str, str]]:
+        """Maps a search URL back to its (site_key, product query), for record/replay fixtures."""
+        for site_key, site_config in self.target_sites.items():
+            prefix, _, suffix = site_config['search_url'].partition('{}')
+            if url.startswith(prefix) and url.endswith(suffix):
+                return site_key, unquote(url[len(prefix):len(url) - len(suffix)])
+        return None
+
+    def use_fixtures(self, mode: Optional[str], directory: str = DEFAULT_FIXTURE_DIR):
+        """'record' saves every search response as a fixture while scraping live sites,
+        'replay' serves the saved fixtures with no network access, None goes back to live mode.
+        """
+        if mode not in ('record', 'replay', None):
+            raise ValueError(f"Modo de fixtures desconhecido: {mode}")
+
+        self.fixture_mode = mode
+        if mode is None:
+            self.http = get_http_client()
+            self.rate_limiter = get_shared_scheduler()
+            return
+
+        # A private client, so the adapters never leak into the process-wide one
+        self.http = SharedHttpClient()
+        if mode == 'record':
+            adapter = RecordingAdapter(directory, self.fixture_key_for_url)
+        else:
+            adapter = ReplayAdapter(directory, self.fixture_key_for_url)
+            # Local replay needs no politeness delays
+            self.rate_limiter = HostRateScheduler(default_rate=1e9, default_capacity=1e9)
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
 
     def extract_price(self, price_text: str, currency_symbol: str) -> Optional[float]:
         """Extracts price from text, handling common formats."""
@@ -80,6 +190,126 @@ class ScraperEngine:
             print(f"Erro ao extrair título: {e}")
             return None
 
+    def fetch_page(self, site_key: str, url: str) -> bytes:
+        """Fetches a page body, serving it from the response cache while it is fresh and
+        revalidating stale entries with ETag/Last-Modified.
+        """
+        ttl = self.target_sites.get(site_key, {}).get('cache_ttl_seconds', self.response_cache.default_ttl)
+        cached = self.response_cache.lookup(url) if self.use_response_cache else None
+        if cached and cached.partial: # Truncated by a streaming read: callers here need the whole page
+            cached = None
+        if cached and cached.is_fresh():
+            print(f"📦 Cache hit: {url}")
+            return cached.content
+
+        self.rate_limiter.acquire(url)
+        response = self.http.get(url, timeout=self.request_timeout, headers=cached.conditional_headers() if cached else None)
+        if response.status_code == 304 and cached:
+            self.response_cache.refresh(url, ttl)
+            return cached.content
+        response.raise_for_status()
+
+        if self.use_response_cache:
+            self.response_cache.store(url, response.content, response.headers, ttl)
+        return response.content
+
+    def fetch_products_streaming(self, site_key: str, url: str, product_name_query: str) -> List[Dict]:
+        """Reads the response body in chunks and stops downloading as soon as enough valid
+        products have been extracted or the site's byte cap is reached.
+        The buffer is re-parsed at geometrically growing sizes, so total parse work stays
+        linear in the bytes actually downloaded.
+        """
+        site_config = self.target_sites[site_key]
+        ttl = site_config.get('cache_ttl_seconds', self.response_cache.default_ttl)
+        cached = self.response_cache.lookup(url) if self.use_response_cache else None
+        if cached and cached.is_fresh():
+            print(f"📦 Cache hit: {url}")
+            return self.extract_products_from_page(cached.content, site_key, product_name_query, url)
+
+        self.rate_limiter.acquire(url)
+        response = self.http.get(url, timeout=self.request_timeout, stream=True, headers=cached.conditional_headers() if cached else None)
+        try:
+            if response.status_code == 304 and cached:
+                self.response_cache.refresh(url, ttl)
+                return self.extract_products_from_page(cached.content, site_key, product_name_query, url)
+            response.raise_for_status()
+
+            max_bytes = site_config.get('max_bytes', self.default_max_bytes_per_site)
+            buffer = bytearray()
+            next_parse_at = self.stream_first_parse_bytes
+            products_found = None
+            truncated = False
+            for chunk in response.iter_content(chunk_size=self.stream_chunk_size):
+                buffer.extend(chunk)
+                if len(buffer) >= max_bytes:
+                    print(f"✂️ Limite de {max_bytes} bytes atingido em {site_config['name']}")
+                    truncated = True
+                    break
+                if len(buffer) >= next_parse_at:
+                    partial = self.extract_products_from_page(bytes(buffer), site_key, product_name_query, url, complete=False)
+                    if len(partial) >= self.max_products_per_site:
+                        products_found = partial
+                        print(f"⏹️ Download interrompido após {len(buffer)} bytes em {site_config['name']}")
+                        truncated = True
+                        break
+                    next_parse_at = len(buffer) * 2
+        finally:
+            response.close()
+
+        content = bytes(buffer)
+        if products_found is None:
+            products_found = self.extract_products_from_page(content, site_key, product_name_query, url)
+        # A truncated body still yields the same products when replayed here, but it is stored
+        # as partial: without the full response's validators and never served by fetch_page
+        if self.use_response_cache:
+            self.response_cache.store(url, content, response.headers, ttl, partial=truncated)
+        return products_found
+
+    def extract_products_from_page(self, content: bytes, site_key: str, product_name_query: str, search_url: str, complete: bool = True) -> List[Dict]:
+        """Extracts up to max_products_per_site valid products (title + price + query match)
+        from the first max_candidates_per_site product containers.
+        With complete=False the content is a partial download: the last container may be cut
+        off, so it is only used once another container has been seen after it.
+        """
+        site_config = self.target_sites[site_key]
+
+        # Find product items on the search results page
+        # This is highly dependent on the site's structure and the 'product_item_selector'
+        # Only the product containers are parsed (lxml when available), not the whole page
+        limit = self.max_candidates_per_site
+        product_elements = self.html_parser.select_items(content, site_config['product_item_selector'], limit=limit if complete else limit + 1)
+        if not complete:
+            product_elements = product_elements[:limit] if len(product_elements) > limit else product_elements[:-1]
+        elif not product_elements:
+            print(f"Nenhum elemento de produto encontrado para o seletor '{site_config['product_item_selector']}' em {site_config['name']}")
+
+        products_found = []
+        for item_el in product_elements:
+            title = self.extract_title(item_el, site_config['title_selector'])
+
+            price_el = item_el.select_one(site_config['price_selector'])
+            price_text = price_el.get_text(strip=True) if price_el else None
+            price = self.extract_price(price_text, site_config['currency_symbol'])
+
+            # Basic validation: if we have a title and price, and the title matches the query
+            # (most query tokens present, no conflicting model numbers)
+            if title and price and query_match_score(product_name_query, title) >= self.query_match_threshold:
+                products_found.append({
+                    'platform': site_config['name'],
+                    'title': title,
+                    'price': price,
+                    'url': search_url, # For now, points to search URL, not specific product
+                    'timestamp': datetime.now().isoformat(),
+                    'currency': site_config['currency_code']
+                })
+            # else:
+            #     print(f"   ℹ️ Item descartado em {site_config['name']}: Título='{title}', Preço='{price}'")
+
+            if len(products_found) >= self.max_products_per_site:
+                break
+
+        return products_found
+
     def scrape_site_for_product(self, site_key: str, product_name_query: str) -> List[Dict]:
         """Scrapes a specific site for a product query.
         Attempts to get data from the search results page directly.
@@ -89,49 +319,27 @@ class ScraperEngine:
             print(f"Configuração não encontrada para o site: {site_key}")
             return []
 
-        products_found = []
         try:
             search_url = site_config['search_url'].format(requests.utils.quote(product_name_query))
             print(f"🔍 Buscando '{product_name_query}' em {site_config['name']}: {search_url}")
 
-            response = self.session.get(search_url, timeout=20) # Increased timeout
-            response.raise_for_status()
+            # Transient errors are retried with backoff; a site that keeps failing is skipped
+            # by its circuit breaker until the cooldown ends
+            breaker = self.circuit_breakers[site_key]
+            if self.streaming_fetch:
+                products_found = breaker.call(self.retry_policy.call, self.fetch_products_streaming, site_key, search_url, product_name_query)
+            else:
+                content = breaker.call(self.retry_policy.call, self.fetch_page, site_key, search_url)
+                products_found = self.extract_products_from_page(content, site_key, product_name_query, search_url)
 
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            # Find product items on the search results page
-            # This is highly dependent on the site's structure and the 'product_item_selector'
-            product_elements = soup.select(site_config['product_item_selector'])
-            if not product_elements:
-                print(f"Nenhum elemento de produto encontrado para o seletor '{site_config['product_item_selector']}' em {site_config['name']}")
-
-            for item_el in product_elements[:3]: # Process top 3 results for MVP
-                title = self.extract_title(item_el, site_config['title_selector'])
-
-                price_el = item_el.select_one(site_config['price_selector'])
-                price_text = price_el.get_text(strip=True) if price_el else None
-                price = self.extract_price(price_text, site_config['currency_symbol'])
-
-                # Basic validation: if we have a title and price, and the query is in the title
-                if title and price and product_name_query.lower().split(' ')[0] in title.lower(): # Check first word of query
-                    product_data = {
-                        'platform': site_config['name'],
-                        'title': title,
-                        'price': price,
-                        'url': search_url, # For now, points to search URL, not specific product
-                        'timestamp': datetime.now().isoformat(),
-                        'currency': site_config['currency_code']
-                    }
-                    products_found.append(product_data)
-                    print(f"✅ Encontrado em {site_config['name']}: {title} - {site_config['currency_symbol']}{price}")
-                # else:
-                #     print(f"   ℹ️ Item descartado em {site_config['name']}: Título='{title}', Preço='{price}'")
-
-                if len(products_found) >= 1: # Get first valid product for MVP for simplicity
-                    break
+            for product in products_found:
+                print(f"✅ Encontrado em {site_config['name']}: {product['title']} - {site_config['currency_symbol']}{product['price']}")
 
             return products_found
 
+        except CircuitOpenError as e:
+            print(f"⏭️ {site_config['name']} ignorado: {e}")
+            return []
         except requests.exceptions.RequestException as e:
             print(f"❌ Erro de requisição ao buscar em {site_config['name']}: {e}")
             return []
@@ -139,27 +347,83 @@ class ScraperEngine:
             print(f"❌ Erro geral ao buscar em {site_config['name']} para '{product_name_query}': {e}")
             return []
 
-    def scrape_all_sites_for_product(self, product_name: str) -> List[Dict]:
-        """Scrapes all configured sites for a specific product."""
+    def scrape_all_sites_for_product(self, product_name: str, concurrent: Optional[bool] = None, site_keys: Optional[List[str]] = None) -> List[Dict]:
+        """Scrapes all configured sites (or only site_keys) for a specific product.
+        In concurrent mode every site is queried at the same time, so the wall-clock time is
+        close to the slowest single site. Results keep the order of target_sites either way.
+        """
+        if concurrent is None:
+            concurrent = self.concurrent_fetch
+
         all_results = []
         print(f"\n🚀 MONITORANDO PREÇOS GLOBAIS PARA: {product_name}")
         print("=" * 60)
 
-        for site_key in self.target_sites.keys():
-            results = self.scrape_site_for_product(site_key, product_name)
-            all_results.extend(results)
-            time.sleep(random.randint(3, 7)) # Random delay between sites
-
+        site_keys = [k for k in self.target_sites if site_keys is None or k in site_keys]
+        if concurrent and len(site_keys) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(site_keys), self.max_fetch_workers)) as executor:
+                futures = [executor.submit(self.scrape_site_for_product, site_key, product_name) for site_key in site_keys]
+                for future in futures: # Collect in site order, not completion order
+                    all_results.extend(future.result())
+        else:
+            for site_key in site_keys:
+                results = self.scrape_site_for_product(site_key, product_name)
+                all_results.extend(results)
+
+        self.price_history.record_many(product_name, all_results)
         return all_results
 
-    def calculate_arbitrage_opportunity(self, products: List[Dict], target_roi_percentage: float = 20.0) -> List[Dict]:
+    def collect_product_versions(self, product_name: str, site_keys: Optional[List[str]] = None) -> Tuple[List[Dict], List[str]]:
+        """Listings of a product on every site, fetching only the sites the refresh scheduler
+        says are due. The others are read from the price history, as long as the stored
+        listing is younger than the scheduler's maximum interval.
+        Returns (versions in target_sites order, site keys actually fetched).
+        """
+        site_keys = site_keys if site_keys is not None else list(self.target_sites.keys())
+        due = self.refresh_scheduler.due_sites(product_name, site_keys)
+        fresh = self.scrape_all_sites_for_product(product_name, site_keys=due) if due else []
+
+        latest = self.price_history.latest_prices(product_name) if len(due) < len(site_keys) else {}
+        max_age = self.refresh_scheduler.max_interval
+        versions = []
+        for site_key in site_keys:
+            platform = self.target_sites[site_key]['name']
+            if site_key in due:
+                versions.extend(p for p in fresh if p['platform'] == platform)
+                continue
+            row = latest.get(platform)
+            if row and time.time() - row['ts'] <= max_age:
+                versions.append({
+                    'platform': platform,
+                    'title': row['title'],
+                    'price': row['price'],
+                    'url': row['url'],
+                    'timestamp': datetime.fromtimestamp(row['ts']).isoformat(),
+                    'currency': row['currency'],
+                    'from_history': True
+                })
+        return versions, due
+
+    def record_refresh_outcome(self, product_name: str, fetched_sites: List[str], versions: List[Dict], opportunities: List[Dict]):
+        """Feeds the sites fetched by collect_product_versions back into the refresh scheduler."""
+        platforms_in_opportunities = {o['buy_from_platform'] for o in opportunities} | {o['sell_on_platform'] for o in opportunities}
+        for site_key in fetched_sites:
+            platform = self.target_sites[site_key]['name']
+            prices = [v['price'] for v in versions if v['platform'] == platform and not v.get('from_history')]
+            self.refresh_scheduler.record_observation(product_name, site_key, prices[0] if prices else None,
+                                                      produced_opportunity=platform in platforms_in_opportunities)
+
+    def calculate_arbitrage_opportunity(self, products: List[Dict], target_roi_percentage: float = 20.0,
+                                        top_k: Optional[int] = None, category: Optional[str] = None) -> List[Dict]:
         """Calculates arbitrage opportunities from a list of scraped products.
-        Assumes all prices are in USD for MVP or converted prior.
+        Prices are compared in USD, converted with the shared FX rate table, and costed with the
+        shared cost model (category selects duty and fee rates).
+        Returns the top_k best by ROI (all of them when top_k is None), best first.
         """
         if len(products) < 2:
             return []
 
-        opportunities = []
+        opportunities = TopK(top_k, key=by_field('estimated_roi_percentage'))
 
         # Separate by platform for clearer buy/sell logic
         # For MVP, let's assume AliExpress is source, Amazon is target if both present
@@ -169,77 +433,89 @@ class ScraperEngine:
         if not aliexpress_products or not amazon_products:
             return [] # Need products from both for this specific arbitrage path
 
-        for source_product in aliexpress_products:
-            for target_product in amazon_products:
-                # Basic title similarity check (can be much more sophisticated)
-                # For now, just ensure it's the same product query
-                # This logic needs to be improved for real-world scenarios
+        # Pair listings through a MinHash/LSH title index instead of every source x every target
+        target_index = TitleIndex()
+        for i, target_product in enumerate(amazon_products):
+            target_index.add(i, target_product['title'])
 
-                source_price = source_product['price']
-                target_price = target_product['price']
+        # Candidate pairs first, then one batch evaluation through the shared cost model
+        pairs = []
+        for source_product in aliexpress_products:
+            for target_idx, title_similarity in target_index.query(source_product['title'], min_similarity=self.title_match_threshold):
+                target_product = amazon_products[target_idx]
 
-                if source_price is None or target_price is None or source_price == 0:
+                if source_product['price'] is None or target_product['price'] is None:
                     continue
+                source_price = self.fx.convert(source_product['price'], source_product.get('currency', 'USD'))
+                target_price = self.fx.convert(target_product['price'], target_product.get('currency', 'USD'))
 
-                # Assuming prices are comparable (e.g., both USD)
-                price_diff = target_price - source_price
-
-                if price_diff <= 0: # No profit before costs
+                if source_price == 0 or target_price - source_price <= 0: # No profit before costs
                     continue
+                pairs.append((source_product, target_product, title_similarity, source_price, target_price))
 
-                # Simplified cost calculation for MVP
-                # These are rough estimates and vary wildly
-                shipping_from_source = source_price * 0.10  # Estimate 10% for shipping from AliExpress
-                amazon_fees_percentage = 0.15  # Amazon referral fee
-
-                amazon_fees = target_price * amazon_fees_percentage
-                estimated_total_costs = source_price + shipping_from_source + amazon_fees
-
-                net_profit = target_price - estimated_total_costs
-
-                if net_profit <= 0:
-                    continue
+        if not pairs:
+            return []
 
-                roi_on_investment = (net_profit / source_price) * 100 # ROI on initial product cost
-
-                if roi_on_investment >= target_roi_percentage:
-                    opportunities.append({
-                        'buy_from_platform': source_product['platform'],
-                        'buy_from_title': source_product['title'],
-                        'buy_price': source_price,
-                        'buy_url': source_product['url'],
-                        'sell_on_platform': target_product['platform'],
-                        'sell_on_title': target_product['title'],
-                        'sell_price': target_price,
-                        'sell_url': target_product['url'],
-                        'estimated_net_profit': round(net_profit, 2),
-                        'estimated_roi_percentage': round(roi_on_investment, 2),
-                        'product_name_query': source_product.get('title', 'N/A'), # Or a common identifier
-                        'timestamp': datetime.now().isoformat()
-                    })
-
-        return sorted(opportunities, key=lambda x: x['estimated_roi_percentage'], reverse=True)
-
-    def run_scraping_cycle(self) -> Dict:
-        """Executes a full scraping and arbitrage calculation cycle."""
+        costs = self.cost_model.evaluate_batch(
+            [pair[0]['platform'] for pair in pairs], [pair[1]['platform'] for pair in pairs],
+            [pair[3] for pair in pairs], [pair[4] for pair in pairs], category)
+
+        for (source_product, target_product, title_similarity, source_price, target_price), net_profit, roi_on_investment in zip(
+                pairs, costs['net_profit'].tolist(), costs['roi_percentage'].tolist()):
+            if net_profit <= 0:
+                continue
+
+            if roi_on_investment >= target_roi_percentage:
+                opportunities.push({
+                    'buy_from_platform': source_product['platform'],
+                    'buy_from_title': source_product['title'],
+                    'buy_price': source_price,
+                    'buy_url': source_product['url'],
+                    'sell_on_platform': target_product['platform'],
+                    'sell_on_title': target_product['title'],
+                    'sell_price': target_price,
+                    'sell_url': target_product['url'],
+                    'estimated_net_profit': round(net_profit, 2),
+                    'estimated_roi_percentage': round(roi_on_investment, 2),
+                    'product_name_query': source_product.get('title', 'N/A'), # Or a common identifier
+                    'title_similarity': title_similarity,
+                    'timestamp': datetime.now().isoformat()
+                })
+
+        return opportunities.items()
+
+    def run_scraping_cycle(self, adaptive: bool = True) -> Dict:
+        """Executes a full scraping and arbitrage calculation cycle.
+        In adaptive mode only (product, site) pairs due in the refresh scheduler are fetched,
+        and products with nothing due are skipped.
+        """
         print("\n🔥 INICIANDO CICLO DE SCRAPING GLOBAL")
         print("🎯 Objetivo: Encontrar oportunidades de arbitragem globais (Prova de Conceito)")
         print("💰 ROI mínimo alvo: 20%")
         print("=" * 80)
 
-        all_found_opportunities = []
+        # Global top-K plus the best opportunity of each product, kept as the cycle runs
+        ranking = GroupedTopK(self.cycle_top_k, key=by_field('estimated_roi_percentage'), per_group=1)
         scraping_summary = {
             'timestamp': datetime.now().isoformat(),
             'products_scraped_details': [],
             'total_opportunities_found': 0,
-            'best_opportunity_roi': 0.0
+            'best_opportunity_roi': 0.0,
+            'products_skipped_not_due': 0
         }
 
         for product_query in self.target_products:
-            print(f"\n📱 PRODUTO ALVO: {product_query}")
+            if adaptive:
+                # Due sites are fetched, the rest come from the price history
+                scraped_product_versions, fetched_sites = self.collect_product_versions(product_query)
+                if not fetched_sites:
+                    scraping_summary['products_skipped_not_due'] += 1
+                    continue
+            else:
+                # Scrape all configured sites for this product
+                scraped_product_versions, fetched_sites = self.scrape_all_sites_for_product(product_query), []
 
-            # Scrape all configured sites for this product
-            scraped_product_versions = self.scrape_all_sites_for_product(product_query)
+            print(f"\n📱 PRODUTO ALVO: {product_query}")
 
             current_product_summary = {
                 'product_query': product_query,
@@ -262,21 +538,25 @@ class ScraperEngine:
                         print(f"  🔗 URL Compra: {opp['buy_url']}")
                         print("  " + "-" * 50)
 
-                    all_found_opportunities.extend(opportunities)
-
-                    best_opp_roi = max(opp['estimated_roi_percentage'] for opp in opportunities)
-                    if best_opp_roi > scraping_summary['best_opportunity_roi']:
-                        scraping_summary['best_opportunity_roi'] = best_opp_roi
+                    ranking.extend(product_query, opportunities)
                 else:
                     print(f"  ❌ Nenhuma oportunidade de arbitragem rentável encontrada para {product_query} com os dados atuais.")
+                if adaptive:
+                    self.record_refresh_outcome(product_query, fetched_sites, scraped_product_versions, opportunities)
             else:
                 print(f"  ❌ {product_query} não encontrado em plataformas suficientes para análise.")
+                if adaptive:
+                    self.record_refresh_outcome(product_query, fetched_sites, [], [])
 
             scraping_summary['products_scraped_details'].append(current_product_summary)
             print("\n" + "=" * 60)
-            time.sleep(random.randint(5, 10)) # Longer pause between different products
+            # No pause between products: the per-host rate limiter spaces requests to each site
 
-        scraping_summary['total_opportunities_found'] = len(all_found_opportunities)
+        scraping_summary['total_opportunities_found'] = ranking.seen
+        best_opportunity = ranking.best()
+        scraping_summary['best_opportunity_roi'] = best_opportunity['estimated_roi_percentage'] if best_opportunity else 0.0
+        scraping_summary['best_by_product'] = {product: best[0] for product, best in ranking.best_by_group().items()}
+        self.price_history.flush()
 
         # Final summary
         print(f"\n🎯 RESUMO DO CICLO DE SCRAPING GLOBAL:")
@@ -285,15 +565,10 @@ class ScraperEngine:
         print(f"💰 Total de Oportunidades Encontradas: {scraping_summary['total_opportunities_found']}")
         print(f"🚀 Melhor ROI de Oportunidade: {scraping_summary['best_opportunity_roi']:.1f}%")
 
-        # if all_found_opportunities:
-        #     total_potential_profit = sum([opp['estimated_net_profit'] for opp in all_found_opportunities])
-        #     print(f"💵 Lucro potencial total estimado (das encontradas): ${total_potential_profit:.2f}")
-
-        return {'summary': scraping_summary, 'opportunities': all_found_opportunities}
+        return {'summary': scraping_summary, 'opportunities': ranking.items()}
 
 # For testing the scraper directly
 if __name__ == "__main__":
-    import random # ensure random is imported if running directly
     engine = ScraperEngine()
     results = engine.run_scraping_cycle()
     # print("\nFull Results (JSON):")
@@ -0,0 +1,86 @@
+"""
+GPAS 4.0 - HTML Parser Backends
+Parser abstraction for search result pages. Uses lxml when it is installed and parses only
+the product-container subtrees (SoupStrainer), falling back to a full 'html.parser' parse.
+"""
+
+import re
+from typing import List, Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml # noqa: F401 - only checking availability
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+# tag, tag.class, tag[attr], tag[attr="value"], tag[attr*="value"] - anything else needs a full parse
+_SIMPLE_SELECTOR_RE = re.compile(r'^(?P<tag>[a-zA-Z][\w-]*)?(?P<classes>(?:\.[\w-]+)*)(?P<attrs>(?:\[[^\]]+\])*)$')
+_ATTR_RE = re.compile(r'\[\s*(?P<name>[\w-]+)\s*(?:(?P<op>\*?=)\s*["\']?(?P<value>[^"\'\]]*)["\']?)?\s*\]')
+
+
+def available_backends() -> List[str]:
+    """Backends usable in this environment, fastest first."""
+    return (['lxml'] if LXML_AVAILABLE else []) + ['html.parser']
+
+
+def strainer_for_selector(selector: str) -> Optional[SoupStrainer]:
+    """Translates a simple CSS selector into a SoupStrainer.
+    Returns None for selectors a strainer cannot express (lists, combinators, pseudo-classes).
+    """
+    match = _SIMPLE_SELECTOR_RE.match(selector.strip())
+    if not match or not (match.group('tag') or match.group('classes') or match.group('attrs')):
+        return None
+
+    attrs = {}
+    classes = [c for c in match.group('classes').split('.') if c]
+    if len(classes) > 1:
+        return None # SoupStrainer matches one class at a time
+    if classes:
+        attrs['class'] = classes[0]
+
+    for attr in _ATTR_RE.finditer(match.group('attrs')):
+        name, op, value = attr.group('name'), attr.group('op'), attr.group('value')
+        if op is None:
+            attrs[name] = True
+        elif op == '=':
+            attrs[name] = value
+        else: # *= substring match
+            attrs[name] = re.compile(re.escape(value))
+
+    return SoupStrainer(match.group('tag') or True, attrs=attrs)
+
+
+class HtmlParser:
+    """Parses pages with the configured backend, restricted to product containers when possible."""
+
+    def __init__(self, backend: Optional[str] = None, restrict_to_items: bool = True):
+        if backend is None:
+            backend = available_backends()[0]
+        if backend not in available_backends():
+            print(f"⚠️ Parser '{backend}' indisponível, a usar 'html.parser'")
+            backend = 'html.parser'
+        self.backend = backend
+        self.restrict_to_items = restrict_to_items
+
+    def parse(self, content, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+        try:
+            return BeautifulSoup(content, self.backend, parse_only=parse_only)
+        except Exception as e:
+            if self.backend == 'html.parser':
+                raise
+            print(f"⚠️ Falha do parser '{self.backend}' ({e}), a usar 'html.parser'")
+            return BeautifulSoup(content, 'html.parser', parse_only=parse_only)
+
+    def select_items(self, content, item_selector: str, limit: Optional[int] = None) -> List:
+        """Returns the product container elements matching item_selector.
+        Only the matching subtrees are built when the selector can be expressed as a strainer;
+        if that finds nothing, the page is parsed in full so results never get worse.
+        """
+        strainer = strainer_for_selector(item_selector) if self.restrict_to_items else None
+        if strainer is not None:
+            items = self.parse(content, parse_only=strainer).select(item_selector, limit=limit or 0)
+            if items:
+                return items
+        return self.parse(content).select(item_selector, limit=limit or 0)
@@ -0,0 +1,182 @@
+"""
+GPAS 4.0 - Shared HTTP Client
+One pooled requests.Session for every service in the process: per-host connection pools,
+keep-alive, gzip/brotli negotiation and default timeouts, plus connection reuse rates and
+per-host latency histograms.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import brotli # noqa: F401 - urllib3 decodes 'br' when a brotli package is installed
+    BROTLI_AVAILABLE = True
+except ImportError:
+    try:
+        import brotlicffi # noqa: F401
+        BROTLI_AVAILABLE = True
+    except ImportError:
+        BROTLI_AVAILABLE = False
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class HostMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_latency_ms = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, latency_ms: float, error: bool):
+        self.requests += 1
+        self.errors += int(error)
+        self.total_latency_ms += latency_ms
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    def to_dict(self) -> Dict:
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'avg_latency_ms': round(self.total_latency_ms / self.requests, 1) if self.requests else 0.0,
+            'latency_histogram': dict(zip(labels, self.histogram))
+        }
+
+
+class SharedHttpClient:
+    """Pooled HTTP client. Latency is measured up to the response headers, so streamed
+    bodies are not counted.
+    """
+
+    def __init__(self, pool_connections: int = 20, pool_maxsize: int = 10,
+                 timeout: Union[float, Tuple[float, float]] = (5, 20), user_agent: str = DEFAULT_USER_AGENT):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': user_agent,
+            'Accept-Encoding': 'gzip, deflate, br' if BROTLI_AVAILABLE else 'gzip, deflate',
+            'Connection': 'keep-alive'
+        })
+        self._metrics: Dict[str, HostMetrics] = {}
+        self._lock = threading.Lock()
+        self._adapters: Dict[str, HTTPAdapter] = {} # Mounted prefix -> pooled adapter created here (for pool stats)
+        default_adapter = self._new_adapter(pool_maxsize)
+        self._mount('http://', default_adapter)
+        self._mount('https://', default_adapter)
+
+    def _new_adapter(self, pool_maxsize: int) -> HTTPAdapter:
+        # No urllib3-level retries: callers use RetryPolicy so backoff and circuit breaking stay visible
+        return HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+
+    def _mount(self, prefix: str, adapter, pooled: bool = True):
+        """Mounts adapter on prefix and closes the pooled adapter it replaces, unless another
+        prefix still uses it. Caller holds the lock (or is __init__).
+        """
+        replaced = self._adapters.pop(prefix, None)
+        self.session.mount(prefix, adapter)
+        if pooled:
+            self._adapters[prefix] = adapter
+        if replaced is not None and replaced is not adapter and all(a is not replaced for a in self._adapters.values()):
+            replaced.close()
+
+    def configure_host(self, base_url: str, pool_maxsize: int):
+        """Gives a host its own connection pool size (requests picks the longest mounted prefix).
+        Configuring a host again with the same size keeps its pool (and its open connections).
+        """
+        prefix = base_url.rstrip('/') + '/'
+        with self._lock:
+            current = self._adapters.get(prefix)
+            if current is not None and current._pool_maxsize == pool_maxsize:
+                return
+            self._mount(prefix, self._new_adapter(pool_maxsize))
+
+    def mount(self, prefix: str, adapter):
+        """Mounts a custom transport adapter (e.g. record/replay fixtures)."""
+        with self._lock:
+            self._mount(prefix, adapter, pooled=False)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlparse(url).netloc.lower()
+        start = time.perf_counter()
+        error = True
+        try:
+            response = self.session.request(method, url, **kwargs)
+            error = response.status_code >= 500
+            return response
+        finally:
+            latency_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._metrics.setdefault(host, HostMetrics()).record(latency_ms, error)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def _pool_stats(self) -> Dict[str, Dict]:
+        """New connections vs. requests per host, read from the urllib3 pools."""
+        pools = {}
+        with self._lock:
+            adapters = list({id(adapter): adapter for adapter in self._adapters.values()}.values())
+        for adapter in adapters:
+            manager = adapter.poolmanager
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                host = f"{pool.host}:{pool.port}" if pool.port not in (None, 80, 443) else pool.host
+                entry = pools.setdefault(host, {'new_connections': 0, 'pooled_requests': 0})
+                entry['new_connections'] += pool.num_connections
+                entry['pooled_requests'] += pool.num_requests
+        for entry in pools.values():
+            reused = entry['pooled_requests'] - entry['new_connections']
+            entry['connection_reuse_rate'] = round(reused / entry['pooled_requests'], 3) if entry['pooled_requests'] else 0.0
+        return pools
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            hosts = {host: metrics.to_dict() for host, metrics in self._metrics.items()}
+        pools = self._pool_stats()
+        for host, pool in pools.items():
+            hosts.setdefault(host, {}).update(pool)
+        total_requests = sum(p['pooled_requests'] for p in pools.values())
+        total_new = sum(p['new_connections'] for p in pools.values())
+        return {
+            'brotli_enabled': BROTLI_AVAILABLE,
+            'connection_reuse_rate': round((total_requests - total_new) / total_requests, 3) if total_requests else 0.0,
+            'hosts': hosts
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_shared_client: Optional[SharedHttpClient] = None
+_shared_client_lock = threading.Lock()
+
+
+def get_http_client() -> SharedHttpClient:
+    """Process-wide client, so connections are reused across every service."""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = SharedHttpClient()
+        return _shared_client
@@ -0,0 +1,280 @@
+"""
+GPAS 4.0 - Generative Insight Service
+Gets the generative AI insights of a scan in a few requests instead of one blocking call per
+opportunity: opportunities are grouped into one prompt per batch, batches are sent concurrently
+(bounded), and answers are cached by product, route and bucketed price/ROI, so near-identical
+opportunities in later scans reuse them.
+Try it against the local mock endpoint with: python -m src.services.insight_service --mock [--count 50]
+"""
+
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Hashable, List, Optional, Sequence
+from urllib.parse import urlparse
+
+import requests
+
+from .http_client import SharedHttpClient, get_http_client
+from .memo_cache import TTLCache
+
+ERROR_INSIGHT = "(Erro ao obter insight da IA)"
+PARSE_ERROR_INSIGHT = "(Erro ao processar insight da IA)"
+
+SIMULATED_INSIGHTS = (
+    "O produto {product_name} parece ter um bom potencial de ROI ({roi_percentage:.2f}%).",
+    "A diferença de preço para {product_name} entre {source_platform} e {target_platform} é notável.",
+    "Considerar a liquidez e os custos de envio para esta oportunidade.",
+    "Uma análise mais aprofundada das tendências de mercado para esta categoria é recomendada."
+)
+
+
+class InsightService:
+    """Batched, concurrent and cached insight requests. Without an endpoint/API key it returns
+    simulated insights, as the brain always did. Failed batches are not cached, so they are
+    retried on the next scan.
+    """
+
+    def __init__(self, endpoint: Optional[str], api_key: Optional[str], http: Optional[SharedHttpClient] = None,
+                 batch_size: int = 8, max_concurrency: int = 4, timeout: float = 15,
+                 cache_ttl_seconds: float = 3600, max_cached: int = 2000,
+                 price_bucket_pct: float = 5.0, roi_bucket_width: float = 10.0):
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.http = http or get_http_client()
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.price_bucket_pct = price_bucket_pct
+        self.roi_bucket_width = roi_bucket_width
+        self.cache = TTLCache(max_entries=max_cached, default_ttl=cache_ttl_seconds)
+        self._stats_lock = threading.Lock()
+        if endpoint:
+            parsed = urlparse(endpoint)
+            # One pooled connection per concurrent batch
+            self.http.configure_host(f"{parsed.scheme}://{parsed.netloc}", pool_maxsize=max_concurrency)
+
+        # Stats
+        self.requests_sent = 0
+        self.requests_failed = 0
+        self.insights_requested = 0
+        self.insights_generated = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.endpoint and self.api_key)
+
+    def _bucket(self, value: float, pct: float) -> int:
+        """Log-scale bucket: prices within ~pct% of each other share a bucket."""
+        return math.floor(math.log(value) / math.log1p(pct / 100)) if value and value > 0 else 0
+
+    def cache_key(self, opportunity) -> Hashable:
+        return (
+            opportunity.product_name, opportunity.source_platform, opportunity.target_platform,
+            self._bucket(opportunity.source_price, self.price_bucket_pct),
+            self._bucket(opportunity.target_price, self.price_bucket_pct),
+            math.floor(opportunity.roi_percentage / self.roi_bucket_width)
+        )
+
+    def simulated_insight(self, opportunity) -> str:
+        template = random.choice(SIMULATED_INSIGHTS)
+        return "(Insight Simulado) " + template.format(
+            product_name=opportunity.product_name, roi_percentage=opportunity.roi_percentage,
+            source_platform=opportunity.source_platform, target_platform=opportunity.target_platform)
+
+    def _describe(self, opportunity) -> str:
+        return (
+            f"Produto: '{opportunity.product_name}', "
+            f"Comprar em: '{opportunity.source_platform}' por {opportunity.source_price} {opportunity.source_currency}, "
+            f"Vender em: '{opportunity.target_platform}' por {opportunity.target_price} {opportunity.target_currency}, "
+            f"ROI Estimado: {opportunity.roi_percentage:.2f}%. "
+            f"Notas Adicionais: {opportunity.notes if opportunity.notes else 'N/A'}."
+        )
+
+    def build_prompt(self, opportunities: Sequence) -> str:
+        if len(opportunities) == 1:
+            return ("Analise esta oportunidade de arbitragem e forneça um breve insight (1-2 frases) sobre o seu potencial. "
+                    + self._describe(opportunities[0]))
+        numbered = "\n".join(f"{i}. {self._describe(opp)}" for i, opp in enumerate(opportunities, start=1))
+        return (
+            f"Analise estas {len(opportunities)} oportunidades de arbitragem e forneça um breve insight (1-2 frases) "
+            f"sobre o potencial de cada uma. Responda com uma lista JSON de {len(opportunities)} strings, "
+            f"pela mesma ordem.\n{numbered}"
+        )
+
+    def _parse_insights(self, response_data: Dict, expected: int) -> List[str]:
+        """Accepts 'generated_text_insights' (one per opportunity) or a single 'generated_text_insight',
+        which for a batch must hold the JSON list the prompt asked for.
+        """
+        if not isinstance(response_data, dict):
+            raise ValueError(f"expected a JSON object, got {type(response_data).__name__}")
+        insights = response_data.get('generated_text_insights')
+        if insights is None:
+            text = response_data.get('generated_text_insight')
+            if text is None:
+                return []
+            if expected == 1:
+                return [text]
+            try:
+                insights = json.loads(text)
+            except ValueError:
+                return []
+        if not isinstance(insights, list):
+            return []
+        return [str(insight).strip() for insight in insights[:expected]]
+
+    def _request_batch(self, opportunities: Sequence) -> Optional[List[str]]:
+        """One request for a batch; None when it failed (nothing is cached then)."""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        # The payload structure depends on the AI API being used; this is a generic example
+        payload = {
+            "prompt": self.build_prompt(opportunities),
+            "max_tokens": 60 * len(opportunities),
+            "temperature": 0.7
+        }
+        with self._stats_lock:
+            self.requests_sent += 1
+        try:
+            response = self.http.post(self.endpoint, headers=headers, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            insights = self._parse_insights(response.json(), len(opportunities))
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Erro ao chamar API de IA generativa ({len(opportunities)} oportunidades): {e}")
+            with self._stats_lock:
+                self.requests_failed += 1
+            return None
+        except ValueError as e:
+            print(f"❌ Erro inesperado ao processar resposta da IA: {e}")
+            with self._stats_lock:
+                self.requests_failed += 1
+            return [PARSE_ERROR_INSIGHT] * len(opportunities)
+        except Exception as e: # Never let one batch abort the whole scan (get_insights runs them in executor.map)
+            print(f"❌ Erro inesperado ao obter insights da IA: {e}")
+            with self._stats_lock:
+                self.requests_failed += 1
+            return None
+        # Missing answers (shorter list than the batch) are reported as parse errors
+        return insights + [PARSE_ERROR_INSIGHT] * (len(opportunities) - len(insights))
+
+    def get_insights(self, opportunities: Sequence) -> List[Optional[str]]:
+        """Insights aligned with opportunities. Cached ones are served from memory, opportunities
+        sharing a cache key are requested once, and the rest go out in concurrent batches.
+        """
+        if not opportunities:
+            return []
+        if not self.enabled:
+            return [self.simulated_insight(opp) for opp in opportunities]
+
+        keys = [self.cache_key(opp) for opp in opportunities]
+        insights: Dict[Hashable, str] = {}
+        pending: Dict[Hashable, object] = {} # key -> first opportunity with it
+        for key, opp in zip(keys, opportunities):
+            if key in insights or key in pending:
+                continue
+            cached = self.cache.get('insight', key)
+            if cached is not None:
+                insights[key] = cached
+            else:
+                pending[key] = opp
+
+        pending_keys = list(pending)
+        batches = [pending_keys[i:i + self.batch_size] for i in range(0, len(pending_keys), self.batch_size)]
+        if batches:
+            print(f"🤖 Pedindo {len(pending_keys)} insights à IA generativa em {len(batches)} pedidos "
+                  f"(até {self.max_concurrency} em paralelo)")
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                results = executor.map(lambda batch: self._request_batch([pending[k] for k in batch]), batches)
+                for batch, batch_insights in zip(batches, results):
+                    if batch_insights is None:
+                        insights.update((key, ERROR_INSIGHT) for key in batch)
+                        continue
+                    for key, insight in zip(batch, batch_insights):
+                        insights[key] = insight
+                        if insight != PARSE_ERROR_INSIGHT:
+                            self.cache.put('insight', key, insight)
+
+        with self._stats_lock:
+            self.insights_requested += len(opportunities)
+            self.insights_generated += len(pending_keys)
+        return [insights[key] for key in keys]
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            stats = {
+                'enabled': self.enabled,
+                'batch_size': self.batch_size,
+                'max_concurrency': self.max_concurrency,
+                'requests_sent': self.requests_sent,
+                'requests_failed': self.requests_failed,
+                'insights_requested': self.insights_requested,
+                'insights_generated': self.insights_generated
+            }
+        stats['cache'] = self.cache.get_stats()
+        return stats
+
+
+# --- Local mock endpoint ---
+
+class _MockInsightHandler(BaseHTTPRequestHandler):
+    """Answers like a generative API: one insight per numbered opportunity in the prompt."""
+
+    latency_seconds = 0.0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        prompt = json.loads(body or b'{}').get('prompt', '')
+        count = sum(1 for line in prompt.splitlines() if line.split('.', 1)[0].isdigit()) or 1
+        time.sleep(self.latency_seconds)
+        data = json.dumps({'generated_text_insights': [f"(Mock) Insight {i + 1} de {count}" for i in range(count)]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_mock_endpoint(port: int = 0, latency_seconds: float = 1.0) -> ThreadingHTTPServer:
+    """Starts the mock endpoint on a daemon thread; its URL is http://127.0.0.1:<server.server_port>/."""
+    handler = type('MockInsightHandler', (_MockInsightHandler,), {'latency_seconds': latency_seconds})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+    from types import SimpleNamespace
+
+    parser = argparse.ArgumentParser(description="Insights generativos em lote (GPAS 4.0)")
+    parser.add_argument('--mock', action='store_true', help="Usar o endpoint mock local")
+    parser.add_argument('--endpoint', default=None)
+    parser.add_argument('--latency', type=float, default=1.0, help="Latência do mock por pedido (s)")
+    parser.add_argument('--count', type=int, default=50)
+    args = parser.parse_args()
+
+    server = serve_mock_endpoint(latency_seconds=args.latency) if args.mock else None
+    endpoint = args.endpoint or (f"http://127.0.0.1:{server.server_port}/" if server else None)
+    opportunities = [SimpleNamespace(
+        product_name=f"Produto {i}", source_platform='AliExpress.com', target_platform='Amazon.com',
+        source_price=10.0 + i, source_currency='USD', target_price=30.0 + 2 * i, target_currency='USD',
+        roi_percentage=80.0 + i, notes=None) for i in range(args.count)]
+
+    sequential = InsightService(endpoint, 'mock-key', batch_size=1, max_concurrency=1)
+    batched = InsightService(endpoint, 'mock-key')
+    for label, service in (("1 pedido por oportunidade", sequential), ("em lote + concorrente", batched),
+                           ("em lote (cache)", batched)):
+        start = time.perf_counter()
+        service.get_insights(opportunities)
+        print(f"{label}: {time.perf_counter() - start:.2f}s, {service.requests_sent} pedidos no total")
+    if server:
+        server.shutdown()
@@ -0,0 +1,217 @@
+"""
+GPAS 4.0 - Market Graph
+Markets are nodes and, per product, an edge u -> v means "buy in u, sell in v". Its weight is
+-log(proceeds in v / landed cost in u), with rates from the shared cost model, so the most
+profitable route of up to max_hops trades is a hop-bounded shortest path and a cycle with
+negative total weight is a money pump.
+Shortest paths are computed for all products at once with a vectorized Bellman-Ford, and price
+updates only touch one row/column of one product, which is recomputed lazily.
+"""
+
+import math
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .cost_model import CostModel
+
+BUY_TYPES = ('source', 'both')
+SELL_TYPES = ('sell', 'both')
+
+
+class MarketGraph:
+    """Per-product weight tensor W[p, u, v] over a fixed set of markets (np.inf = no edge)."""
+
+    def __init__(self, markets: Dict[str, Dict], cost_model: CostModel, max_hops: int = 3):
+        self.markets = list(markets)
+        self.index = {m: i for i, m in enumerate(self.markets)}
+        self.cost_model = cost_model
+        self.max_hops = max_hops
+        n = len(self.markets)
+
+        types = [markets[m].get('market_type', 'both') for m in self.markets]
+        self.can_buy = np.array([t in BUY_TYPES for t in types])
+        self.can_sell = np.array([t in SELL_TYPES for t in types])
+        self.allowed = self.can_buy[:, None] & self.can_sell[None, :] & ~np.eye(n, dtype=bool)
+
+        # Per category: landed cost multiplier of buying in u for sale in v (price + shipping + duty)
+        # and the share of the sale price kept in v. Fixed per-unit fees do not scale with price,
+        # so they are left out of the ratios.
+        positions = cost_model.market_positions(self.markets)
+        self.cost_factor = 1.0 + cost_model.shipping_rate[positions][None, :, None] \
+            + cost_model.duty_rate[positions[:, None], positions[None, :], :].transpose(2, 0, 1)
+        self.proceeds_factor = 1.0 - cost_model.platform_fee_rate[positions, :].T - cost_model.payment_fee_rate[positions][None, :]
+
+        self.products: List[str] = []
+        self.product_index: Dict[str, int] = {}
+        self._allocate(0, 64)
+        self._lock = threading.RLock()
+
+        # Stats
+        self.price_updates = 0
+        self.products_recomputed = 0
+
+    def _allocate(self, used: int, capacity: int):
+        """(Re)allocates the per-product arrays with room for capacity products, keeping the first used."""
+        n, layers = len(self.markets), self.max_hops + 1
+        arrays = {
+            'prices': np.full((capacity, n), np.nan), # USD price per (product, market)
+            'weights': np.full((capacity, n, n), np.inf),
+            '_dirty': np.zeros(capacity, dtype=bool),
+            '_category': np.zeros(capacity, dtype=np.intp),
+            '_dist': np.full((capacity, layers, n), np.inf),
+            '_pred': np.full((capacity, layers, n), -1, dtype=np.intp)
+        }
+        for name, array in arrays.items():
+            if used:
+                array[:used] = getattr(self, name)[:used]
+            setattr(self, name, array)
+
+    def _product(self, product: str, category: Optional[str] = None) -> int:
+        p = self.product_index.get(product)
+        if p is None:
+            p = len(self.products)
+            if p == len(self.prices):
+                self._allocate(p, 2 * p) # Amortized O(1) growth
+            self.products.append(product)
+            self.product_index[product] = p
+            self._category[p] = self.cost_model.category_position(category)
+        return p
+
+    def update_price(self, product: str, market: str, price_usd: Optional[float], category: Optional[str] = None):
+        """Sets (or with None clears) a product's price in one market; only edges touching that
+        market change. Routes are recomputed on the next query. The category (used for duty and
+        fees) is fixed when a product is first seen.
+        """
+        with self._lock:
+            p, m = self._product(product, category), self.index[market]
+            self.prices[p, m] = price_usd if price_usd and price_usd > 0 else np.nan
+            row = self.prices[p]
+            cost_factor, proceeds_factor = self.cost_factor[self._category[p]], self.proceeds_factor[self._category[p]]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # Out of m: buy at m, sell anywhere; into m: buy anywhere, sell at m
+                out_ratio = row * proceeds_factor / (row[m] * cost_factor[m, :])
+                in_ratio = row[m] * proceeds_factor[m] / (row * cost_factor[:, m])
+            self.weights[p, m, :] = np.where(self.allowed[m, :] & (out_ratio > 0), -np.log(out_ratio), np.inf)
+            self.weights[p, :, m] = np.where(self.allowed[:, m] & (in_ratio > 0), -np.log(in_ratio), np.inf)
+            self._dirty[p] = True
+            self.price_updates += 1
+
+    def update_prices(self, product: str, prices_usd: Dict[str, float], category: Optional[str] = None):
+        for market, price in prices_usd.items():
+            self.update_price(product, market, price, category)
+
+    def _recompute(self):
+        """Layered Bellman-Ford for the dirty products: dist[h, v] is the best weight of a route of
+        exactly h trades ending with a sale in v, starting with a purchase in any buy market.
+        """
+        dirty = np.nonzero(self._dirty[:len(self.products)])[0]
+        if not len(dirty):
+            return
+        weights = self.weights[dirty]
+        n = len(self.markets)
+        dist = np.full((len(dirty), self.max_hops + 1, n), np.inf)
+        pred = np.full((len(dirty), self.max_hops + 1, n), -1, dtype=np.intp)
+        dist[:, 0, :] = np.where(self.can_buy & ~np.isnan(self.prices[dirty]), 0.0, np.inf)
+        for h in range(1, self.max_hops + 1):
+            candidates = dist[:, h - 1, :, None] + weights # [product, from, to]
+            pred[:, h, :] = candidates.argmin(axis=1)
+            dist[:, h, :] = candidates.min(axis=1)
+        self._dist[dirty] = dist
+        self._pred[dirty] = pred
+        self._dirty[dirty] = False
+        self.products_recomputed += len(dirty)
+
+    def _path(self, p: int, hops: int, end: int) -> List[int]:
+        path = [end]
+        for h in range(hops, 0, -1):
+            path.append(int(self._pred[p, h, path[-1]]))
+        return path[::-1]
+
+    def best_routes(self, top_k: int = 20, min_hops: int = 1, product: Optional[str] = None) -> List[Dict]:
+        """Most profitable simple routes (no market visited twice), best return first."""
+        with self._lock:
+            self._recompute()
+            if product is not None:
+                product_ids = np.array([self.product_index[product]])
+            else:
+                product_ids = np.arange(len(self.products))
+            first = max(1, min_hops)
+            dist = self._dist[product_ids, first:, :]
+            # Only routes returning more than they cost (weight < 0) and ending with a sale
+            p_pos, h_pos, ends = np.nonzero((dist < 0) & self.can_sell)
+            order = np.argsort(dist[p_pos, h_pos, ends], kind='stable')
+
+            routes = []
+            for i in order:
+                p, hops, end = int(product_ids[p_pos[i]]), int(h_pos[i]) + first, int(ends[i])
+                path = self._path(p, hops, end)
+                if len(set(path)) != len(path):
+                    continue # Repeats a market: see find_arbitrage_cycles
+                routes.append(self._route_dict(p, path, math.exp(-self._dist[p, hops, end])))
+                if len(routes) >= top_k:
+                    break
+            return routes
+
+    def _route_dict(self, p: int, path: List[int], ratio: float) -> Dict:
+        """ratio is the product of proceeds / landed cost along the path, so the percentage is a
+        return on landed cost, not the cost model's roi_percentage (net profit over purchase price).
+        """
+        return {
+            'product': self.products[p],
+            'route': [self.markets[m] for m in path],
+            'hops': len(path) - 1,
+            'prices_usd': [round(float(self.prices[p, m]), 2) for m in path],
+            'return_multiple': round(ratio, 4),
+            'return_on_landed_cost_pct': round((ratio - 1) * 100, 2)
+        }
+
+    def find_arbitrage_cycles(self, product: str) -> List[Dict]:
+        """Negative cycles of one product (standard Bellman-Ford with a final relaxation pass):
+        loops of trades whose combined return is above 1.
+        """
+        with self._lock:
+            p = self.product_index[product]
+            weights = self.weights[p]
+            n = len(self.markets)
+            dist = np.zeros(n) # Virtual source connected to every market
+            pred = np.full(n, -1, dtype=np.intp)
+            for _ in range(n):
+                candidates = dist[:, None] + weights
+                best_from = candidates.argmin(axis=0)
+                best = candidates[best_from, np.arange(n)]
+                improved = best < dist - 1e-12
+                if not improved.any():
+                    return []
+                dist = np.where(improved, best, dist)
+                pred = np.where(improved, best_from, pred)
+
+            cycles, seen = [], set()
+            for v in np.nonzero(improved)[0]:
+                for _ in range(n): # Walk back n steps to land inside the cycle
+                    v = pred[v]
+                cycle, u = [int(v)], int(pred[v])
+                while u != cycle[0] and len(cycle) <= n:
+                    cycle.append(u)
+                    u = int(pred[u])
+                cycle = cycle[::-1] + [cycle[-1]] # pred links point backwards; close the loop
+                key = frozenset(cycle)
+                if key in seen:
+                    continue
+                seen.add(key)
+                weight = sum(weights[a, b] for a, b in zip(cycle, cycle[1:]))
+                cycles.append(self._route_dict(p, cycle, math.exp(-weight)))
+            return cycles
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'markets': len(self.markets),
+                'products': len(self.products),
+                'edges': int(np.isfinite(self.weights[:len(self.products)]).sum()),
+                'max_hops': self.max_hops,
+                'dirty_products': int(self._dirty[:len(self.products)].sum()),
+                'price_updates': self.price_updates,
+                'products_recomputed': self.products_recomputed
+            }
@@ -0,0 +1,119 @@
+"""
+GPAS 4.0 - Memoization Cache
+In-memory TTL + LRU cache for market search results, keyed by (namespace, key) - typically
+(market, product). Each namespace can have its own freshness window; the cache is bounded and
+evicts the least recently used entry when full.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class NamespaceStats:
+    __slots__ = ('hits', 'misses', 'expired', 'evictions', 'invalidations')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def to_dict(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+
+class TTLCache:
+    """Thread-safe TTL/LRU memoization. Values are returned as stored, so callers must treat
+    them as read-only.
+    """
+
+    def __init__(self, max_entries: int = 5000, default_ttl: float = 600,
+                 ttl_by_namespace: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttl_by_namespace = dict(ttl_by_namespace or {})
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict() # -> (expires_at, value)
+        self._stats: Dict[str, NamespaceStats] = {}
+        self._lock = threading.Lock()
+
+    def ttl_for(self, namespace: str) -> float:
+        return self.ttl_by_namespace.get(namespace, self.default_ttl)
+
+    def _ns_stats(self, namespace: str) -> NamespaceStats:
+        stats = self._stats.get(namespace)
+        if stats is None:
+            stats = self._stats[namespace] = NamespaceStats()
+        return stats
+
+    def get(self, namespace: str, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            stats = self._ns_stats(namespace)
+            entry = self._entries.get((namespace, key))
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end((namespace, key))
+                    stats.hits += 1
+                    return entry[1]
+                del self._entries[(namespace, key)]
+                stats.expired += 1
+            stats.misses += 1
+            return default
+
+    def put(self, namespace: str, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl_for(namespace))
+        with self._lock:
+            self._entries[(namespace, key)] = (expires_at, value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                (evicted_namespace, _), _ = self._entries.popitem(last=False)
+                self._ns_stats(evicted_namespace).evictions += 1
+
+    def get_or_compute(self, namespace: str, key: Hashable, compute: Callable[[], Any],
+                       cache_if: Callable[[Any], bool] = lambda value: True) -> Any:
+        """Cached value, or compute() stored under the namespace TTL when cache_if(value) holds
+        (e.g. to skip empty results from a failed search).
+        """
+        value = self.get(namespace, key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            if cache_if(value):
+                self.put(namespace, key, value)
+        return value
+
+    def invalidate(self, namespace: Optional[str] = None, key: Optional[Hashable] = None) -> int:
+        """Drops one entry, a whole namespace, or (with no arguments) everything. Returns how many."""
+        with self._lock:
+            if namespace is not None and key is not None:
+                doomed = [(namespace, key)] if (namespace, key) in self._entries else []
+            else:
+                doomed = [k for k in self._entries if namespace is None or k[0] == namespace]
+            for entry_key in doomed:
+                del self._entries[entry_key]
+                self._ns_stats(entry_key[0]).invalidations += 1
+            return len(doomed)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            per_namespace = {ns: stats.to_dict() for ns, stats in self._stats.items()}
+            hits = sum(s.hits for s in self._stats.values())
+            lookups = hits + sum(s.misses for s in self._stats.values())
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'namespaces': per_namespace
+            }
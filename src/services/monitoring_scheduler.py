@@ -0,0 +1,179 @@
+"""
+GPAS 4.0 - Monitoring Scheduler
+Runs the continuous monitoring cycle on a background thread: a private `schedule` scheduler
+fires the job at a random interval between min and max minutes (jitter, so workers and restarts
+do not line up), a run is skipped if the previous one is still going, and stop() shuts the
+thread down cleanly.
+Only one process runs it at a time: every gunicorn worker starts a scheduler, but only the one
+holding an exclusive lock on the lock file (fcntl.flock) is the leader. The kernel releases the
+lock when that process dies, and a follower takes over on its next retry.
+"""
+
+import atexit
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import schedule
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError: # Windows: no cross-process election, every process is its own leader
+    FCNTL_AVAILABLE = False
+
+DEFAULT_LOCK_PATH = os.path.join(tempfile.gettempdir(), 'gpas4_monitoring.lock')
+
+
+class LeaderLock:
+    """Non-blocking exclusive lock on a file, held for as long as the process keeps it open."""
+
+    def __init__(self, path: str = DEFAULT_LOCK_PATH):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        if not FCNTL_AVAILABLE:
+            self._fd = -1
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # Holder's PID, for whoever inspects the file
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode('ascii'))
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if self._fd >= 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
+
+
+class MonitoringScheduler:
+    """Jittered periodic job on a daemon thread, run only by the lock holder."""
+
+    def __init__(self, job: Callable[[], None], min_interval_minutes: float = 25, max_interval_minutes: float = 35,
+                 lock_path: str = DEFAULT_LOCK_PATH, leader_retry_seconds: float = 60, poll_seconds: float = 1.0):
+        self.job = job
+        self.min_interval_minutes = min_interval_minutes
+        self.max_interval_minutes = max_interval_minutes
+        self.leader_retry_seconds = leader_retry_seconds
+        self.poll_seconds = poll_seconds
+        self.leader_lock = LeaderLock(lock_path)
+        self.scheduler = schedule.Scheduler() # Private: jobs on the module-level default scheduler are not touched
+        self._job_lock = threading.Lock() # Held while a run is in progress
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Stats
+        self.runs = 0
+        self.failures = 0
+        self.skipped_overlaps = 0
+        self.last_run_started: Optional[float] = None
+        self.last_run_finished: Optional[float] = None
+        self.last_duration_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.leader_since: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> 'MonitoringScheduler':
+        if self.running:
+            return self
+        self._stop.clear()
+        self.scheduler.clear()
+        # Each wait is drawn again between min and max after every run (whole seconds: schedule uses randint)
+        min_seconds = max(1, round(self.min_interval_minutes * 60))
+        max_seconds = max(min_seconds, round(self.max_interval_minutes * 60))
+        self.scheduler.every(min_seconds).to(max_seconds).seconds.do(self.run_once)
+        self._thread = threading.Thread(target=self._loop, name='gpas-monitoring', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def _loop(self):
+        next_election = 0.0
+        while not self._stop.is_set():
+            if not self.leader_lock.held and time.monotonic() >= next_election:
+                if self.leader_lock.try_acquire():
+                    self.leader_since = time.time()
+                    print(f"🤖 [PID {os.getpid()}] Líder do monitoring contínuo (lock: {self.leader_lock.path})")
+                else:
+                    next_election = time.monotonic() + self.leader_retry_seconds
+            if self.leader_lock.held:
+                self.scheduler.run_pending()
+            self._stop.wait(self.poll_seconds)
+
+    def run_once(self) -> bool:
+        """Runs the job now unless a run is already in progress; returns whether it ran.
+        Exceptions are recorded, never raised (they would stop the scheduler thread).
+        """
+        if not self._job_lock.acquire(blocking=False):
+            self.skipped_overlaps += 1
+            return False
+        try:
+            self.last_run_started = time.time()
+            start = time.perf_counter()
+            try:
+                self.job()
+                self.last_error = None
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e) or e.__class__.__name__
+                print(f"❌ Ciclo de monitoring falhou: {e}")
+            self.runs += 1
+            self.last_duration_seconds = round(time.perf_counter() - start, 3)
+            self.last_run_finished = time.time()
+            return True
+        finally:
+            self._job_lock.release()
+
+    def stop(self, timeout: float = 30.0):
+        """Stops the thread (waiting up to timeout for a run in progress) and gives up leadership."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self.scheduler.clear()
+        # Keep the lock while a run is still going, so no other worker starts one in parallel
+        if not self._job_lock.locked():
+            self.leader_lock.release()
+            self.leader_since = None
+
+    def get_stats(self) -> Dict:
+        next_run = self.scheduler.next_run if self.leader_lock.held and self.scheduler.jobs else None
+        return {
+            'running': self.running,
+            'is_leader': self.leader_lock.held,
+            'leader_since': self.leader_since,
+            'pid': os.getpid(),
+            'lock_path': self.leader_lock.path,
+            'interval_minutes': [self.min_interval_minutes, self.max_interval_minutes],
+            'next_run': next_run.isoformat() if next_run else None,
+            'job_in_progress': self._job_lock.locked(),
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped_overlaps': self.skipped_overlaps,
+            'last_run_started': self.last_run_started,
+            'last_run_finished': self.last_run_finished,
+            'last_duration_seconds': self.last_duration_seconds,
+            'last_error': self.last_error
+        }
@@ -0,0 +1,231 @@
+"""
+GPAS 4.0 - Opportunity Batch
+Columnar storage for the opportunities of a scan. Costs, prices and ROI are NumPy columns, listing
+fields (market, price, URL, title) are read through source/target index columns from the listings
+the scan already holds, and low-cardinality labels (profit category, risk level) are stored as
+codes into a small vocabulary. Rows are selected through an index array, so filtering, sorting and
+slicing never copy the columns; a row is a lightweight read-only Mapping view. JSON output uses
+orjson when it is installed and the standard json module otherwise.
+"""
+
+import json
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+try:
+    import orjson # Serializes NumPy columns directly, without a list of Python floats
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Field name -> (storage, key), in the order of the former per-opportunity dicts
+FIELDS: Dict[str, Tuple[str, str]] = {
+    'source_market': ('source', 'market'),
+    'source_price': ('source', 'price'),
+    'source_currency': ('source', 'currency'),
+    'source_url': ('source', 'url'),
+    'target_market': ('target', 'market'),
+    'target_price': ('target', 'price'),
+    'target_currency': ('target', 'currency'),
+    'target_url': ('target', 'url'),
+    'product_title': ('source', 'title'),
+    'source_price_usd': ('column', 'source_price_usd'),
+    'target_price_usd': ('column', 'target_price_usd'),
+    'shipping_cost': ('column', 'shipping_cost'),
+    'import_duty': ('column', 'import_duty'),
+    'platform_fee': ('column', 'platform_fee'),
+    'payment_fee': ('column', 'payment_fee'),
+    'handling_fee': ('column', 'handling_fee'),
+    'total_costs': ('column', 'total_costs'),
+    'gross_profit': ('column', 'gross_profit'),
+    'roi_percentage': ('column', 'roi_percentage'),
+    'profit_category': ('label', 'profit_category'),
+    'estimated_shipping_days': ('column', 'estimated_shipping_days'),
+    'risk_level': ('label', 'risk_level'),
+    'timestamp': ('constant', 'timestamp')
+}
+
+Label = Tuple[np.ndarray, Sequence[str]] # (codes, vocabulary)
+
+
+class OpportunityRow(Mapping):
+    """Read-only view of one opportunity; reads like the former dict (row['roi_percentage'])."""
+
+    __slots__ = ('batch', 'row')
+
+    def __init__(self, batch: 'OpportunityBatch', row: int):
+        self.batch = batch
+        self.row = row # Position in the batch's columns, not in its selection
+
+    def __getitem__(self, name: str):
+        return self.batch._value(name, self.row)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def to_dict(self) -> Dict:
+        return {name: self.batch._value(name, self.row) for name in FIELDS}
+
+    def __repr__(self) -> str:
+        return f"OpportunityRow({self.to_dict()!r})"
+
+
+class OpportunityBatch:
+    """Opportunities of one or more source listings over a set of target listings.
+
+    columns holds the numeric fields plus 'source_index'/'target_index' into sources/targets;
+    labels maps a field to (codes, vocabulary). A batch created by filter/sort/slicing shares all
+    of them with its parent and only owns its row selection.
+    """
+
+    __slots__ = ('columns', 'sources', 'targets', 'labels', 'constants', '_rows')
+
+    def __init__(self, columns: Dict[str, np.ndarray], sources: Sequence[Dict], targets: Sequence[Dict],
+                 labels: Optional[Dict[str, Label]] = None, constants: Optional[Dict] = None,
+                 rows: Optional[np.ndarray] = None):
+        self.columns = columns
+        self.sources = sources
+        self.targets = targets
+        self.labels = labels or {}
+        self.constants = constants or {}
+        self._rows = rows # None = every row, in storage order
+
+    @classmethod
+    def empty(cls, sources: Sequence[Dict] = (), targets: Sequence[Dict] = (), constants: Optional[Dict] = None) -> 'OpportunityBatch':
+        columns = {'source_index': np.empty(0, dtype=np.intp), 'target_index': np.empty(0, dtype=np.intp)}
+        columns.update({key: np.empty(0) for storage, key in FIELDS.values() if storage == 'column'})
+        labels = {key: (np.empty(0, dtype=np.int8), ()) for storage, key in FIELDS.values() if storage == 'label'}
+        return cls(columns, sources, targets, labels, constants)
+
+    # --- Row selection ---
+
+    @property
+    def row_ids(self) -> np.ndarray:
+        if self._rows is None:
+            return np.arange(len(self.columns['source_index']))
+        return self._rows
+
+    def __len__(self) -> int:
+        return len(self.columns['source_index']) if self._rows is None else len(self._rows)
+
+    def _select(self, rows: np.ndarray) -> 'OpportunityBatch':
+        return OpportunityBatch(self.columns, self.sources, self.targets, self.labels, self.constants, rows)
+
+    def __getitem__(self, position: Union[int, slice, np.ndarray]) -> Union[OpportunityRow, 'OpportunityBatch']:
+        """batch[i] is a row view; batch[a:b] or batch[index_array] a batch sharing the columns."""
+        if isinstance(position, (int, np.integer)):
+            if self._rows is None:
+                n = len(self)
+                if not -n <= position < n:
+                    raise IndexError('opportunity index out of range')
+                return OpportunityRow(self, int(position) % n)
+            return OpportunityRow(self, int(self._rows[position]))
+        return self._select(self.row_ids[position])
+
+    def __iter__(self) -> Iterator[OpportunityRow]:
+        for row in self.row_ids.tolist():
+            yield OpportunityRow(self, row)
+
+    def filter(self, mask: np.ndarray) -> 'OpportunityBatch':
+        """Rows where mask (aligned with this batch, e.g. batch.column('roi_percentage') > 200) holds."""
+        return self._select(self.row_ids[np.asarray(mask, dtype=bool)])
+
+    def sort_by(self, name: str = 'roi_percentage', descending: bool = True) -> 'OpportunityBatch':
+        """Stable sort on a numeric field: ties keep their current order, like sorted(..., reverse=...)."""
+        values = self.column(name)
+        order = np.argsort(-values if descending else values, kind='stable')
+        return self._select(self.row_ids[order])
+
+    def top(self, k: int, name: str = 'roi_percentage') -> 'OpportunityBatch':
+        return self.sort_by(name)[:k]
+
+    def split_by_source(self, n_sources: int) -> List['OpportunityBatch']:
+        """One batch per source listing (rows must be grouped by source, as cost matrix output is)."""
+        rows = self.row_ids
+        bounds = np.searchsorted(self.columns['source_index'][rows], np.arange(n_sources + 1))
+        return [self._select(rows[bounds[i]:bounds[i + 1]]) for i in range(n_sources)]
+
+    @classmethod
+    def concat(cls, batches: Sequence['OpportunityBatch']) -> 'OpportunityBatch':
+        """Joins batches cut from the same columns (e.g. split_by_source output) without copying them."""
+        if not batches:
+            return cls.empty()
+        first = batches[0]
+        if any(batch.columns is not first.columns for batch in batches):
+            raise ValueError('concat needs batches that share their columns')
+        return first._select(np.concatenate([batch.row_ids for batch in batches]))
+
+    # --- Field access ---
+
+    def column(self, name: str) -> np.ndarray:
+        """A numeric field (or index column) for the selected rows."""
+        values = self.columns[name]
+        return values if self._rows is None else values[self._rows]
+
+    def values(self, name: str) -> list:
+        """Any field for the selected rows, as Python values."""
+        storage, key = FIELDS.get(name, ('column', name))
+        if storage == 'column':
+            return self.column(key).tolist()
+        if storage == 'label':
+            codes, vocabulary = self.labels[key]
+            selected = codes if self._rows is None else codes[self._rows]
+            return [vocabulary[code] for code in selected.tolist()]
+        if storage == 'constant':
+            return [self.constants.get(key)] * len(self)
+        listings = self.sources if storage == 'source' else self.targets
+        per_listing = np.empty(len(listings), dtype=object)
+        per_listing[:] = [listing[key] for listing in listings]
+        return per_listing[self.column(f'{storage}_index')].tolist()
+
+    def _value(self, name: str, row: int):
+        storage, key = FIELDS[name]
+        if storage == 'column':
+            return self.columns[key][row].item()
+        if storage == 'label':
+            codes, vocabulary = self.labels[key]
+            return vocabulary[codes[row]]
+        if storage == 'constant':
+            return self.constants.get(key)
+        listings = self.sources if storage == 'source' else self.targets
+        return listings[self.columns[f'{storage}_index'][row]][key]
+
+    # --- Serialization ---
+
+    def to_columns(self) -> Dict[str, list]:
+        return {name: self.values(name) for name in FIELDS}
+
+    def to_records(self) -> List[Dict]:
+        """One dict per row, built column by column (the former list-of-dicts shape)."""
+        names = list(FIELDS)
+        return [dict(zip(names, values)) for values in zip(*(self.values(name) for name in names))]
+
+    def to_json(self, orient: str = 'columns') -> str:
+        """JSON text; 'columns' ({field: [values]}) is the compact form, 'records' a list of objects."""
+        if orient == 'records':
+            payload = self.to_records()
+        elif orient == 'columns':
+            if not ORJSON_AVAILABLE:
+                return json.dumps(self.to_columns(), ensure_ascii=False)
+            payload = {name: self.column(key) if storage == 'column' else self.values(name)
+                       for name, (storage, key) in FIELDS.items()}
+        else:
+            raise ValueError(f"Unknown orient: {orient}")
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+        return json.dumps(payload, ensure_ascii=False)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory owned by the columns, labels and selection (the shared listings excluded)."""
+        total = sum(values.nbytes for values in self.columns.values())
+        total += sum(codes.nbytes for codes, _ in self.labels.values())
+        return total + (self._rows.nbytes if self._rows is not None else 0)
+
+    def __repr__(self) -> str:
+        return f"OpportunityBatch({len(self)} rows)"
@@ -0,0 +1,215 @@
+"""
+GPAS 4.0 - Order Execution Pipeline
+Purchases are queued and placed on a bounded worker pool against a pluggable marketplace API, so
+callers get an order handle at once and a burst of auto-buys runs in parallel. A retried request
+with the same idempotency key gets the original order back instead of buying twice. Completion is
+reported asynchronously through on_complete callbacks (or polled / waited on).
+"""
+
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+QUEUED = 'queued'
+EXECUTING = 'executing'
+FILLED = 'filled'
+FAILED = 'failed'
+
+
+class OrderRequest(NamedTuple):
+    product_name: str
+    source_platform: str
+    amount: float # USD
+    shipping_time_days: int
+
+
+class MarketplaceError(Exception):
+    """A marketplace refused or could not complete an order (out of stock, payment error...)."""
+
+
+class MockMarketplaceAPI:
+    """Simulated marketplace: API latency plus a fixed success rate. Any object with
+    place_order(request) -> Dict (raising MarketplaceError on failure) can replace it.
+    """
+
+    def __init__(self, latency_range: Tuple[float, float] = (0.5, 1.5), success_rate: float = 0.85):
+        self.latency_range = latency_range
+        self.success_rate = success_rate
+
+    def place_order(self, request: OrderRequest) -> Dict:
+        time.sleep(random.uniform(*self.latency_range)) # Simulate API call latency
+        if random.random() >= self.success_rate:
+            raise MarketplaceError(random.choice(['Simulated out of stock', 'Simulated payment error', 'Simulated price change']))
+        return {
+            'marketplace_order_id': f'SIM_ORD_{random.randint(100000, 999999)}',
+            'estimated_delivery_date': (datetime.now() + timedelta(days=request.shipping_time_days)).isoformat()
+        }
+
+
+class Order:
+    __slots__ = ('order_id', 'idempotency_key', 'owner', 'request', 'status', 'result', 'error',
+                 'extra', 'created_at', 'started_at', 'finished_at', '_done', '_callbacks')
+
+    def __init__(self, request: OrderRequest, idempotency_key: Optional[Hashable], owner: Optional[Hashable]):
+        self.order_id = uuid.uuid4().hex
+        self.idempotency_key = idempotency_key
+        self.owner = owner
+        self.request = request
+        self.status = QUEUED
+        self.result: Optional[Dict] = None # Marketplace response once filled
+        self.error: Optional[str] = None
+        self.extra: Dict = {} # Filled in by completion callbacks (e.g. the stored transaction id)
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._done = threading.Event()
+        self._callbacks: List[Callable[['Order'], None]] = []
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def succeeded(self) -> bool:
+        """Whether the marketplace accepted the order (already known inside completion callbacks)."""
+        return self.result is not None
+
+    def to_dict(self) -> Dict:
+        return {
+            'order_id': self.order_id,
+            'status': self.status,
+            'product_name': self.request.product_name,
+            'source_platform': self.request.source_platform,
+            'amount': self.request.amount,
+            'result': self.result,
+            'error': self.error,
+            **self.extra,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class OrderPipeline:
+    """Bounded-concurrency order queue with idempotency keys, kept for retention_seconds after
+    an order finishes (orders and their keys are forgotten together).
+    """
+
+    def __init__(self, marketplace, max_concurrency: int = 4, retention_seconds: float = 24 * 3600):
+        self.marketplace = marketplace
+        self.max_concurrency = max_concurrency
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='order')
+        self._orders: Dict[str, Order] = {}
+        self._by_key: Dict[Hashable, str] = {}
+        self._lock = threading.Lock()
+
+        # Stats
+        self.submitted = 0
+        self.deduplicated = 0
+        self.filled = 0
+        self.failed = 0
+        self.total_latency_seconds = 0.0
+
+    def find(self, idempotency_key: Hashable) -> Optional[Order]:
+        """The order already placed under idempotency_key, if any (counted as a deduplicated retry)."""
+        with self._lock:
+            self._purge_expired()
+            order_id = self._by_key.get(idempotency_key)
+            if order_id is None:
+                return None
+            self.deduplicated += 1
+            return self._orders[order_id]
+
+    def submit(self, request: OrderRequest, idempotency_key: Optional[Hashable] = None, owner: Optional[Hashable] = None,
+               on_complete: Optional[Callable[[Order], None]] = None) -> Tuple[Order, bool]:
+        """Queues an order and returns (order, created). With a key already seen, returns the
+        existing order and created=False; on_complete is then not registered.
+        """
+        with self._lock:
+            self._purge_expired()
+            if idempotency_key is not None and idempotency_key in self._by_key:
+                self.deduplicated += 1
+                return self._orders[self._by_key[idempotency_key]], False
+            order = Order(request, idempotency_key, owner)
+            if on_complete:
+                order._callbacks.append(on_complete)
+            self._orders[order.order_id] = order
+            if idempotency_key is not None:
+                self._by_key[idempotency_key] = order.order_id
+            self.submitted += 1
+        self._executor.submit(self._execute, order)
+        return order, True
+
+    def _execute(self, order: Order):
+        order.started_at = time.time()
+        order.status = EXECUTING
+        try:
+            order.result = self.marketplace.place_order(order.request)
+        except MarketplaceError as e:
+            order.error = str(e)
+        except Exception as e:
+            order.error = f"Marketplace API error: {e}"
+        order.finished_at = time.time()
+
+        for callback in order._callbacks:
+            try:
+                callback(order)
+            except Exception as e:
+                print(f"❌ Callback da ordem {order.order_id} falhou: {e}")
+
+        with self._lock:
+            self.total_latency_seconds += order.finished_at - order.started_at
+            if order.succeeded:
+                self.filled += 1
+            else:
+                self.failed += 1
+        # Final status only after the callbacks, so a poller never sees a half-recorded order
+        order.status = FILLED if order.succeeded else FAILED
+        order._done.set()
+
+    def _purge_expired(self):
+        """Caller holds the lock."""
+        cutoff = time.time() - self.retention_seconds
+        expired = [o for o in self._orders.values() if o.done and o.finished_at < cutoff]
+        for order in expired:
+            del self._orders[order.order_id]
+            if order.idempotency_key is not None:
+                self._by_key.pop(order.idempotency_key, None)
+
+    def get(self, order_id: str, owner: Optional[Hashable] = None) -> Optional[Order]:
+        """The order, or None if unknown, expired or (with owner) placed by someone else."""
+        with self._lock:
+            order = self._orders.get(order_id)
+        if order is None or (owner is not None and order.owner != owner):
+            return None
+        return order
+
+    def wait(self, orders: List[Order], timeout: Optional[float] = None) -> bool:
+        """Blocks until every order is done (or timeout); returns whether they all finished."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for order in orders:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not order._done.wait(remaining):
+                return False
+        return True
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            statuses = [o.status for o in self._orders.values()]
+            finished = self.filled + self.failed
+            return {
+                'max_concurrency': self.max_concurrency,
+                'queued': statuses.count(QUEUED),
+                'executing': statuses.count(EXECUTING),
+                'retained_orders': len(self._orders),
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'filled': self.filled,
+                'failed': self.failed,
+                'avg_execution_seconds': round(self.total_latency_seconds / finished, 3) if finished else 0.0
+            }
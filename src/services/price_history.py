@@ -0,0 +1,172 @@
+"""
+GPAS 4.0 - Price History Store
+Append-optimized time series of every scraped listing, kept in the application's SQLite database.
+Writes are buffered and inserted in batches; reads use the (product, platform, ts) index.
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Standalone default (CLI, benchmarks, catalog workers): the Flask app's default database,
+# 'sqlite:///gpas4.db' resolved against its instance folder (<repo>/instance). The app passes its own path.
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'instance', 'gpas4.db')
+
+
+def sqlite_path_from_uri(uri: str, instance_path: str) -> Optional[str]:
+    """File behind a SQLAlchemy sqlite URI, resolved like Flask-SQLAlchemy does (relative paths are
+    relative to the app instance folder); None for in-memory or non-SQLite databases.
+    """
+    if not uri.startswith('sqlite:///'):
+        return None
+    path = uri[len('sqlite:///'):].split('?', 1)[0]
+    if not path or path == ':memory:':
+        return None
+    return path if os.path.isabs(path) else os.path.join(instance_path, path)
+
+
+def default_db_path() -> str:
+    """SQLite file from DATABASE_URL (e.g. sqlite:////var/data/gpas4.db on Render), else DEFAULT_DB_PATH."""
+    return sqlite_path_from_uri(os.environ.get('DATABASE_URL', ''), os.path.dirname(DEFAULT_DB_PATH)) or DEFAULT_DB_PATH
+
+
+def _to_epoch(timestamp) -> float:
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    if isinstance(timestamp, str):
+        try:
+            return datetime.fromisoformat(timestamp).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+class PriceHistoryStore:
+    """Buffered writer and query API for the price_history table."""
+
+    COLUMNS = ('product', 'platform', 'title', 'price', 'currency', 'url', 'ts')
+
+    def __init__(self, db_path: Optional[str] = None, batch_size: int = 200, flush_interval_seconds: float = 5.0):
+        self.db_path = db_path or default_db_path()
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self._conn: Optional[sqlite3.Connection] = None # Opened on first write or query
+
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.rows_written = 0
+        self.batches_written = 0
+        atexit.register(self.flush)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Caller holds the lock."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL') # Readers never block the batched writer
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS price_history (
+                    id INTEGER PRIMARY KEY,
+                    product TEXT NOT NULL,
+                    platform TEXT NOT NULL,
+                    title TEXT,
+                    price REAL NOT NULL,
+                    currency TEXT,
+                    url TEXT,
+                    ts REAL NOT NULL
+                )""")
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_price_history_product_platform_ts ON price_history (product, platform, ts)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def record(self, product: str, listing: Dict):
+        """Buffers one scraped listing (a dict as built by scrape_site_for_product)."""
+        self.record_many(product, [listing])
+
+    def record_many(self, product: str, listings: List[Dict]):
+        rows = [
+            (product, l['platform'], l.get('title'), float(l['price']), l.get('currency'), l.get('url'), _to_epoch(l.get('timestamp')))
+            for l in listings if l.get('price') is not None
+        ]
+        with self._lock:
+            self._buffer.extend(rows)
+            due = len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval_seconds
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """Writes all buffered rows in one transaction and returns how many were written."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            if not rows:
+                return 0
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO price_history ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})", rows)
+            self.rows_written += len(rows)
+            self.batches_written += 1
+            return len(rows)
+
+    def _query(self, sql: str, params: tuple) -> List[Dict]:
+        self.flush() # Read-your-writes for anything still buffered
+        with self._lock:
+            cursor = self._connection().execute(sql, params)
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def latest_price(self, product: str, platform: str) -> Optional[Dict]:
+        rows = self._query(
+            f"SELECT {', '.join(self.COLUMNS)} FROM price_history WHERE product = ? AND platform = ? ORDER BY ts DESC LIMIT 1",
+            (product, platform))
+        return rows[0] if rows else None
+
+    def latest_prices(self, product: str) -> Dict[str, Dict]:
+        """Most recent listing per platform for a product."""
+        rows = self._query(
+            f"""SELECT {', '.join('p.' + c for c in self.COLUMNS)} FROM price_history p
+                JOIN (SELECT platform, MAX(ts) AS max_ts FROM price_history WHERE product = ? GROUP BY platform) latest
+                  ON p.platform = latest.platform AND p.ts = latest.max_ts
+                WHERE p.product = ?""",
+            (product, product))
+        return {row['platform']: row for row in rows}
+
+    def price_range(self, product: str, platform: Optional[str] = None,
+                    start: Optional[float] = None, end: Optional[float] = None) -> List[Dict]:
+        """Listings for a product (optionally one platform) between two epoch timestamps, oldest first."""
+        sql = f"SELECT {', '.join(self.COLUMNS)} FROM price_history WHERE product = ?"
+        params = [product]
+        if platform is not None:
+            sql += " AND platform = ?"
+            params.append(platform)
+        if start is not None:
+            sql += " AND ts >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND ts <= ?"
+            params.append(end)
+        return self._query(sql + " ORDER BY ts", tuple(params))
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'db_path': self.db_path,
+                'buffered_rows': len(self._buffer),
+                'rows_written': self.rows_written,
+                'batches_written': self.batches_written
+            }
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,161 @@
+"""
+GPAS 4.0 - Per-host Rate Limiter
+Token bucket per host shared by every outbound scraper/search call.
+Requests to independent hosts never wait for each other; only requests to the same domain are delayed.
+"""
+
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """Token bucket with reservations: callers take a token immediately (the balance may go
+    negative) and sleep for the time the bucket needs to pay it back. This keeps the
+    lock held only for the bookkeeping, never while sleeping.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, jitter: float = 0.0):
+        self.rate = rate # Tokens per second
+        self.capacity = capacity # Maximum burst size
+        self.jitter = jitter # Extra random delay (seconds) added to waits, for politeness
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+        # Stats
+        self.queue_depth = 0
+        self.requests = 0
+        self.waited_requests = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def reserve(self) -> float:
+        """Takes one token and returns how many seconds the caller must wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= 1
+            wait = 0.0
+            if self.tokens < 0:
+                wait = -self.tokens / self.rate
+                if self.jitter:
+                    wait += random.uniform(0, self.jitter)
+
+            self.requests += 1
+            if wait > 0:
+                self.waited_requests += 1
+                self.total_wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            return wait
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'rate_per_second': self.rate,
+                'capacity': self.capacity,
+                'queue_depth': self.queue_depth,
+                'requests': self.requests,
+                'waited_requests': self.waited_requests,
+                'total_wait_seconds': round(self.total_wait_seconds, 3),
+                'max_wait_seconds': round(self.max_wait_seconds, 3),
+                'avg_wait_seconds': round(self.total_wait_seconds / self.requests, 3) if self.requests else 0.0
+            }
+
+
+class HostRateScheduler:
+    """Politeness scheduler: one TokenBucket per host, created on first use."""
+
+    def __init__(self, default_rate: float = 1.0, default_capacity: float = 1.0, default_jitter: float = 0.0):
+        self.default_rate = default_rate
+        self.default_capacity = default_capacity
+        self.default_jitter = default_jitter
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_for(url_or_host: str) -> str:
+        """Accepts either a full URL or a bare host name."""
+        if '://' in url_or_host:
+            return urlparse(url_or_host).netloc.lower()
+        return url_or_host.lower()
+
+    def configure_host(self, url_or_host: str, rate: float, capacity: float = 1.0, jitter: float = 0.0,
+                       override: bool = False):
+        """Sets the policy for a host. Several services configure the same hosts on this shared
+        scheduler, so an existing policy is only tightened: the lower rate and capacity and the
+        larger jitter win, whoever configures last. override=True replaces it outright.
+        Existing stats for the host are kept.
+        """
+        host = self.host_for(url_or_host)
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                self._buckets[host] = TokenBucket(rate, capacity, jitter)
+            else:
+                with bucket.lock:
+                    if not override:
+                        rate, capacity, jitter = min(rate, bucket.rate), min(capacity, bucket.capacity), max(jitter, bucket.jitter)
+                    bucket.rate = rate
+                    bucket.capacity = capacity
+                    bucket.jitter = jitter
+                    bucket.tokens = min(bucket.tokens, capacity)
+
+    def _bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.default_rate, self.default_capacity, self.default_jitter)
+                self._buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url_or_host: str) -> float:
+        """Blocks the calling thread until a request to this host is allowed.
+        Returns the number of seconds waited.
+        """
+        bucket = self._bucket(self.host_for(url_or_host))
+        wait = bucket.reserve()
+        if wait > 0:
+            with bucket.lock:
+                bucket.queue_depth += 1
+            try:
+                time.sleep(wait)
+            finally:
+                with bucket.lock:
+                    bucket.queue_depth -= 1
+        return wait
+
+    def queue_depth(self, url_or_host: Optional[str] = None) -> int:
+        """Number of callers currently waiting, for one host or for all of them."""
+        with self._lock:
+            if url_or_host is not None:
+                bucket = self._buckets.get(self.host_for(url_or_host))
+                return bucket.queue_depth if bucket else 0
+            return sum(bucket.queue_depth for bucket in self._buckets.values())
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            buckets = dict(self._buckets)
+        hosts = {host: bucket.stats() for host, bucket in buckets.items()}
+        return {
+            'total_queue_depth': sum(h['queue_depth'] for h in hosts.values()),
+            'total_requests': sum(h['requests'] for h in hosts.values()),
+            'total_wait_seconds': round(sum(h['total_wait_seconds'] for h in hosts.values()), 3),
+            'hosts': hosts
+        }
+
+
+_shared_scheduler: Optional[HostRateScheduler] = None
+_shared_scheduler_lock = threading.Lock()
+
+
+def get_shared_scheduler() -> HostRateScheduler:
+    """Process-wide scheduler, so every service throttles against the same per-host buckets."""
+    global _shared_scheduler
+    with _shared_scheduler_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = HostRateScheduler()
+        return _shared_scheduler
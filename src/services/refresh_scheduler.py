@@ -0,0 +1,162 @@
+"""
+GPAS 4.0 - Adaptive Refresh Scheduler
+Gives each (product, site) pair its own refresh interval: pairs whose price keeps moving or that
+keep producing opportunities are rescanned often, stable ones back off towards the maximum interval.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class RefreshState:
+    __slots__ = ('product', 'site', 'interval', 'next_due', 'last_price', 'observations',
+                 'changes', 'failures', 'change_rate', 'opportunity_rate')
+
+    def __init__(self, product: str, site: str, interval: float):
+        self.product = product
+        self.site = site
+        self.interval = interval
+        self.next_due = 0.0 # New pairs are due immediately
+        self.last_price = None
+        self.observations = 0
+        self.changes = 0
+        self.failures = 0 # Fetches that returned no price
+        self.change_rate = 0.0 # EWMA of "price changed" per observation
+        self.opportunity_rate = 0.0 # EWMA of "produced an opportunity" per observation
+
+    def to_dict(self) -> Dict:
+        return {
+            'product': self.product,
+            'site': self.site,
+            'interval_seconds': round(self.interval, 1),
+            'next_due': self.next_due,
+            'last_price': self.last_price,
+            'observations': self.observations,
+            'changes': self.changes,
+            'failures': self.failures,
+            'change_rate': round(self.change_rate, 3),
+            'opportunity_rate': round(self.opportunity_rate, 3)
+        }
+
+
+class AdaptiveRefreshScheduler:
+    """Multiplicative-increase / multiplicative-decrease intervals, bounded by min/max.
+    A price change shrinks the interval; an unchanged price grows it, more slowly for pairs
+    that often produce opportunities.
+    """
+
+    def __init__(self, min_interval: float = 15 * 60, max_interval: float = 12 * 3600,
+                 change_tolerance: float = 0.005, shrink_factor: float = 0.5, growth_factor: float = 1.5,
+                 alpha: float = 0.3):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.change_tolerance = change_tolerance # Relative move below this counts as "unchanged"
+        self.shrink_factor = shrink_factor
+        self.growth_factor = growth_factor
+        self.alpha = alpha
+        self._states: Dict[Tuple[str, str], RefreshState] = {}
+        self._lock = threading.Lock()
+
+        # Stats
+        self.scheduled_fetches = 0
+        self.skipped_fetches = 0
+
+    def _clamp(self, interval: float) -> float:
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def _state(self, product: str, site: str) -> RefreshState:
+        key = (product, site)
+        state = self._states.get(key)
+        if state is None:
+            state = RefreshState(product, site, self.min_interval)
+            self._states[key] = state
+        return state
+
+    def register(self, product: str, sites: List[str]):
+        with self._lock:
+            for site in sites:
+                self._state(product, site)
+
+    def due_sites(self, product: str, sites: List[str], now: Optional[float] = None, claim: bool = True) -> List[str]:
+        """Sites of a product that are due now. Claimed pairs are leased for min_interval, so a
+        failed fetch is retried later instead of being picked up again immediately.
+        """
+        now = now or time.time()
+        due = []
+        with self._lock:
+            for site in sites:
+                state = self._state(product, site)
+                if state.next_due <= now:
+                    due.append(site)
+                    if claim:
+                        state.next_due = now + self.min_interval
+            self.scheduled_fetches += len(due)
+            self.skipped_fetches += len(sites) - len(due)
+        return due
+
+    def due_items(self, now: Optional[float] = None, limit: Optional[int] = None, claim: bool = True) -> Dict[str, List[str]]:
+        """All due (product, site) pairs, most overdue first, grouped by product."""
+        now = now or time.time()
+        with self._lock:
+            due = sorted((s for s in self._states.values() if s.next_due <= now), key=lambda s: s.next_due)
+            if limit is not None:
+                due = due[:limit]
+            grouped: Dict[str, List[str]] = {}
+            for state in due:
+                grouped.setdefault(state.product, []).append(state.site)
+                if claim:
+                    state.next_due = now + self.min_interval
+            self.scheduled_fetches += len(due)
+        return grouped
+
+    def record_observation(self, product: str, site: str, price: Optional[float],
+                           produced_opportunity: bool = False, now: Optional[float] = None):
+        """Feeds back the result of a fetch. price=None means the fetch failed or returned no
+        listing: that says nothing about price volatility, so the interval is kept and the pair
+        is retried after min_interval."""
+        now = now or time.time()
+        with self._lock:
+            state = self._state(product, site)
+            if price is None:
+                state.failures += 1
+                state.next_due = now + self.min_interval
+                return
+            changed = False
+            if state.last_price:
+                changed = abs(price - state.last_price) / state.last_price > self.change_tolerance
+            state.last_price = price
+
+            state.observations += 1
+            state.changes += int(changed)
+            state.change_rate = self.alpha * changed + (1 - self.alpha) * state.change_rate
+            state.opportunity_rate = self.alpha * produced_opportunity + (1 - self.alpha) * state.opportunity_rate
+
+            if changed:
+                state.interval = self._clamp(state.interval * self.shrink_factor)
+            else:
+                # Pairs that keep producing opportunities back off more slowly
+                growth = 1 + (self.growth_factor - 1) * (1 - state.opportunity_rate)
+                state.interval = self._clamp(state.interval * growth)
+            state.next_due = now + state.interval
+
+    def get_state(self, product: str, site: str) -> Optional[Dict]:
+        with self._lock:
+            state = self._states.get((product, site))
+            return state.to_dict() if state else None
+
+    def get_stats(self, now: Optional[float] = None) -> Dict:
+        now = now or time.time()
+        with self._lock:
+            states = list(self._states.values())
+            total = self.scheduled_fetches + self.skipped_fetches
+            return {
+                'tracked_pairs': len(states),
+                'due_now': sum(1 for s in states if s.next_due <= now),
+                'avg_interval_seconds': round(sum(s.interval for s in states) / len(states), 1) if states else 0.0,
+                'min_interval_seconds': self.min_interval,
+                'max_interval_seconds': self.max_interval,
+                'scheduled_fetches': self.scheduled_fetches,
+                'skipped_fetches': self.skipped_fetches,
+                'request_reduction': round(self.skipped_fetches / total, 3) if total else 0.0
+            }
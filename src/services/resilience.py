@@ -0,0 +1,139 @@
+"""
+GPAS 4.0 - Resilience
+Jittered exponential retries for transient errors and a circuit breaker per site, so a
+degraded marketplace is skipped quickly instead of costing a full timeout on every product.
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is skipped because the circuit is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuito '{name}' aberto, nova tentativa em {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class RetryPolicy:
+    """Retries a call with full-jitter exponential backoff while should_retry(exc) is True."""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 should_retry: Optional[Callable[[Exception], bool]] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.should_retry = should_retry or (lambda exc: True)
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number `attempt` (1-based): uniform in [0, base * 2^(attempt-1)], capped."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def call(self, fn: Callable, *args, **kwargs):
+        attempt = 1
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_attempts or not self.should_retry(e):
+                    raise
+                delay = self.backoff(attempt)
+                print(f"🔁 Tentativa {attempt}/{self.max_attempts} falhou ({e}); nova tentativa em {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+
+
+class CircuitBreaker:
+    """Closed -> open after failure_threshold consecutive failures. After cooldown_seconds the
+    circuit goes half-open and lets a single probe through: success closes it, failure reopens it.
+    Only exceptions matching failure_exceptions count as failures.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown_seconds: float = 300.0,
+                 failure_exceptions: tuple = (Exception,)):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.failure_exceptions = failure_exceptions
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.lock = threading.Lock()
+
+        # Stats
+        self.successes = 0
+        self.failures = 0
+        self.skipped_calls = 0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            self.skipped_calls += 1
+            return False
+
+    def retry_in(self) -> float:
+        with self.lock:
+            return max(0.0, self.cooldown_seconds - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self.lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    print(f"🚧 Circuito '{self.name}' aberto por {self.cooldown_seconds:.0f}s após {self.consecutive_failures} falhas")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.probe_in_flight = False
+
+    def call(self, fn: Callable, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        try:
+            result = fn(*args, **kwargs)
+        except self.failure_exceptions:
+            self.record_failure()
+            raise
+        except Exception:
+            # Not a failure of the remote side (e.g. a parsing bug): release a half-open probe
+            with self.lock:
+                self.probe_in_flight = False
+            raise
+        self.record_success()
+        return result
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'successes': self.successes,
+                'failures': self.failures,
+                'skipped_calls': self.skipped_calls,
+                'times_opened': self.times_opened
+            }
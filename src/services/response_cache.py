@@ -0,0 +1,235 @@
+"""
+GPAS 4.0 - Disk-backed HTTP Response Cache
+Caches scraper responses on the persistent disk (/var/data on Render), keyed by URL.
+Entries have a TTL per site, are revalidated with ETag/Last-Modified once stale,
+and the oldest entries are evicted when the cache grows past its size limit.
+Bodies cut short by a streaming read are stored as partial: no validators (a 304 must never
+extend them) and only served to readers that ask for partial content.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+PERSISTENT_DISK_PATH = '/var/data'
+
+
+def default_cache_dir() -> str:
+    """GPAS_HTTP_CACHE_DIR if set, otherwise the persistent disk, otherwise the temp dir."""
+    configured = os.environ.get('GPAS_HTTP_CACHE_DIR')
+    if configured:
+        return configured
+    if os.path.isdir(PERSISTENT_DISK_PATH) and os.access(PERSISTENT_DISK_PATH, os.W_OK):
+        return os.path.join(PERSISTENT_DISK_PATH, 'http_cache')
+    return os.path.join(tempfile.gettempdir(), 'gpas4_http_cache')
+
+
+class CachedResponse:
+    """A cached response body plus the metadata needed for freshness and revalidation."""
+
+    def __init__(self, url: str, content: bytes, meta: Dict):
+        self.url = url
+        self.content = content
+        self.etag = meta.get('etag')
+        self.last_modified = meta.get('last_modified')
+        self.stored_at = meta.get('stored_at', 0.0)
+        self.ttl = meta.get('ttl', 0)
+        self.partial = meta.get('partial', False) # Truncated body (early stop / byte cap)
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        return ((now or time.time()) - self.stored_at) < self.ttl
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """File-per-entry response cache. Safe to share between threads and between gunicorn
+    workers pointing at the same directory (writes are atomic renames).
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_size_bytes: int = 200 * 1024 * 1024, default_ttl: int = 600):
+        self.directory = directory or default_cache_dir()
+        self.max_size_bytes = max_size_bytes
+        self.default_ttl = default_ttl
+        os.makedirs(self.directory, exist_ok=True)
+        self.lock = threading.Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stores = 0
+        self.evictions = 0
+        self.size_bytes = self._scan_size()
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + '.body', base + '.json'
+
+    def _scan_size(self) -> int:
+        total = 0
+        for name in os.listdir(self.directory):
+            try:
+                total += os.path.getsize(os.path.join(self.directory, name))
+            except OSError:
+                pass
+        return total
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def lookup(self, url: str) -> Optional[CachedResponse]:
+        """Returns the cached entry (fresh or stale) or None, and counts a hit only when fresh."""
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                content = f.read()
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        entry = CachedResponse(url, content, meta)
+        with self.lock:
+            if entry.is_fresh():
+                self.hits += 1
+            else:
+                self.misses += 1
+        try:
+            os.utime(meta_path, None) # Mark as recently used for eviction
+        except OSError:
+            pass
+        return entry
+
+    def get(self, url: str) -> Optional[bytes]:
+        """Returns the body only if a fresh, complete entry exists."""
+        entry = self.lookup(url)
+        if entry and entry.is_fresh() and not entry.partial:
+            return entry.content
+        return None
+
+    def store(self, url: str, content: bytes, headers: Optional[Dict] = None, ttl: Optional[int] = None,
+              partial: bool = False):
+        """partial=True for a truncated body: the response's validators describe the full body,
+        so they are dropped and the entry can only expire, never be revalidated.
+        """
+        headers = {} if partial or headers is None else headers
+        meta = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'stored_at': time.time(),
+            'ttl': self.default_ttl if ttl is None else ttl,
+            'partial': partial
+        }
+        body_path, meta_path = self._paths(url)
+        previous_size = 0
+        for path in (body_path, meta_path):
+            if os.path.exists(path):
+                previous_size += os.path.getsize(path)
+
+        meta_bytes = json.dumps(meta).encode('utf-8')
+        self._write_atomic(body_path, content)
+        self._write_atomic(meta_path, meta_bytes)
+
+        with self.lock:
+            self.stores += 1
+            self.size_bytes += len(content) + len(meta_bytes) - previous_size
+            over_limit = self.size_bytes > self.max_size_bytes
+        if over_limit:
+            self.evict()
+
+    def refresh(self, url: str, ttl: Optional[int] = None):
+        """Marks a stale entry as fresh again after a 304 Not Modified."""
+        _, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        meta['stored_at'] = time.time()
+        if ttl is not None:
+            meta['ttl'] = ttl
+        self._write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+        with self.lock:
+            self.revalidated += 1
+
+    def invalidate(self, url: str):
+        for path in self._paths(url):
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                with self.lock:
+                    self.size_bytes -= size
+            except OSError:
+                pass
+
+    def evict(self, target_ratio: float = 0.9):
+        """Deletes least recently used entries until the cache is under target_ratio of its limit."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            meta_path = os.path.join(self.directory, name)
+            body_path = meta_path[:-len('.json')] + '.body'
+            try:
+                size = os.path.getsize(meta_path) + (os.path.getsize(body_path) if os.path.exists(body_path) else 0)
+                entries.append((os.path.getmtime(meta_path), size, meta_path, body_path))
+                total += size
+            except OSError:
+                continue
+
+        target = self.max_size_bytes * target_ratio
+        evicted = 0
+        for _, size, meta_path, body_path in sorted(entries):
+            if total <= target:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            evicted += 1
+
+        with self.lock:
+            self.size_bytes = total
+            self.evictions += evicted
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'directory': self.directory,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'revalidated': self.revalidated,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'size_bytes': self.size_bytes,
+                'max_size_bytes': self.max_size_bytes
+            }
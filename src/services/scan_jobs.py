@@ -0,0 +1,155 @@
+"""
+GPAS 4.0 - Scan Jobs
+Runs arbitrage scans on a small background worker pool so HTTP requests only enqueue work: a
+job id is returned at once, and clients poll its status/progress and fetch the result, which is
+kept for result_ttl_seconds after the job finishes.
+Jobs live in the memory of the process that accepted them (one gunicorn worker on Render).
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+# run(report_progress) -> result; report_progress(done, total)
+JobFunc = Callable[[Callable[[int, int], None]], Any]
+
+
+class ScanJob:
+    __slots__ = ('job_id', 'owner', 'status', 'progress_done', 'progress_total', 'created_at',
+                 'started_at', 'finished_at', 'result', 'error')
+
+    def __init__(self, job_id: str, owner: Hashable):
+        self.job_id = job_id
+        self.owner = owner
+        self.status = QUEUED
+        self.progress_done = 0
+        self.progress_total = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        """Status and progress, without the result."""
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'progress': {
+                'done': self.progress_done,
+                'total': self.progress_total,
+                'percentage': round(100 * self.progress_done / self.progress_total, 1) if self.progress_total else 0.0
+            },
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error
+        }
+
+
+class ScanJobManager:
+    """Background scan queue. One owner (user) has at most one queued/running job per key (the
+    parameters baked into run): submitting again with the same key returns it instead of queuing
+    a duplicate scan, while a different key gets its own job.
+    """
+
+    def __init__(self, max_workers: int = 1, result_ttl_seconds: float = 900):
+        self.max_workers = max_workers
+        self.result_ttl_seconds = result_ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scan-job')
+        self._jobs: Dict[str, ScanJob] = {}
+        self._active_by_key: Dict[Tuple[Hashable, Hashable], str] = {} # (owner, key) -> queued/running job id
+        self._lock = threading.Lock()
+
+        # Stats
+        self.submitted = 0
+        self.deduplicated = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.expired = 0
+
+    def submit(self, owner: Hashable, run: JobFunc, key: Hashable = None) -> ScanJob:
+        """Queues run for owner; key identifies the parameters run was built with (e.g. filters)."""
+        dedup_key = (owner, key)
+        with self._lock:
+            self._purge_expired()
+            active_id = self._active_by_key.get(dedup_key)
+            if active_id is not None:
+                self.deduplicated += 1
+                return self._jobs[active_id]
+            job = ScanJob(uuid.uuid4().hex, owner)
+            self._jobs[job.job_id] = job
+            self._active_by_key[dedup_key] = job.job_id
+            self.submitted += 1
+        self._executor.submit(self._run, job, run, dedup_key)
+        return job
+
+    def _run(self, job: ScanJob, run: JobFunc, dedup_key: Tuple[Hashable, Hashable]):
+        job.started_at = time.time()
+        job.status = RUNNING
+
+        def report_progress(done: int, total: int):
+            job.progress_done, job.progress_total = done, total
+
+        try:
+            job.result = run(report_progress)
+            job.status = SUCCEEDED
+        except Exception as e:
+            print(f"❌ Scan job {job.job_id} falhou: {e}")
+            job.error = str(e) or e.__class__.__name__
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if job.status == SUCCEEDED:
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+                if self._active_by_key.get(dedup_key) == job.job_id:
+                    del self._active_by_key[dedup_key]
+
+    def _purge_expired(self):
+        """Drops finished jobs older than result_ttl_seconds (caller holds the lock)."""
+        cutoff = time.time() - self.result_ttl_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        self.expired += len(expired)
+
+    def get(self, job_id: str, owner: Optional[Hashable] = None) -> Optional[ScanJob]:
+        """The job, or None if it is unknown, expired or (with owner) belongs to someone else."""
+        with self._lock:
+            self._purge_expired()
+            job = self._jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            self._purge_expired()
+            states = [job.status for job in self._jobs.values()]
+            return {
+                'workers': self.max_workers,
+                'result_ttl_seconds': self.result_ttl_seconds,
+                'queued': states.count(QUEUED),
+                'running': states.count(RUNNING),
+                'retained_results': states.count(SUCCEEDED) + states.count(FAILED),
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'expired': self.expired
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
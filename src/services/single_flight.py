@@ -0,0 +1,104 @@
+"""
+GPAS 4.0 - Single-Flight Cache
+Coalesces identical expensive calls: while a call for a key is running, other callers for the
+same key wait for it and share its result instead of starting their own, and a completed result
+is reused until it is ttl_seconds old. Upstream load then stays flat however many users ask.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+FRESH = 'fresh' # This caller ran the call
+SHARED = 'shared' # Joined a call already in flight
+CACHED = 'cached' # Served a completed result within its TTL
+
+
+class _Call:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Exception = None
+
+
+class SingleFlight:
+    """Per-key call coalescing plus a TTL cache of completed results. Errors are shared with the
+    callers waiting on that call but never cached. Results are shared objects: treat them as
+    read-only.
+    """
+
+    def __init__(self, ttl_seconds: float = 300):
+        self.ttl_seconds = ttl_seconds
+        self._in_flight: Dict[Hashable, _Call] = {}
+        self._results: Dict[Hashable, Tuple[float, Any]] = {} # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+        # Stats
+        self.calls = 0
+        self.shared = 0
+        self.cache_hits = 0
+        self.errors = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, str]:
+        """fn()'s result for key, run at most once at a time. Returns (value, FRESH|SHARED|CACHED)."""
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    self.cache_hits += 1
+                    return cached[1], CACHED
+                del self._results[key]
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, SHARED
+
+        try:
+            call.value = fn()
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        else:
+            with self._lock:
+                self._results[key] = (time.monotonic() + self.ttl_seconds, call.value)
+            return call.value, FRESH
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+
+    def invalidate(self, key: Hashable = None) -> int:
+        """Forgets the completed result for key (or all of them); calls in flight are unaffected."""
+        with self._lock:
+            if key is None:
+                count = len(self._results)
+                self._results.clear()
+                return count
+            return 1 if self._results.pop(key, None) is not None else 0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            requests = self.calls + self.shared + self.cache_hits
+            return {
+                'ttl_seconds': self.ttl_seconds,
+                'in_flight': len(self._in_flight),
+                'cached_results': len(self._results),
+                'calls': self.calls,
+                'shared': self.shared,
+                'cache_hits': self.cache_hits,
+                'errors': self.errors,
+                'upstream_call_ratio': round(self.calls / requests, 3) if requests else 0.0
+            }
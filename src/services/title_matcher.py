@@ -0,0 +1,154 @@
+"""
+GPAS 4.0 - Title Matcher
+Title normalization plus a MinHash/LSH index, so source and target listings are paired by
+likely-same-product candidates (sub-linear lookups) with a similarity score, instead of
+every source against every target.
+Cross-site titles for the same product share little beyond brand and model ("Xiaomi Mi Band 8
+Smart Bracelet 1.62'' AMOLED" vs "Xiaomi Mi Band 8 Activity Tracker, 1.62\" AMOLED Display"),
+so pairs are scored by how much of the shorter title the other contains, gated on brand, model
+numbers and variant words, rather than by full-title Jaccard.
+"""
+
+import random
+import re
+import unicodedata
+import zlib
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+# Marketing noise that says nothing about which product a listing is
+STOPWORDS = {
+    'a', 'an', 'and', 'the', 'for', 'with', 'of', 'in', 'on', 'to', 'by', 'new', 'hot', 'sale',
+    'free', 'shipping', 'high', 'quality', 'premium', 'version', 'best', 'seller', 'amazon', 'amazons',
+    'choice', 'original', 'official', 'genuine', 'latest', '2023', '2024', '2025', '2026'
+}
+
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+_NUMBER_RE = re.compile(r'\d+')
+_DIGIT_LETTER_RE = re.compile(r'(?<=\d)(?=[a-z])|(?<=[a-z])(?=\d)')
+_THOUSANDS_RE = re.compile(r'(?<![a-z0-9.])(\d+)k(?![a-z])') # '10K' -> '10000', as in '(PowerCore Slim 10K) 10000mAh'
+
+# Words that name a different model of the same product line when they follow a model number
+# ('Band 8' vs 'Band 8 Pro'); elsewhere they are usually descriptions ('Ultra Compact')
+VARIANT_WORDS = {'pro', 'max', 'plus', 'lite', 'ultra', 'mini', 'se'}
+
+# Listings for an accessory of the product rather than the product itself
+ACCESSORY_WORDS = {'strap', 'straps', 'wristband', 'case', 'cover', 'protector', 'replacement', 'film', 'sticker', 'skin'}
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_title(title: str) -> List[str]:
+    """Lowercase, accent-free, punctuation-free tokens without marketing stopwords.
+    Numbers are split from units ('10000mAh' -> '10000', 'mah') and '10K' is read as '10000', so
+    capacities and models compare equal.
+    """
+    text = unicodedata.normalize('NFKD', title or '').encode('ascii', 'ignore').decode('ascii').lower()
+    text = _THOUSANDS_RE.sub(r'\g<1>000', text.replace("'", ''))
+    text = _DIGIT_LETTER_RE.sub(' ', text)
+    return [t for t in _NON_ALNUM_RE.split(text) if t and t not in STOPWORDS]
+
+
+def model_numbers(tokens: List[str]) -> Set[str]:
+    return {n for t in tokens for n in _NUMBER_RE.findall(t)}
+
+
+def model_variants(tokens: List[str]) -> Set[str]:
+    """Variant words right after a number or another variant ('8 pro', '15 pro max')."""
+    return {t for prev, t in zip(tokens, tokens[1:])
+            if t in VARIANT_WORDS and (prev.isdigit() or prev in VARIANT_WORDS)}
+
+
+def numbers_conflict(tokens_a: List[str], tokens_b: List[str]) -> bool:
+    """Both titles carry numbers (model, capacity, size) and none of them agree, e.g. 'Band 8' vs 'Band 7'."""
+    numbers_a, numbers_b = model_numbers(tokens_a), model_numbers(tokens_b)
+    return bool(numbers_a and numbers_b and numbers_a.isdisjoint(numbers_b))
+
+
+def title_similarity(tokens_a: List[str], tokens_b: List[str], min_tokens: int = 3) -> float:
+    """Share of the shorter title's tokens found in the other one (at least min_tokens in the
+    denominator, so a bare brand does not match everything). 0 when the brands (leading tokens)
+    are not both present in the other title, when model numbers conflict, when the model variants
+    ('8 pro' vs '8') differ, or when only one of them is an accessory listing ('strap', 'case'...).
+    """
+    if not tokens_a or not tokens_b:
+        return 0.0
+    set_a, set_b = set(tokens_a), set(tokens_b)
+    if tokens_a[0] not in set_b or tokens_b[0] not in set_a:
+        return 0.0
+    if numbers_conflict(tokens_a, tokens_b) or model_variants(tokens_a) != model_variants(tokens_b):
+        return 0.0
+    if bool(set_a & ACCESSORY_WORDS) != bool(set_b & ACCESSORY_WORDS):
+        return 0.0
+    return len(set_a & set_b) / max(min(len(set_a), len(set_b)), min_tokens)
+
+
+def query_match_score(query: str, title: str) -> float:
+    """Share of the query's tokens found in the title (0 when model numbers conflict)."""
+    query_tokens, title_tokens = normalize_title(query), normalize_title(title)
+    if not query_tokens or numbers_conflict(query_tokens, title_tokens):
+        return 0.0
+    title_set = set(title_tokens)
+    return sum(1 for t in query_tokens if t in title_set) / len(query_tokens)
+
+
+class MinHasher:
+    """num_perm universal hash functions over crc32 token hashes (deterministic across processes)."""
+
+    def __init__(self, num_perm: int = 60, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, token_set: Set[str]) -> Tuple[int, ...]:
+        hashes = [zlib.crc32(t.encode('utf-8')) for t in token_set] or [0]
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self.params)
+
+
+class TitleIndex:
+    """LSH index over listing title tokens. With 30 bands of 2 rows, titles at token Jaccard 0.35
+    (typical for one product on two sites) become candidates ~98% of the time and at 0.2 ~71%;
+    every title sharing the query's brand is a candidate as well. Candidates are then scored with
+    title_similarity.
+    """
+
+    def __init__(self, bands: int = 30, rows: int = 2, seed: int = 1):
+        self.bands = bands
+        self.rows = rows
+        self.hasher = MinHasher(bands * rows, seed)
+        self._buckets: Dict[Tuple, List[Hashable]] = {}
+        self._items: Dict[Hashable, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _band_keys(self, tokens: List[str]):
+        if tokens:
+            yield 'brand', tokens[0]
+        signature = self.hasher.signature(set(tokens))
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def add(self, item_id: Hashable, title: str):
+        tokens = normalize_title(title)
+        self._items[item_id] = tokens
+        for key in self._band_keys(tokens):
+            self._buckets.setdefault(key, []).append(item_id)
+
+    def _candidates(self, tokens: List[str]) -> Set[Hashable]:
+        found = set()
+        for key in self._band_keys(tokens):
+            found.update(self._buckets.get(key, ()))
+        return found
+
+    def candidates(self, title: str) -> Set[Hashable]:
+        return self._candidates(normalize_title(title))
+
+    def query(self, title: str, min_similarity: float = 0.5, top_n: Optional[int] = None) -> List[Tuple[Hashable, float]]:
+        """Likely same-product items as (item_id, similarity), best first."""
+        tokens = normalize_title(title)
+        matches = []
+        for item_id in self._candidates(tokens):
+            score = title_similarity(tokens, self._items[item_id])
+            if score > 0 and score >= min_similarity:
+                matches.append((item_id, round(score, 3)))
+        matches.sort(key=lambda m: m[1], reverse=True)
+        return matches[:top_n] if top_n else matches
@@ -0,0 +1,99 @@
+"""
+GPAS 4.0 - Top-K Accumulators
+Bounded min-heaps that keep only the K best items of a stream, so scans can rank opportunities
+as they are found instead of collecting and sorting every candidate.
+"""
+
+import heapq
+import itertools
+from operator import itemgetter
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+Item = Any
+KeyFunc = Callable[[Item], float]
+
+
+def by_field(name: str) -> KeyFunc:
+    """Ranking key reading one field of a dict, e.g. by_field('roi_percentage')."""
+    return itemgetter(name)
+
+
+class TopK:
+    """The k highest-ranked items pushed so far (all of them when k is None).
+    Ties keep the item seen first, matching sorted(..., reverse=True) on the full list.
+    """
+
+    __slots__ = ('k', 'key', '_heap', '_counter', 'seen')
+
+    def __init__(self, k: Optional[int], key: KeyFunc):
+        self.k = k
+        self.key = key
+        self._heap = [] # (rank, -sequence, item): the root is the item to evict next
+        self._counter = itertools.count()
+        self.seen = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, item: Item) -> bool:
+        """Offers an item; returns True if it is (for now) among the top k."""
+        self.seen += 1
+        entry = (self.key(item), -next(self._counter), item)
+        if self.k is None or len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if self.k == 0 or entry[:2] <= self._heap[0][:2]:
+            return False
+        heapq.heapreplace(self._heap, entry)
+        return True
+
+    def extend(self, items: Iterable[Item]):
+        for item in items:
+            self.push(item)
+
+    def threshold(self) -> Optional[float]:
+        """Rank an item must beat to enter a full accumulator (None while it still has room)."""
+        if self.k is None or len(self._heap) < self.k or not self._heap:
+            return None
+        return self._heap[0][0]
+
+    def best(self) -> Optional[Item]:
+        return max(self._heap, key=lambda e: e[:2])[2] if self._heap else None
+
+    def items(self) -> List[Item]:
+        """Kept items, best first."""
+        return [entry[2] for entry in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
+
+
+class GroupedTopK:
+    """Global top-k plus the best per_group items of each group (e.g. per product)."""
+
+    def __init__(self, k: Optional[int], key: KeyFunc, per_group: int = 1):
+        self.key = key
+        self.per_group = per_group
+        self.top = TopK(k, key)
+        self._groups: Dict[Hashable, TopK] = {}
+
+    @property
+    def seen(self) -> int:
+        return self.top.seen
+
+    def push(self, group: Hashable, item: Item) -> bool:
+        group_top = self._groups.get(group)
+        if group_top is None:
+            group_top = self._groups[group] = TopK(self.per_group, self.key)
+        group_top.push(item)
+        return self.top.push(item)
+
+    def extend(self, group: Hashable, items: Iterable[Item]):
+        for item in items:
+            self.push(group, item)
+
+    def items(self) -> List[Item]:
+        return self.top.items()
+
+    def best(self) -> Optional[Item]:
+        return self.top.best()
+
+    def best_by_group(self) -> Dict[Hashable, List[Item]]:
+        return {group: group_top.items() for group, group_top in self._groups.items()}
@@ -0,0 +1,62 @@
+"""
+Title pairing on real cross-site listings: the same product is titled very differently on
+AliExpress and Amazon, so these pairs must match while close-but-different products must not.
+Run with: python -m pytest tests
+"""
+
+import pytest
+
+from src.services.title_matcher import TitleIndex, normalize_title, title_similarity
+
+SAME_PRODUCT = [
+    ("Xiaomi Mi Band 8 Smart Bracelet 1.62'' AMOLED Screen Blood Oxygen Heart Rate Fitness Traker Bluetooth Waterproof Smartband",
+     "Xiaomi Mi Band 8 Activity Tracker, 1.62\" AMOLED Display"),
+    ("Anker PowerCore 10000 Portable Charger Power Bank",
+     "Anker Portable Charger, 313 Power Bank (PowerCore Slim 10K) 10000mAh"),
+    ("Anker PowerCore 10000 Portable Charger Power Bank 10000mAh Ultra Compact Fast Charging External Battery",
+     "Anker Portable Charger, 313 Power Bank (PowerCore Slim 10K) 10000mAh Battery Pack"),
+    ("Original Xiaomi Redmi Buds 4 Pro TWS Bluetooth Earphones ANC",
+     "Xiaomi Redmi Buds 4 Pro Wireless Earbuds, Active Noise Cancelling"),
+    ("Baseus 65W GaN Charger USB C Fast Charger Quick Charge 4.0",
+     "Baseus 65W USB C Charger, GaN Fast Charger 3-Port"),
+    ("2024 New Lenovo LP40 Pro TWS Earphones Wireless Bluetooth 5.1",
+     "Lenovo LP40 Pro Wireless Earbuds Bluetooth 5.1 Headphones"),
+]
+
+DIFFERENT_PRODUCT = [
+    ("Xiaomi Mi Band 8 Smart Bracelet", "Xiaomi Mi Band 7 Smart Bracelet"), # Model number
+    ("Xiaomi Mi Band 8 Pro Smart Bracelet", "Xiaomi Mi Band 8 Activity Tracker"), # Variant
+    ("Portable Charger Power Bank 10000mAh", "Anker Portable Charger, 313 Power Bank (PowerCore Slim 10K) 10000mAh"), # No brand
+    ("Anker Soundcore Life Q30 Headphones", "Anker Portable Charger, 313 Power Bank (PowerCore Slim 10K) 10000mAh"), # Same brand only
+    ("Xiaomi Mi Band 8 Strap Silicone Replacement Wristband", "Xiaomi Mi Band 8 Activity Tracker, 1.62\" AMOLED Display"), # Accessory
+]
+
+THRESHOLD = 0.5 # ScraperEngine.title_match_threshold
+
+
+@pytest.mark.parametrize('source_title, target_title', SAME_PRODUCT)
+def test_same_product_pairs_match(source_title, target_title):
+    index = TitleIndex()
+    index.add('target', target_title)
+    matches = index.query(source_title, min_similarity=THRESHOLD)
+    assert [item_id for item_id, _ in matches] == ['target']
+
+
+@pytest.mark.parametrize('source_title, target_title', DIFFERENT_PRODUCT)
+def test_different_products_do_not_match(source_title, target_title):
+    assert title_similarity(normalize_title(source_title), normalize_title(target_title)) < THRESHOLD
+
+
+def test_pairs_found_among_many_listings():
+    index = TitleIndex()
+    for _, target_title in SAME_PRODUCT + DIFFERENT_PRODUCT:
+        index.add(target_title, target_title)
+    for source_title, target_title in SAME_PRODUCT:
+        matches = [item_id for item_id, _ in index.query(source_title, min_similarity=THRESHOLD)]
+        assert target_title in matches
+        # Other hits may only be another listing of the same product (the two Anker power banks)
+        assert all(normalize_title(m)[0] == normalize_title(target_title)[0] for m in matches)
+
+
+def test_thousands_suffix_is_expanded():
+    assert normalize_title('PowerCore Slim 10K 10000mAh') == ['powercore', 'slim', '10000', '10000', 'mah']